@@ -0,0 +1,291 @@
+import sys
+
+sys.path.append("./")
+
+import json
+import time
+import subprocess
+import argparse
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+from rich import print  # noqa: E402
+from rich.table import Table  # noqa: E402
+from rich import box  # noqa: E402
+from myterial import orange, green, red  # noqa: E402
+
+from kino.animal import Animal  # noqa: E402
+from kino.geometry import Trajectory  # noqa: E402
+from kino.locomotion import Locomotion  # noqa: E402
+from kino.steps import Paw  # noqa: E402
+from kino.animate import ScalarAnimation  # noqa: E402
+from kino.synthetic import synthetic_tracking, synthetic_animal_data  # noqa
+
+"""
+    Benchmarks of the main processing stages on synthetic gait data.
+    Reports run time and peak memory for each stage and compares them to
+    a stored baseline.
+
+    Usage:
+        python benchmarks/benchmark.py --lengths 1000 10000 --bodyparts 8 16
+        python benchmarks/benchmark.py --save-baseline  # update baseline
+        python benchmarks/benchmark.py --check  # exit with error on regressions
+"""
+
+BASELINE = Path(__file__).parent / "baseline.json"
+FPS = 60
+ANIMATION_FRAMES = 50
+
+# sizes run by default (and stored in the baseline)
+LENGTHS = [1000, 10000]
+BODYPARTS = [8, 16]
+
+# a stage regressed if its time or memory grew more than this
+TOLERANCE = 1.2
+
+
+def make_stages(
+    n_frames: int, n_bodyparts: int
+) -> Tuple[Dict[str, Callable], Dict[str, Callable]]:
+    """
+        Creates the functions running each stage. Inputs of each
+        stage are created in advance so that only the stage is measured.
+        Stages using cached quantities get fresh inputs from a setup
+        function before each measurement.
+
+        Returns:
+            stages and setup functions (by stage name)
+    """
+    animal = Animal(synthetic_animal_data(n_bodyparts))
+    tracking = synthetic_tracking(n_frames, fps=FPS, n_bodyparts=n_bodyparts)
+    locomotion = Locomotion(animal, tracking, fps=FPS)
+
+    def trajectory():
+        Trajectory(tracking["body_x"], tracking["body_y"], fps=FPS)
+
+    def locomotion_stage():
+        Locomotion(animal, tracking, fps=FPS)
+
+    def egocentric():
+        locomotion.to_egocentric()
+
+    def paws():
+        for paw in animal.paws:
+            Paw(paw, locomotion.paws[paw].trajectory, locomotion.com)
+
+    def fresh_locomotion():
+        return (Locomotion(animal, tracking, fps=FPS),)
+
+    def bones_angular_kinematics(locomotion):
+        for bone in locomotion.bones.values():
+            bone.thetadotdot
+
+    def animation():
+        f, ax = plt.subplots()
+        animator = ScalarAnimation(
+            locomotion.com.speed, data_fps=FPS, animation_fps=FPS, ax=ax
+        )
+        for frame in range(min(ANIMATION_FRAMES, n_frames)):
+            animator.frame_idx = frame
+            animator.make_next_frame()
+            ax.clear()
+        plt.close("all")
+
+    stages = dict(
+        trajectory=trajectory,
+        locomotion=locomotion_stage,
+        egocentric=egocentric,
+        paws=paws,
+        bones_angular_kinematics=bones_angular_kinematics,
+        animation=animation,
+    )
+    setups = dict(bones_angular_kinematics=fresh_locomotion)
+    return stages, setups
+
+
+def measure(
+    function: Callable, repeats: int = 1, setup: Callable = None
+) -> Tuple[float, float]:
+    """
+        Returns the (best) run time in seconds and the
+        peak memory allocated in MB. setup returns the arguments of
+        function and is called (not measured) before each run.
+    """
+    times = []
+    for _ in range(repeats):
+        arguments = setup() if setup is not None else ()
+        start = time.perf_counter()
+        function(*arguments)
+        times.append(time.perf_counter() - start)
+
+    # memory is measured in a separate run as tracemalloc slows down execution
+    arguments = setup() if setup is not None else ()
+    tracemalloc.start()
+    function(*arguments)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 1e6
+
+
+def import_time(module: str = "kino", repeats: int = 5) -> float:
+    """
+        Cold import time of a module, measured within
+        a new python process
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return min(times)
+
+
+def run(lengths, bodyparts, stages=None, repeats: int = 1) -> dict:
+    results = {}
+    for n_frames in lengths:
+        for n_bodyparts in bodyparts:
+            functions, setups = make_stages(n_frames, n_bodyparts)
+            for stage, function in functions.items():
+                if stages and stage not in stages:
+                    continue
+                duration, memory = measure(
+                    function, repeats=repeats, setup=setups.get(stage)
+                )
+                results[f"{stage}|{n_frames}|{n_bodyparts}"] = dict(
+                    time=duration, memory=memory
+                )
+    return results
+
+
+def compare(results: dict, baseline: dict) -> Dict[str, Dict[str, float]]:
+    """
+        Ratio of time and memory of each result to the baseline
+        (for the results with a baseline)
+    """
+    ratios = {}
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratios[key] = {
+            quantity: result[quantity] / baseline[key][quantity]
+            if baseline[key][quantity]
+            else 1.0
+            for quantity in ("time", "memory")
+        }
+    return ratios
+
+
+def regressions(
+    results: dict, baseline: dict, tolerance: float = TOLERANCE
+) -> list:
+    """
+        Keys of the results whose time or memory exceeds
+        the baseline by more than tolerance
+    """
+    return [
+        key
+        for key, ratio in compare(results, baseline).items()
+        if max(ratio.values()) > tolerance
+    ]
+
+
+def report(results: dict, baseline: dict, tolerance: float = TOLERANCE):
+    tb = Table(box=box.SIMPLE_HEAVY)
+    for col in ("stage", "frames", "bodyparts"):
+        tb.add_column(col, header_style=f"bold {orange}")
+    for col in (
+        "time (s)",
+        "peak memory (MB)",
+        "time vs baseline",
+        "memory vs baseline",
+    ):
+        tb.add_column(col, header_style=f"bold {orange}", justify="right")
+
+    ratios = compare(results, baseline)
+    for key, result in results.items():
+        stage, n_frames, n_bodyparts = key.split("|")
+        comparison = []
+        for quantity in ("time", "memory"):
+            if key in ratios:
+                ratio = ratios[key][quantity]
+                color = red if ratio > tolerance else green
+                comparison.append(f"[{color}]{ratio:.2f}x")
+            else:
+                comparison.append("-")
+
+        tb.add_row(
+            stage,
+            n_frames,
+            n_bodyparts,
+            f"{result['time']:.4f}",
+            f"{result['memory']:.2f}",
+            *comparison,
+        )
+    print(tb)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="kino benchmarks")
+    parser.add_argument(
+        "--lengths",
+        type=int,
+        nargs="+",
+        default=LENGTHS,
+        help="Number of frames (e.g. 1000 up to 10000000)",
+    )
+    parser.add_argument("--bodyparts", type=int, nargs="+", default=BODYPARTS)
+    parser.add_argument("--stages", nargs="+", default=None)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument(
+        "--import-time",
+        nargs="*",
+        default=None,
+        help="Measure cold import time of kino modules (e.g. kino.locomotion)",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if any stage regressed against the baseline",
+    )
+    args = parser.parse_args()
+
+    baseline: dict = {}
+    if args.baseline.exists():
+        with open(args.baseline, "r") as fin:
+            baseline = json.load(fin)
+
+    results = run(args.lengths, args.bodyparts, args.stages, args.repeats)
+    if args.import_time is not None:
+        for module in args.import_time or ["kino", "kino.locomotion"]:
+            results[f"import {module}|-|-"] = dict(
+                time=import_time(module), memory=0
+            )
+    report(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as fout:
+            json.dump(baseline, fout, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif args.check:
+        regressed = regressions(results, baseline, args.tolerance)
+        if regressed:
+            print(f"[{red}]Regressions: {', '.join(regressed)}")
+            sys.exit(1)
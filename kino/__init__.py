@@ -1,21 +1,77 @@
-from loguru import logger
-from rich.logging import RichHandler
-from pyinspect import install_traceback
+"""
+    Submodules are imported lazily (e.g. kino.locomotion is imported the first
+    time it's accessed) to keep 'import kino' fast, e.g. in worker processes.
+    Importing kino has no side effects, use kino.install() to set up rich
+    tracebacks, logging and pretty printing.
+"""
 
-install_traceback()
+import importlib
 
-logger.configure(
-    handlers=[{"sink": RichHandler(markup=True), "format": "{message}"}]
+_submodules = (
+    "animal",
+    "animate",
+    "batch",
+    "chunked",
+    "cleaning",
+    "cli",
+    "draw",
+    "embedding",
+    "events",
+    "features",
+    "filters",
+    "gait",
+    "geometry",
+    "heatmaps",
+    "hmm",
+    "io",
+    "joints",
+    "locomotion",
+    "math",
+    "pose",
+    "pose_index",
+    "profiling",
+    "progress",
+    "query",
+    "server",
+    "similarity",
+    "social",
+    "steps",
+    "streaming",
+    "synthetic",
 )
 
-from rich.pretty import install
 
-install()
+def __getattr__(name: str):
+    if name in _submodules:
+        return importlib.import_module(f"kino.{name}")
+    raise AttributeError(f"module 'kino' has no attribute '{name}'")
 
-import kino
-import kino.locomotion
-import kino.geometry
 
+def __dir__():
+    return sorted(list(globals().keys()) + list(_submodules))
 
-from kino import animal
-from kino import geometry
+
+def install(traceback: bool = True, logging: bool = True, pretty: bool = True):
+    """
+        Installs rich tracebacks, logging with rich's handler and
+        the rich pretty printer.
+    """
+    if traceback:
+        from pyinspect import install_traceback
+
+        install_traceback()
+
+    if logging:
+        from loguru import logger
+        from rich.logging import RichHandler
+
+        logger.configure(
+            handlers=[
+                {"sink": RichHandler(markup=True), "format": "{message}"}
+            ]
+        )
+
+    if pretty:
+        from rich.pretty import install as install_pretty
+
+        install_pretty()
@@ -97,6 +97,7 @@ bones ({self.n_bones}) = {self.bones}
         """
             Creates the internal representation of the animal's body
         """
+        self.animal_data = animal_data
         self.name = animal_data["name"]
         self.paws = animal_data["paws"]
 
@@ -6,6 +6,7 @@ from pathlib import Path
 import numpy as np
 
 from kino.progress import track
+from kino.profiling import profiled, stage
 from kino.locomotion import Locomotion
 from kino.draw import gliphs
 from kino.draw.animal import DrawAnimal
@@ -66,6 +67,7 @@ class AnimationCore:
             self.interpolation_idx = 0
             self.frame_idx += 1
 
+    @profiled("animate.animate")
     def animate(self, save_path: Union[str, Path], save: bool = True):
         """
             Create the animation and save it to file
@@ -84,13 +86,14 @@ class AnimationCore:
             transient=True,
             description="Creating animation",
         ):
-            self.update_frames_index()
+            with stage("animate.frame"):
+                self.update_frames_index()
 
-            running = self.make_next_frame()
+                running = self.make_next_frame()
 
-            self.on_frame_end()
-            self.interpolation_idx += 1
-            camera.snap()
+                self.on_frame_end()
+                self.interpolation_idx += 1
+                camera.snap()
 
             if not running:
                 break
@@ -98,8 +101,9 @@ class AnimationCore:
         # save
         if save:
             logger.debug("   ... saving")
-            animation = camera.animate(interval=1000 / self.fps)
-            animation.save(save_path, fps=self.fps)
+            with stage("animate.save"):
+                animation = camera.animate(interval=1000 / self.fps)
+                animation.save(save_path, fps=self.fps)
             logger.debug(f'Animation created, saved at: "{save_path}"')
 
 
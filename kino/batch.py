@@ -0,0 +1,218 @@
+"""
+    Batch processing of multiple sessions: for each tracking file a
+    Locomotion and EgocentricLocomotion are created and saved together
+    with a summary of the session kinematics and steps.
+"""
+
+import glob
+import json
+import traceback
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union, List, Tuple, Optional
+
+from loguru import logger
+
+from kino.animal import Animal, default_animal_data
+from kino.locomotion import Locomotion
+from kino.progress import track
+from kino import profiling
+
+SUMMARY_FILE = "summary.json"
+FAILURES_FILE = "failures.json"
+
+
+def find_sessions(source: Union[str, Path]) -> List[Path]:
+    """
+        Returns the tracking files in a folder (.h5 files) or
+        matching a glob pattern
+    """
+    source = Path(source)
+    if source.is_dir():
+        files = source.glob("*.h5")
+    else:
+        files = (Path(f) for f in glob.glob(str(source)))
+    return sorted(files)
+
+
+def load_animal_data(spec: Union[str, Path, dict]) -> dict:
+    """
+        Gets the data to create an Animal: either a dictionary,
+        "mouse" for the default animal or the path to a JSON file
+    """
+    if isinstance(spec, dict):
+        return spec
+    elif str(spec) == "mouse":
+        return default_animal_data
+
+    with open(spec, "r") as fin:
+        return json.load(fin)
+
+
+def summarize(locomotion: Locomotion) -> dict:
+    """
+        Summary statistics of a locomotion session
+    """
+    com = locomotion.com
+    summary = dict(
+        n_frames=len(locomotion),
+        duration=len(locomotion) / locomotion.fps,
+        distance=float(com.distance),
+        com_speed_mean=float(np.nanmean(com.speed)),
+        com_speed_max=float(np.nanmax(com.speed)),
+        abs_thetadot_mean=float(np.nanmean(np.abs(com.thetadot))),
+    )
+
+    for name, paw in locomotion.paws.items():
+        summary[f"{name}_n_steps"] = len(paw.swings_start)
+        summary[f"{name}_swing_duration"] = (
+            float(np.mean(paw.swings_duration))
+            if len(paw.swings_duration)
+            else np.nan
+        )
+    return summary
+
+
+def process_session(
+    tracking_file: Path,
+    animal_data: dict,
+    output_folder: Path,
+    fps: int = 60,
+    key: str = None,
+    profile: bool = False,
+) -> Tuple[str, Optional[dict], Optional[str], dict]:
+    """
+        Creates the Locomotion and EgocentricLocomotion of a session,
+        saves them and their summary to output_folder/session_name.
+        If profile is True profiling is enabled in the worker process
+        (it is not inherited by spawned processes).
+
+        Returns:
+            session name, summary (None if failed), error traceback and
+            profiling stats (empty if profiling is not enabled)
+    """
+    if profile and not profiling.is_enabled():
+        profiling.enable()
+
+    # forked workers inherit the stats of the main process,
+    # only this session's stats are sent back
+    profiling.current.reset()
+
+    name = tracking_file.stem
+    summary, error = None, None
+    try:
+        tracking = pd.read_hdf(tracking_file, key=key)
+        locomotion = Locomotion(Animal(animal_data), tracking, fps=fps)
+        egocentric = locomotion.to_egocentric()
+
+        session_folder = output_folder / name
+        locomotion.save(session_folder / "allocentric")
+        egocentric.save(session_folder / "egocentric")
+
+        summary = dict(session=name, **summarize(locomotion))
+        with open(session_folder / SUMMARY_FILE, "w") as fout:
+            json.dump(summary, fout, indent=2)
+    except Exception:
+        error = traceback.format_exc()
+
+    # send this worker's profiling stats to the main process
+    return name, summary, error, profiling.current.to_dict()
+
+
+def run_batch(
+    source: Union[str, Path],
+    output_folder: Union[str, Path],
+    animal: Union[str, Path, dict] = "mouse",
+    fps: int = 60,
+    n_workers: int = None,
+    chunksize: int = 1,
+    key: str = None,
+    overwrite: bool = False,
+    profile: bool = None,
+    mp_context=None,
+) -> pd.DataFrame:
+    """
+        Processes all sessions in parallel. Sessions already processed
+        (with a summary file in the output folder) are skipped unless
+        overwrite=True, so that an interrupted batch can be resumed.
+        Errors are logged to output_folder/failures.json.
+
+        Arguments:
+            source: folder with tracking files or glob pattern
+            output_folder: where results are saved
+            animal: "mouse", path to JSON file or dictionary with animal data
+            fps: tracking data frame rate
+            n_workers: number of worker processes
+            chunksize: number of sessions sent to a worker at once
+            profile: collect profiling stats in the workers and merge them
+                in profiling.current (default: if profiling is enabled)
+            mp_context: multiprocessing context of the workers
+
+        Returns:
+            DataFrame with the summary of all processed sessions
+    """
+    output_folder = Path(output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    animal_data = load_animal_data(animal)
+    if profile is None:
+        profile = profiling.is_enabled()
+
+    sessions = find_sessions(source)
+    to_process = [
+        session
+        for session in sessions
+        if overwrite
+        or not (output_folder / session.stem / SUMMARY_FILE).exists()
+    ]
+    logger.debug(
+        f"Batch: {len(sessions)} sessions, {len(sessions) - len(to_process)} already processed"
+    )
+
+    failures_path = output_folder / FAILURES_FILE
+    failures = {}
+    if failures_path.exists():
+        with open(failures_path, "r") as fin:
+            failures = json.load(fin)
+
+    if to_process:
+        with ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=mp_context
+        ) as executor:
+            results = executor.map(
+                process_session,
+                to_process,
+                [animal_data] * len(to_process),
+                [output_folder] * len(to_process),
+                [fps] * len(to_process),
+                [key] * len(to_process),
+                [profile] * len(to_process),
+                chunksize=chunksize,
+            )
+            for name, summary, error, stats in track(
+                results,
+                total=len(to_process),
+                description="Processing sessions",
+                transient=True,
+            ):
+                profiling.current.merge(stats)
+                if error is not None:
+                    logger.warning(f'Failed to process session "{name}"')
+                    failures[name] = error
+                else:
+                    failures.pop(name, None)
+
+    with open(failures_path, "w") as fout:
+        json.dump(failures, fout, indent=2)
+
+    # merge summaries of all processed sessions
+    summaries = []
+    for session in sessions:
+        summary_path = output_folder / session.stem / SUMMARY_FILE
+        if summary_path.exists():
+            with open(summary_path, "r") as fin:
+                summaries.append(json.load(fin))
+    summary = pd.DataFrame(summaries)
+    summary.to_csv(output_folder / "summary.csv", index=False)
+    return summary
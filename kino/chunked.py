@@ -0,0 +1,368 @@
+"""
+    Out-of-core processing of long recordings: tracking data is read
+    in chunks, each chunk is padded with a halo of frames on each side so
+    that the kinematics in the chunk are the same as when processing
+    the whole recording at once, and the results are written to disk
+    in the same columnar format used by Locomotion.save.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Union, Dict, Optional
+
+from kino.animal import Animal
+from kino.io import ColumnStore
+from kino.geometry import Vector, Trajectory
+from kino.locomotion import Locomotion, EgocentricLocomotion
+from kino.steps import Paw, long_gaps, select_swings
+from kino.joints import JointKinematics
+from kino.progress import track
+
+
+def required_halo(trajectory_window: int = 5) -> int:
+    """
+        Number of frames to add on each side of a chunk such that edge
+        effects don't affect the kinematics within the chunk. It adds up the
+        widths of all smoothing, gaussian and gradient windows applied
+        in sequence when creating a Locomotion.
+    """
+    gradients = 4  # np.gradient/np.diff + edge fixes of thetadot
+    return (
+        Locomotion.com_smoothing_window
+        + trajectory_window
+        + Paw.com_kernel_width
+        + Paw.kernel_width
+        + gradients
+    )
+
+
+class TrackingReader:
+    """
+        Reads blocks of frames from tracking data stored in a HDF5 file
+        (saved with format='table') or from a DataFrame.
+    """
+
+    def __init__(
+        self, tracking: Union[str, Path, pd.DataFrame], key: str = None
+    ):
+        self.tracking: Optional[pd.DataFrame] = None
+
+        if isinstance(tracking, pd.DataFrame):
+            self.tracking = tracking
+            self.n_frames = len(tracking)
+        else:
+            self.path = str(tracking)
+            with pd.HDFStore(self.path, mode="r") as store:
+                self.key = key or store.keys()[0]
+                storer = store.get_storer(self.key)
+                if not storer.is_table:
+                    raise ValueError(
+                        f'Tracking data at "{self.path}" cannot be read in chunks, '
+                        'save it with format="table"'
+                    )
+                self.n_frames = storer.nrows
+
+    def __len__(self) -> int:
+        return self.n_frames
+
+    def read(self, start: int, stop: int) -> pd.DataFrame:
+        if self.tracking is not None:
+            return self.tracking.iloc[start:stop]
+        return pd.read_hdf(self.path, key=self.key, start=start, stop=stop)
+
+
+class ChunkedColumns:
+    """
+        Writes the per-frame quantities of a kinematics container
+        (e.g. AnchoredTrajectory) to disk one chunk at the time.
+    """
+
+    skip: tuple = ()
+
+    def __init__(self, path: Path, n_frames: int):
+        self.store = ColumnStore(path, mode="w")
+        self.n_frames = n_frames
+        self.columns: Dict[str, np.memmap] = {}
+        self.attributes: dict = {}
+
+    def write(self, obj, keep: slice, start: int):
+        """
+            Writes the frames in 'keep' at position 'start' in
+            each column
+        """
+        derived = getattr(obj, "_derived", {})
+        for name, value in vars(obj).items():
+            if name.startswith("_") or name in derived or name in self.skip:
+                continue
+
+            vector = isinstance(value, Vector) and not value.single_vec
+            if vector:
+                data = value.as_array()
+            elif isinstance(value, (np.ndarray, list)):
+                data = np.asarray(value)
+            else:
+                if value is None or isinstance(
+                    value, (int, float, str, bool, np.generic)
+                ):
+                    self.attributes[name] = value
+                continue
+
+            self._write_column(name, data[keep], start, vector=vector)
+
+    def _write_column(
+        self, name: str, data: np.ndarray, start: int, vector: bool = False
+    ):
+        if name not in self.columns:
+            self.columns[name] = self.store.allocate(
+                name,
+                (self.n_frames,) + data.shape[1:],
+                dtype=data.dtype,
+                vector=vector,
+            )
+        self.columns[name][start : start + len(data)] = data
+
+    def close(self, **attributes):
+        for column in self.columns.values():
+            column.flush()
+        self.store.save_metadata(**{**self.attributes, **attributes})
+
+
+class ChunkedTrajectory(ChunkedColumns):
+    """
+        Writes a Trajectory in chunks, keeping track of the distance
+        travelled across chunks.
+    """
+
+    skip = ("comulative_distance",)
+
+    def __init__(self, path: Path, n_frames: int):
+        super().__init__(path, n_frames)
+        self.distance = 0
+
+    def write(self, trajectory: Trajectory, keep: slice, start: int):
+        super().write(trajectory, keep, start)
+
+        cumulative = (
+            self.distance
+            + np.nancumsum(trajectory.speed[keep]) / trajectory.fps
+        )
+        self._write_column("comulative_distance", cumulative, start)
+        self.distance = cumulative[-1]
+
+    def close(self):
+        super().close(distance=self.distance)
+
+
+class ChunkedPaw(ChunkedColumns):
+    """
+        Writes a Paw in chunks, detecting swing onsets/offsets across
+        chunks boundaries.
+    """
+
+    skip = ("swings_start", "swings_end", "swings_duration")
+
+    def __init__(self, path: Path, n_frames: int):
+        super().__init__(path, n_frames)
+        self.starts: list = []
+        self.ends: list = []
+        self.previous: Optional[float] = None
+        self.max_gap = Paw.max_gap
+
+    def write(self, paw: Paw, keep: slice, start: int):
+        super().write(paw, keep, start)
+        self.max_gap = paw.max_gap
+
+        # prepend the last frame of the previous chunk to get onsets at the edge
+        is_swing = paw.is_swing[keep]
+        offset = start
+        if self.previous is not None:
+            is_swing = np.concatenate([[self.previous], is_swing])
+            offset -= 1
+
+        self.starts.append(np.where(np.diff(is_swing) > 0)[0] + offset)
+        self.ends.append(np.where(np.diff(is_swing) < 0)[0] + 1 + offset)
+        self.previous = is_swing[-1]
+
+    def close(self, com_speed: np.ndarray, fps: int):  # type: ignore
+        # swings overlapping long gaps are discarded as in Paw.detect_swing
+        normalized_speed = self.columns["normalized_speed"]
+        gaps = None
+        if np.isnan(normalized_speed).any():
+            gaps = long_gaps(normalized_speed, self.max_gap)
+
+        swings_start, swings_end, swings_duration = select_swings(
+            np.concatenate(self.starts),
+            np.concatenate(self.ends),
+            com_speed,
+            fps,
+            gaps=gaps,
+        )
+        self.store.write("swings_start", np.array(swings_start, dtype=int))
+        self.store.write("swings_end", np.array(swings_end, dtype=int))
+        self.store.write("swings_duration", np.array(swings_duration))
+        super().close()
+
+
+class ChunkedJoints(ChunkedColumns):
+    """
+        Writes JointKinematics in chunks, the joints
+        and bones names are written once
+    """
+
+    skip = ("joints", "bones")
+
+    def write(self, joints: JointKinematics, keep: slice, start: int):
+        super().write(joints, keep, start)
+        self.names = dict(joints=joints.joints, bones=joints.bones)
+
+    def close(self):
+        for name, values in self.names.items():
+            self.store.write(name, np.asarray(values))
+        super().close()
+
+
+class ChunkedLocomotion:
+    """
+        Writes a Locomotion (or EgocentricLocomotion) to disk in chunks
+        using the same layout as Locomotion.save
+    """
+
+    def __init__(self, path: Path, n_frames: int):
+        self.path = Path(path)
+        self.n_frames = n_frames
+        self.store = ColumnStore(self.path, mode="w")
+        self.writers: Dict[str, ChunkedColumns] = {}
+        self.rotation_matrices: Optional[np.memmap] = None
+
+    def _writer(self, name: str, writer_class: type = ChunkedColumns):
+        if name not in self.writers:
+            self.writers[name] = writer_class(self.path / name, self.n_frames)
+        return self.writers[name]
+
+    def write(self, locomotion: Locomotion, keep: slice, start: int):
+        for name, bp in locomotion.bodyparts.items():
+            self._writer(f"bodyparts/{name}", ChunkedTrajectory).write(
+                bp, keep, start
+            )
+
+        for name, bone in locomotion.bones.items():
+            self._writer(f"bones/{name}").write(bone, keep, start)
+        self._writer("head").write(locomotion.head, keep, start)
+        self._writer("body_axis").write(locomotion.body_axis, keep, start)
+        self._writer("joints", ChunkedJoints).write(
+            locomotion.joints, keep, start
+        )
+
+        self.paws = list(getattr(locomotion, "paws", {}).keys())
+        for name in self.paws:
+            paw = locomotion.paws[name]
+            self._writer(f"paws/{name}", ChunkedPaw).write(paw, keep, start)
+            self._writer(f"paws/{name}/trajectory", ChunkedTrajectory).write(
+                paw.trajectory, keep, start
+            )
+
+        if isinstance(locomotion, EgocentricLocomotion):
+            self._writer("allocentric_position", ChunkedTrajectory).write(
+                locomotion.allocentric_position, keep, start
+            )
+
+            rotation_matrices = np.asarray(locomotion.rotation_matrices)[keep]
+            if self.rotation_matrices is None:
+                self.rotation_matrices = self.store.allocate(
+                    "rotation_matrices", (self.n_frames, 2, 2)
+                )
+            self.rotation_matrices[
+                start : start + len(rotation_matrices)
+            ] = rotation_matrices
+
+        self.metadata = dict(
+            view=locomotion.view,
+            fps=locomotion.fps,
+            animal=locomotion.animal.animal_data,
+            bodyparts=list(locomotion.bodyparts.keys()),
+            bones=list(locomotion.bones.keys()),
+            paws=self.paws,
+        )
+
+    def close(self):
+        """
+            Finalizes all columns and writes metadata
+        """
+        for writer in self.writers.values():
+            if isinstance(writer, ChunkedPaw):
+                com_speed = self.writers["bodyparts/com"].columns["speed"]
+                writer.close(com_speed, self.metadata["fps"])
+            else:
+                writer.close()
+
+        if self.rotation_matrices is not None:
+            self.rotation_matrices.flush()
+        self.store.save_metadata(**self.metadata)
+
+
+def process_in_chunks(
+    animal: Animal,
+    tracking: Union[str, Path, pd.DataFrame],
+    save_path: Union[str, Path],
+    fps: int = 1,
+    chunk_size: int = 50_000,
+    halo: int = None,
+    key: str = None,
+    egocentric: bool = True,
+) -> Locomotion:
+    """
+        Creates a Locomotion from a long recording by processing the
+        tracking data in chunks with bounded memory usage.
+
+        Arguments:
+            animal: Animal object
+            tracking: path to HDF5 file (saved with format='table') or DataFrame
+            save_path: folder where the results are saved. Locomotion data are
+                saved in save_path/allocentric and, if egocentric=True, egocentric
+                data in save_path/egocentric. Both can be opened with Locomotion.load
+            fps: frame rate of the tracking data
+            chunk_size: number of frames in each chunk
+            halo: number of frames padding each chunk, by default it is large enough
+                for the results to match processing the whole recording at once.
+            key: key of the tracking data in the HDF5 file
+
+        Returns:
+            the allocentric Locomotion, memory mapped from disk
+    """
+    reader = TrackingReader(tracking, key=key)
+    n_frames = len(reader)
+    halo = required_halo() if halo is None else halo
+    save_path = Path(save_path)
+
+    allocentric_writer = ChunkedLocomotion(save_path / "allocentric", n_frames)
+    if egocentric:
+        egocentric_writer = ChunkedLocomotion(
+            save_path / "egocentric", n_frames
+        )
+
+    for start in track(
+        range(0, n_frames, chunk_size),
+        description="Processing chunks",
+        transient=True,
+    ):
+        stop = min(start + chunk_size, n_frames)
+        block_start = max(0, start - halo)
+        block_stop = min(n_frames, stop + halo)
+        keep = slice(start - block_start, stop - block_start)
+
+        locomotion = Locomotion(
+            animal, reader.read(block_start, block_stop), fps=fps
+        )
+        allocentric_writer.write(locomotion, keep, start)
+
+        if egocentric:
+            egocentric_writer.write(locomotion.to_egocentric(), keep, start)
+
+    allocentric_writer.close()
+    if egocentric:
+        egocentric_writer.close()
+
+    return Locomotion.load(save_path / "allocentric")
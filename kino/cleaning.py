@@ -0,0 +1,366 @@
+"""
+    Cleaning of tracking data before creating a Locomotion: masking
+    low confidence points, filling short gaps and repairing tracking
+    errors (jumps, bone length violations and left/right swaps).
+    All functions work on the whole pose tensor (n_frames, n_bodyparts, 2)
+    at once.
+"""
+
+import numpy as np
+from dataclasses import dataclass
+from typing import Tuple, List
+
+from kino.animal import Animal
+from kino.pose import to_pose_tensor, to_tracking
+
+
+def mask_low_likelihood(
+    pose: np.ndarray, likelihood: np.ndarray, threshold: float
+) -> np.ndarray:
+    """
+        Returns a copy of the pose tensor with NaNs where the
+        likelihood (n_frames, n_bodyparts) is below threshold
+    """
+    pose = pose.copy()
+    pose[likelihood < threshold] = np.nan
+    return pose
+
+
+def nan_runs(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+        Finds the runs of consecutive NaNs in each column of a
+        (n_frames, n_columns) array.
+
+        Returns:
+            column, first frame and last frame + 1 of each run
+    """
+    missing = np.zeros((values.shape[1], len(values) + 2), dtype=np.int8)
+    missing[:, 1:-1] = np.isnan(values).T
+    column, frame = np.nonzero(np.diff(missing, axis=1))
+    return column[::2], frame[::2], frame[1::2]
+
+
+def fill_gaps(
+    values: np.ndarray, max_gap: int = None, method: str = "linear"
+) -> np.ndarray:
+    """
+        Fills NaN gaps up to max_gap frames long by interpolating between
+        the valid frames at the two ends of the gap. Gaps at the start/end
+        of the data are not filled.
+
+        Arguments:
+            values: (n_frames, ...) array, each column is interpolated independently
+            max_gap: max number of consecutive NaN frames to fill (None: no limit)
+            method: "linear" or "spline" (cubic spline through valid points)
+    """
+    if method not in ("linear", "spline"):
+        raise ValueError(f'Invalid gap filling method: "{method}"')
+
+    shape = values.shape
+    filled = np.array(values, dtype=float).reshape(len(values), -1)
+    T = len(filled)
+
+    column, start, end = nan_runs(filled)
+    keep = (start > 0) & (end < T)
+    if max_gap is not None:
+        keep &= end - start <= max_gap
+    column, start, end = column[keep], start[keep], end[keep]
+    if not len(column):
+        return filled.reshape(shape)
+
+    # frame and column of each value to fill
+    length = end - start
+    run = np.repeat(np.arange(len(column)), length)
+    frames = (
+        start[run]
+        + np.arange(length.sum())
+        - np.repeat(np.cumsum(length) - length, length)
+    )
+    columns = column[run]
+
+    if method == "linear":
+        before = filled[start - 1, column][run]
+        after = filled[end, column][run]
+        p = (frames - start[run] + 1) / (length[run] + 1)
+        filled[frames, columns] = before + p * (after - before)
+    else:
+        from scipy.interpolate import CubicSpline
+
+        all_frames = np.arange(T)
+        for col in np.unique(columns):
+            valid = ~np.isnan(filled[:, col])
+            if valid.sum() < 4:
+                continue
+            spline = CubicSpline(all_frames[valid], filled[valid, col])
+            fill = frames[columns == col]
+            filled[fill, col] = spline(fill)
+
+    return filled.reshape(shape)
+
+
+def clean_tracking(
+    animal: Animal,
+    tracking,
+    likelihood_threshold: float = None,
+    max_gap: int = None,
+    method: str = "linear",
+) -> dict:
+    """
+        Masks points with {bodypart}_likelihood below threshold and fills
+        gaps up to max_gap frames long.
+
+        Returns:
+            tracking data as a dictionary of {bodypart}_x, {bodypart}_y arrays
+    """
+    pose, likelihood = to_pose_tensor(animal, tracking)
+
+    if likelihood_threshold is not None:
+        if likelihood is None:
+            raise ValueError(
+                "Cannot mask by likelihood: tracking data has no "
+                "{bodypart}_likelihood columns"
+            )
+        pose = mask_low_likelihood(pose, likelihood, likelihood_threshold)
+
+    if max_gap is None or max_gap > 0:
+        pose = fill_gaps(pose, max_gap=max_gap, method=method)
+    return to_tracking(animal, pose)
+
+
+@dataclass
+class CleaningReport:
+    """
+        Frames changed by repair_pose, each array has
+        shape (n_frames, n_bodyparts)
+    """
+
+    bodyparts: List[str]
+    swaps: np.ndarray
+    jumps: np.ndarray
+    bone_violations: np.ndarray
+    filled: np.ndarray
+
+    def __repr__(self) -> str:
+        return (
+            f"Cleaning report: {self.swaps.sum()} swapped, {self.jumps.sum()} jumps, "
+            f"{self.bone_violations.sum()} bone violations, {self.filled.sum()} filled"
+        )
+
+    def summary(self) -> dict:
+        """
+            Number of frames changed for each bodypart
+        """
+        return {
+            bp: dict(
+                swaps=int(self.swaps[:, n].sum()),
+                jumps=int(self.jumps[:, n].sum()),
+                bone_violations=int(self.bone_violations[:, n].sum()),
+                filled=int(self.filled[:, n].sum()),
+            )
+            for n, bp in enumerate(self.bodyparts)
+        }
+
+
+def left_right_pairs(animal: Animal) -> List[Tuple[int, int]]:
+    """
+        Indices of pairs of bodyparts named left_{name} and right_{name}
+    """
+    names = list(animal.bodyparts_names)
+    return [
+        (n, names.index("right_" + bp[5:]))
+        for n, bp in enumerate(names)
+        if bp.startswith("left_") and "right_" + bp[5:] in names
+    ]
+
+
+def distance(p1: np.ndarray, p2: np.ndarray) -> np.ndarray:
+    """
+        Euclidean distance between points in (..., 2) arrays
+    """
+    dx = p1[..., 0] - p2[..., 0]
+    dy = p1[..., 1] - p2[..., 1]
+    dx *= dx
+    dy *= dy
+    dx += dy
+    return np.sqrt(dx, out=dx)
+
+
+def nan_percentile(values: np.ndarray, q: float) -> np.ndarray:
+    """
+        Percentile (linear interpolation) of each column of a (n_frames, ...)
+        array ignoring NaNs. Faster than np.nanpercentile for long arrays:
+        each column is partitioned once, with NaNs sorted to the end.
+    """
+    values = np.asarray(values, dtype=float)
+    columns = values.reshape(len(values), -1)
+    percentiles = np.full(columns.shape[1], np.nan)
+    for n in range(columns.shape[1]):
+        column = columns[:, n]
+        n_valid = len(column) - np.count_nonzero(np.isnan(column))
+        if not n_valid:
+            continue
+        rank = (n_valid - 1) * q / 100
+        low, high = int(np.floor(rank)), int(np.ceil(rank))
+        partitioned = np.partition(column, [low, high])
+        percentiles[n] = partitioned[low] + (rank - low) * (
+            partitioned[high] - partitioned[low]
+        )
+    return percentiles.reshape(values.shape[1:])
+
+
+def median5(values: np.ndarray) -> np.ndarray:
+    """
+        Running median over 5 frames with a sorting network (min/max
+        operations only). The first and last two frames are left unchanged.
+    """
+    median = values.copy()
+    a, b, c, d, e = (values[i : len(values) - 4 + i] for i in range(5))
+    low, high = np.minimum(a, b), np.minimum(d, e)
+    np.maximum(low, high, out=low)
+    high = np.maximum(a, b)
+    np.minimum(high, np.maximum(d, e), out=high)
+
+    # median of c, low and high
+    out = median[2:-2]
+    np.maximum(c, low, out=out)
+    np.minimum(out, high, out=out)
+    np.minimum(c, low, out=low)
+    np.maximum(out, low, out=out)
+    return median
+
+
+def detect_swaps(
+    pose: np.ndarray, animal: Animal, ratio: float = 0.5
+) -> np.ndarray:
+    """
+        Detects frames in which the labels of left/right bodyparts are swapped.
+        A swap starts (or ends) at a frame if exchanging the two bodyparts
+        reduces their displacement from the previous frame by more than ratio.
+        Frames are compared to the previous frame where both bodyparts were
+        tracked, so that swaps starting or ending while one of them is
+        missing are not missed (which would invert the labels for the rest
+        of the session).
+
+        Returns:
+            (n_frames, n_bodyparts) boolean array, True where swapped
+    """
+    swapped = np.zeros(pose.shape[:2], dtype=bool)
+    for left, right in left_right_pairs(animal):
+        # frames where both bodyparts are tracked
+        frames = np.flatnonzero(
+            ~np.isnan(pose[:, left, 0]) & ~np.isnan(pose[:, right, 0])
+        )
+        L, R = pose[frames, left], pose[frames, right]
+        keep = distance(L[1:], L[:-1]) + distance(R[1:], R[:-1])
+        swap = distance(L[1:], R[:-1]) + distance(R[1:], L[:-1])
+        events = np.zeros(len(pose), dtype=bool)
+        events[frames[1:][swap < ratio * keep]] = True
+        swapped[:, left] = swapped[:, right] = np.cumsum(events) % 2 == 1
+    return swapped
+
+
+def detect_jumps(
+    pose: np.ndarray, max_displacement: float = None
+) -> np.ndarray:
+    """
+        Detects frames in which a bodypart is further than max_displacement from
+        the median of its position over 5 frames (i.e. jumps lasting up to 2 frames).
+        If max_displacement is None, for each bodypart it's 10 times the median
+        displacement between frames.
+
+        Returns:
+            (n_frames, n_bodyparts) boolean array, True at jumps
+    """
+    if max_displacement is None:
+        max_displacement = 10 * nan_percentile(
+            distance(pose[1:], pose[:-1]), 50
+        )
+    return distance(pose, median5(pose)) > max_displacement
+
+
+def detect_bone_violations(
+    pose: np.ndarray, animal: Animal, tolerance: float = 1.5
+) -> np.ndarray:
+    """
+        Detects frames in which a bone is longer than tolerance times
+        the 95th percentile of its length. The bodypart with fewer bones is flagged
+        (e.g. the paw and not the body) or both if they have the same number.
+
+        Returns:
+            (n_frames, n_bodyparts) boolean array, True at violations
+    """
+    names = list(animal.bodyparts_names)
+    bones = [
+        (names.index(bone.bp1.name), names.index(bone.bp2.name))
+        for bone in animal.bones
+    ]
+    degree = np.bincount(np.ravel(bones), minlength=len(names))
+
+    violations = np.zeros(pose.shape[:2], dtype=bool)
+    for bp1, bp2 in bones:
+        length = distance(pose[:, bp1], pose[:, bp2])
+        too_long = length > tolerance * nan_percentile(length, 95)
+        if degree[bp1] <= degree[bp2]:
+            violations[:, bp1] |= too_long
+        if degree[bp2] <= degree[bp1]:
+            violations[:, bp2] |= too_long
+    return violations
+
+
+def repair_pose(
+    animal: Animal,
+    pose: np.ndarray,
+    max_displacement: float = None,
+    bone_tolerance: float = 1.5,
+    swap_ratio: float = 0.5,
+    max_gap: int = 10,
+    method: str = "linear",
+) -> Tuple[np.ndarray, CleaningReport]:
+    """
+        Repairs tracking errors in a pose tensor: left/right swaps are
+        swapped back, jumps and bone length violations are replaced by
+        interpolation over gaps up to max_gap frames long.
+
+        Returns:
+            repaired pose tensor and a CleaningReport with the frames changed
+    """
+    pose = pose.copy()
+
+    swaps = detect_swaps(pose, animal, ratio=swap_ratio)
+    for left, right in left_right_pairs(animal):
+        frames = swaps[:, left]
+        pose[frames, left], pose[frames, right] = (
+            pose[frames, right],
+            pose[frames, left],
+        )
+
+    jumps = detect_jumps(pose, max_displacement=max_displacement)
+    bone_violations = detect_bone_violations(
+        pose, animal, tolerance=bone_tolerance
+    )
+
+    missing = np.isnan(pose[:, :, 0])
+    pose[jumps | bone_violations] = np.nan
+    pose = fill_gaps(pose, max_gap=max_gap, method=method)
+    filled = (jumps | bone_violations | missing) & ~np.isnan(pose[:, :, 0])
+
+    report = CleaningReport(
+        list(animal.bodyparts_names), swaps, jumps, bone_violations, filled
+    )
+    return pose, report
+
+
+def repair_tracking(
+    animal: Animal, tracking, **kwargs
+) -> Tuple[dict, CleaningReport]:
+    """
+        Repairs tracking data before creating a Locomotion,
+        see repair_pose for the arguments.
+
+        Returns:
+            tracking data as a dictionary of {bodypart}_x, {bodypart}_y arrays
+            and a CleaningReport with the frames changed
+    """
+    pose, _ = to_pose_tensor(animal, tracking)
+    pose, report = repair_pose(animal, pose, **kwargs)
+    return to_tracking(animal, pose), report
@@ -0,0 +1,82 @@
+"""
+    Command line interface, e.g.:
+        kino batch "data/*.h5" -o results --fps 60 --workers 8
+"""
+
+import argparse
+from typing import List
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="kino", description="Locomotion kinematics analysis"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser(
+        "batch", help="Process multiple tracking files in parallel"
+    )
+    batch.add_argument(
+        "source", help="Folder with .h5 tracking files or glob pattern"
+    )
+    batch.add_argument("-o", "--output", required=True, help="Output folder")
+    batch.add_argument(
+        "--animal",
+        default="mouse",
+        help='"mouse" or path to a JSON file with the animal data',
+    )
+    batch.add_argument("--fps", type=int, default=60)
+    batch.add_argument(
+        "-n", "--workers", type=int, default=None, help="Number of workers"
+    )
+    batch.add_argument(
+        "--chunksize",
+        type=int,
+        default=1,
+        help="Number of sessions sent to a worker at once",
+    )
+    batch.add_argument(
+        "--key", default=None, help="Key of the tracking data in .h5 files"
+    )
+    batch.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Re-process sessions already processed",
+    )
+    batch.add_argument(
+        "--profile",
+        default=None,
+        help="Save time spent in each processing stage to this JSON file",
+    )
+    return parser
+
+
+def main(argv: List[str] = None):
+    args = make_parser().parse_args(argv)
+
+    if args.command == "batch":
+        from kino import profiling
+        from kino.batch import run_batch
+
+        if args.profile:
+            profiling.enable()
+
+        summary = run_batch(
+            args.source,
+            args.output,
+            animal=args.animal,
+            fps=args.fps,
+            n_workers=args.workers,
+            chunksize=args.chunksize,
+            key=args.key,
+            overwrite=args.overwrite,
+            profile=bool(args.profile),
+        )
+        print(f"Processed {len(summary)} sessions, results in {args.output}")
+
+        if args.profile:
+            profiling.current.to_json(args.profile)
+
+
+if __name__ == "__main__":
+    main()
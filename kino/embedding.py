@@ -0,0 +1,270 @@
+"""
+    Streaming PCA of egocentric poses. The mean and scatter matrix of the
+    pose vectors are accumulated chunk by chunk, so memory use only depends
+    on the chunk size, and accumulators of different sessions can be merged.
+    Components are the eigenvectors of the scatter matrix: the result is the
+    same as a PCA of all frames at once.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Sequence, Tuple, Union, TYPE_CHECKING
+
+from kino.io import ColumnStore
+from kino.progress import track
+
+if TYPE_CHECKING:
+    from kino.locomotion import EgocentricLocomotion
+
+
+def pose_chunks(
+    egocentric: EgocentricLocomotion,
+    bodyparts: List[str] = None,
+    chunk_size: int = 10_000,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+        Iterates over chunks of the flattened egocentric pose. For
+        saved sessions only the chunk is read from disk.
+
+        Yields:
+            first frame of the chunk and (n_frames, 2 * n_bodyparts) array
+    """
+    bodyparts = bodyparts or list(egocentric.animal.bodyparts_names)
+    trajectories = [egocentric.bodyparts[bp] for bp in bodyparts]
+    n_frames = len(trajectories[0].x)
+    for start in range(0, n_frames, chunk_size):
+        stop = min(start + chunk_size, n_frames)
+        yield start, np.column_stack(
+            [
+                np.column_stack([t.x[start:stop], t.y[start:stop]])
+                for t in trajectories
+            ]
+        )
+
+
+class PoseEmbedding:
+    """
+        Incremental PCA of pose vectors (flattened egocentric poses)
+    """
+
+    def __init__(
+        self,
+        n_components: int = 10,
+        bodyparts: List[str] = None,
+        chunk_size: int = 10_000,
+    ):
+        self.n_components = n_components
+        self.bodyparts = bodyparts
+        self.chunk_size = chunk_size
+
+        self.n_samples = 0
+        self.mean: np.ndarray = None
+        self.scatter: np.ndarray = None
+        self._pca = None
+
+    def __repr__(self) -> str:
+        return (
+            f"PoseEmbedding: {self.n_components} components, "
+            f"{self.n_samples} frames"
+        )
+
+    def partial_fit(self, vectors: np.ndarray) -> PoseEmbedding:
+        """
+            Adds a chunk of pose vectors ((n_frames, 2 * n_bodyparts)
+            or (n_frames, n_bodyparts, 2) array). Frames with NaNs are skipped.
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        vectors = vectors.reshape(len(vectors), -1)
+        vectors = vectors[~np.isnan(vectors).any(axis=1)]
+        if not len(vectors):
+            return self
+
+        mean = vectors.mean(axis=0)
+        centered = vectors - mean
+        return self._update(len(vectors), mean, centered.T @ centered)
+
+    def _update(
+        self, n: int, mean: np.ndarray, scatter: np.ndarray
+    ) -> PoseEmbedding:
+        """
+            Merges the statistics of a set of samples (pairwise update
+            of the mean and scatter matrix)
+        """
+        if self.n_samples == 0:
+            self.n_samples, self.mean, self.scatter = n, mean, scatter
+        else:
+            total = self.n_samples + n
+            delta = mean - self.mean
+            self.scatter = (
+                self.scatter
+                + scatter
+                + np.outer(delta, delta) * self.n_samples * n / total
+            )
+            self.mean = self.mean + delta * n / total
+            self.n_samples = total
+        self._pca = None
+        return self
+
+    def merge(self, other: PoseEmbedding) -> PoseEmbedding:
+        """
+            Adds the frames of another embedding (e.g. fitted on other
+            sessions in a different process) to this one
+        """
+        if other.n_samples:
+            self._update(other.n_samples, other.mean, other.scatter)
+        return self
+
+    def fit_session(self, egocentric: EgocentricLocomotion) -> PoseEmbedding:
+        """
+            Adds all frames of a session, one chunk at the time
+        """
+        if self.bodyparts is None:
+            self.bodyparts = list(egocentric.animal.bodyparts_names)
+        for _, vectors in pose_chunks(
+            egocentric, self.bodyparts, self.chunk_size
+        ):
+            self.partial_fit(vectors)
+        return self
+
+    def _decompose(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._pca is None:
+            if not self.n_samples:
+                raise ValueError("The embedding has not been fitted")
+            variance, vectors = np.linalg.eigh(self.covariance)
+            order = np.argsort(variance)[::-1][: self.n_components]
+            components = vectors[:, order].T
+
+            # same sign for every fit: the largest loading is positive
+            largest = np.abs(components).argmax(axis=1)
+            signs = np.sign(components[np.arange(len(components)), largest])
+            self._pca = components * signs[:, None], variance[order]
+        return self._pca
+
+    @property
+    def covariance(self) -> np.ndarray:
+        return self.scatter / max(self.n_samples - 1, 1)
+
+    @property
+    def components(self) -> np.ndarray:
+        """
+            Principal components: (n_components, 2 * n_bodyparts) array
+        """
+        return self._decompose()[0]
+
+    @property
+    def explained_variance(self) -> np.ndarray:
+        return self._decompose()[1]
+
+    @property
+    def explained_variance_ratio(self) -> np.ndarray:
+        return self.explained_variance / np.trace(self.covariance)
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """
+            Projects pose vectors on the components:
+            (n_frames, n_components) array
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        vectors = vectors.reshape(len(vectors), -1)
+        return (vectors - self.mean) @ self.components.T
+
+    def transform_session(
+        self, egocentric: EgocentricLocomotion, out: np.ndarray = None
+    ) -> np.ndarray:
+        """
+            Projects a session one chunk at the time. out can be a memory mapped
+            array (e.g. from ColumnStore.allocate) so that the embedding of
+            long sessions is written straight to disk.
+
+            Returns:
+                (n_frames, n_components) array, NaN at
+                frames with missing bodyparts
+        """
+        if self.bodyparts is None:
+            self.bodyparts = list(egocentric.animal.bodyparts_names)
+        n_frames = len(egocentric.bodyparts[self.bodyparts[0]].x)
+        if out is None:
+            out = np.full((n_frames, len(self.components)), np.nan)
+
+        for start, vectors in pose_chunks(
+            egocentric, self.bodyparts, self.chunk_size
+        ):
+            out[start : start + len(vectors)] = self.transform(vectors)
+        return out
+
+    def save(self, path: Union[str, Path]) -> ColumnStore:
+        """
+            Saves the accumulated statistics and components to a folder
+        """
+        store = ColumnStore(path, mode="w")
+        store.write("mean", self.mean)
+        store.write("scatter", self.scatter)
+        store.write("components", self.components)
+        store.save_metadata(
+            n_components=self.n_components,
+            bodyparts=self.bodyparts,
+            chunk_size=self.chunk_size,
+            n_samples=self.n_samples,
+        )
+        return store
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> PoseEmbedding:
+        """
+            Loads an embedding saved with .save, it can be used to project new
+            sessions or updated with more data
+        """
+        store = ColumnStore(path, mode="r")
+        attributes = dict(store.attributes)
+        n_samples = attributes.pop("n_samples")
+
+        embedding = cls(**attributes)
+        embedding.n_samples = n_samples
+        embedding.mean = np.asarray(store.read("mean"))
+        embedding.scatter = np.asarray(store.read("scatter"))
+        return embedding
+
+
+def _fit_saved_session(
+    path: Path, n_components: int, bodyparts: List[str], chunk_size: int
+) -> PoseEmbedding:
+    from kino.locomotion import EgocentricLocomotion
+
+    return PoseEmbedding(n_components, bodyparts, chunk_size).fit_session(
+        EgocentricLocomotion.load(path)
+    )
+
+
+def fit_sessions(
+    paths: Sequence[Union[str, Path]],
+    n_components: int = 10,
+    bodyparts: List[str] = None,
+    chunk_size: int = 10_000,
+    n_workers: int = None,
+) -> PoseEmbedding:
+    """
+        Fits an embedding on saved EgocentricLocomotion sessions, in parallel.
+        Each worker memory maps a session and reads it in chunks.
+    """
+    embedding = PoseEmbedding(n_components, bodyparts, chunk_size)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        results = executor.map(
+            _fit_saved_session,
+            [Path(path) for path in paths],
+            [n_components] * len(paths),
+            [bodyparts] * len(paths),
+            [chunk_size] * len(paths),
+        )
+        for session in track(
+            results,
+            total=len(paths),
+            description="Fitting pose embedding",
+            transient=True,
+        ):
+            if embedding.bodyparts is None:
+                embedding.bodyparts = session.bodyparts
+            embedding.merge(session)
+    return embedding
@@ -0,0 +1,189 @@
+"""
+    Extraction of data in windows around events (e.g. swing onsets
+    or turns). Windows are taken from strided views over the array of
+    each feature, so no copy of the data is made apart from the output array.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from kino.locomotion import Locomotion
+
+
+# kinematic quantities extracted by default for each bodypart
+QUANTITIES = ("x", "y", "speed", "thetadot")
+
+
+def event_windows(
+    data: np.ndarray,
+    events: Sequence[int],
+    before: int,
+    after: int,
+    fill: float = np.nan,
+) -> np.ndarray:
+    """
+        Takes the data in a window [event - before, event + after] around each event.
+        Frames of windows extending past the start/end of the data are set to fill.
+
+        Arguments:
+            data: (n_frames, ...) array
+            events: frame of each event
+            before, after: number of frames before/after the event
+
+        Returns:
+            (n_events, before + after + 1, ...) array
+    """
+    data = np.asarray(data)
+    events = np.asarray(events, dtype=int)
+    length = before + after + 1
+    starts = events - before
+
+    windows = np.full(
+        (len(events), length) + data.shape[1:],
+        fill,
+        dtype=np.result_type(data, np.asarray(fill)),
+    )
+    inner = (starts >= 0) & (starts + length <= len(data))
+    if len(data) >= length and inner.any():
+        views = np.lib.stride_tricks.sliding_window_view(data, length, axis=0)
+        windows[inner] = np.moveaxis(views[starts[inner]], -1, 1)
+
+    # windows at the edges: only the frames within the data are taken
+    if not inner.all():
+        frames = starts[~inner, None] + np.arange(length)
+        valid = (frames >= 0) & (frames < len(data))
+        edge = windows[~inner]
+        edge[valid] = data[frames[valid]]
+        windows[~inner] = edge
+    return windows
+
+
+@dataclass
+class EventWindows:
+    """
+        Data aligned to events: windows has shape (n_events, n_frames, n_features)
+        and time gives the frame of each window sample relative to the event.
+    """
+
+    windows: np.ndarray
+    features: List[str]
+    time: np.ndarray
+    events: np.ndarray
+
+    def __repr__(self) -> str:
+        return f"EventWindows: {len(self.events)} events, {len(self.features)} features"
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __getitem__(self, feature: str) -> np.ndarray:
+        """
+            Windows of one feature: (n_events, n_frames) array
+        """
+        return self.windows[:, :, self.features.index(feature)]
+
+    def mean(self) -> np.ndarray:
+        """
+            Average across events: (n_frames, n_features) array
+        """
+        return np.nanmean(self.windows, axis=0)
+
+
+def feature_columns(
+    locomotion: Locomotion,
+    bodyparts: List[str] = None,
+    quantities: Sequence[str] = QUANTITIES,
+    joints: bool = False,
+) -> Tuple[List[np.ndarray], List[str]]:
+    """
+        Kinematic quantities of each bodypart (e.g. "speed", or "velocity"
+        for both components of a vector), without copying them.
+
+        Returns:
+            list of (n_frames,) arrays and features names ({bodypart}.{quantity})
+    """
+    from kino.geometry import Vector
+
+    columns, features = [], []
+    for bp in bodyparts or list(locomotion.bodyparts.keys()):
+        trajectory = locomotion.bodyparts[bp]
+        for quantity in quantities:
+            value = getattr(trajectory, quantity)
+            if isinstance(value, Vector):
+                columns.extend([value.x, value.y])
+                features.extend([f"{bp}.{quantity}_x", f"{bp}.{quantity}_y"])
+            else:
+                columns.append(value)
+                features.append(f"{bp}.{quantity}")
+
+    if joints:
+        columns.extend(np.asarray(locomotion.joints.angle).T)
+        features.extend(f"{joint}.angle" for joint in locomotion.joints.joints)
+    return columns, features
+
+
+def locomotion_features(
+    locomotion: Locomotion,
+    bodyparts: List[str] = None,
+    quantities: Sequence[str] = QUANTITIES,
+    joints: bool = False,
+) -> Tuple[np.ndarray, List[str]]:
+    """
+        Stacks kinematic quantities of each bodypart in a single
+        array (a copy of the data), see feature_columns.
+
+        Returns:
+            (n_frames, n_features) array and features names
+    """
+    columns, features = feature_columns(
+        locomotion, bodyparts, quantities, joints
+    )
+    return np.column_stack(columns), features
+
+
+def extract_windows(
+    locomotion: Locomotion,
+    events: Union[Sequence[int], np.ndarray],
+    before: int,
+    after: int = None,
+    bodyparts: List[str] = None,
+    quantities: Sequence[str] = QUANTITIES,
+    joints: bool = False,
+) -> EventWindows:
+    """
+        Takes the kinematics of all bodyparts in a window around each event
+        (e.g. locomotion.paws['left_fl'].swings_start).
+
+        Arguments:
+            locomotion: Locomotion
+            events: frame of each event
+            before, after: number of frames before/after the event (after=before if None)
+            bodyparts: bodyparts to use (all if None)
+            quantities: Trajectory attributes to use
+            joints: if True the joint angles are included
+    """
+    after = before if after is None else after
+    columns, features = feature_columns(
+        locomotion, bodyparts=bodyparts, quantities=quantities, joints=joints
+    )
+
+    # windows of each feature are written to the output array
+    # without stacking the features first
+    events = np.asarray(events, dtype=int)
+    windows = np.empty(
+        (len(events), before + after + 1, len(columns)),
+        dtype=np.result_type(np.nan, *{column.dtype for column in columns}),
+    )
+    for n, column in enumerate(columns):
+        windows[:, :, n] = event_windows(column, events, before, after)
+
+    return EventWindows(
+        windows,
+        features,
+        np.arange(-before, after + 1),
+        np.asarray(events, dtype=int),
+    )
@@ -0,0 +1,264 @@
+"""
+    Frame-level feature matrices for behaviour classifiers: statistics of
+    kinematic quantities over sliding windows centered on each frame.
+    Rolling statistics are computed for all features at once with cumulative
+    sums and strided views, and long sessions are processed in chunks
+    written to a memory mapped float32 array.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Sequence, Tuple, Union, TYPE_CHECKING
+
+from kino.events import locomotion_features
+from kino.io import ColumnStore
+from kino.math import running_extremum
+from kino.progress import track
+
+if TYPE_CHECKING:
+    from kino.locomotion import Locomotion, EgocentricLocomotion
+
+
+STATISTICS = ("mean", "std", "min", "max", "slope")
+QUANTITIES = (
+    "speed",
+    "curvature",
+    "thetadot",
+    "longitudinal_acceleration",
+    "normal_acceleration",
+)
+
+
+def rolling_statistics(
+    data: np.ndarray,
+    window: int,
+    statistics: Sequence[str] = STATISTICS,
+    fps: int = 1,
+) -> np.ndarray:
+    """
+        Statistics of each column of data in a window of window // 2 frames
+        on either side of each frame (truncated at the edges), ignoring NaNs.
+        slope is the least squares slope (change per second).
+
+        Arguments:
+            data: (n_frames, n_features) array
+            window: window size in frames
+            statistics: names of the statistics to compute (see STATISTICS)
+
+        Returns:
+            (n_frames, n_features, n_statistics) array
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim == 1:
+        data = data[:, None]
+    half = window // 2
+    size = 2 * half + 1
+    T, F = data.shape
+
+    padding = np.full((half, F), np.nan)
+    padded = np.concatenate([padding, data, padding])
+    valid = ~np.isnan(padded)
+
+    # values are centered to reduce the cancellation errors of cumulative sums
+    with np.errstate(invalid="ignore"):
+        center = np.nan_to_num(np.nanmean(data, axis=0)) if T else np.zeros(F)
+    values = np.where(valid, padded - center, 0)
+
+    def window_sum(x: np.ndarray) -> np.ndarray:
+        cumulative = np.concatenate([np.zeros((1, F)), np.cumsum(x, axis=0)])
+        return cumulative[size:] - cumulative[:-size]
+
+    n = window_sum(valid.astype(np.float64))
+    sums = window_sum(values)
+
+    output = np.full((T, F, len(statistics)), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / n
+        for s, statistic in enumerate(statistics):
+            if statistic == "mean":
+                output[:, :, s] = mean + center
+            elif statistic == "std":
+                variance = window_sum(values ** 2) / n - mean ** 2
+                output[:, :, s] = np.sqrt(np.maximum(variance, 0))
+            elif statistic == "min":
+                output[:, :, s] = running_extremum(np.fmin, padded, size)
+            elif statistic == "max":
+                output[:, :, s] = running_extremum(np.fmax, padded, size)
+            elif statistic == "slope":
+                # sums of k * x over the window (k = frame within the window)
+                k = np.arange(size, dtype=np.float64)
+                views = np.lib.stride_tricks.sliding_window_view(
+                    values, size, axis=0
+                )
+                valid_views = np.lib.stride_tricks.sliding_window_view(
+                    valid, size, axis=0
+                )
+                sum_kx = views @ k
+                sum_k = valid_views @ k
+                sum_kk = valid_views @ k ** 2
+                slope = (n * sum_kx - sum_k * sums) / (n * sum_kk - sum_k ** 2)
+                slope[n < 2] = np.nan
+                output[:, :, s] = slope * fps
+            else:
+                raise ValueError(
+                    f'Unknown statistic "{statistic}", use one of {STATISTICS}'
+                )
+    return output
+
+
+@dataclass
+class FeatureBuilder:
+    """
+        Builds (n_frames, n_features * n_windows * n_statistics) matrices
+        from the kinematics of some bodyparts (allocentric) and the position
+        of the paws in the egocentric reference frame.
+    """
+
+    bodyparts: Sequence[str] = ("com",)
+    quantities: Sequence[str] = QUANTITIES
+    egocentric_paws: bool = True
+    windows: Sequence[int] = (15,)
+    statistics: Sequence[str] = STATISTICS
+    chunk_size: int = 10_000
+
+    def base_features(
+        self, locomotion: Locomotion, egocentric: EgocentricLocomotion = None,
+    ) -> Tuple[np.ndarray, List[str]]:
+        """
+            Per-frame features: (n_frames, n_features) array and names
+        """
+        data, names = locomotion_features(
+            locomotion, list(self.bodyparts), self.quantities
+        )
+        if self.egocentric_paws:
+            if egocentric is None:
+                egocentric = locomotion.to_egocentric()
+            paws, paws_names = locomotion_features(
+                egocentric, list(egocentric.animal.paws), ("x", "y")
+            )
+            data = np.hstack([data, paws])
+            names += [f"egocentric.{name}" for name in paws_names]
+        return data, names
+
+    def names(self, base_names: List[str]) -> List[str]:
+        """
+            Names of the columns of the feature matrix
+        """
+        return [
+            f"{name}.{statistic}_{window}"
+            for window in self.windows
+            for name in base_names
+            for statistic in self.statistics
+        ]
+
+    def build(
+        self,
+        locomotion: Locomotion,
+        egocentric: EgocentricLocomotion = None,
+        out: np.ndarray = None,
+        data: np.ndarray = None,
+        base_names: List[str] = None,
+    ) -> Tuple[np.ndarray, List[str]]:
+        """
+            Builds the feature matrix of a session, one chunk of frames
+            at the time.
+
+            Arguments:
+                locomotion: Locomotion of the session
+                egocentric: its EgocentricLocomotion (computed if None)
+                out: array to write the features to (e.g. a memory mapped array
+                    from ColumnStore.allocate), a float32 array is created if None
+                data, base_names: per-frame features and their names if
+                    already computed with base_features
+
+            Returns:
+                feature matrix and columns names
+        """
+        if data is None:
+            data, base_names = self.base_features(locomotion, egocentric)
+        names = self.names(base_names)
+        T = len(data)
+        if out is None:
+            out = np.empty((T, len(names)), dtype=np.float32)
+
+        n_stats = len(base_names) * len(self.statistics)
+        for start in range(0, T, self.chunk_size):
+            stop = min(start + self.chunk_size, T)
+            for w, window in enumerate(self.windows):
+                # frames around the chunk are included so that the windows
+                # at the chunk edges are the same as without chunking
+                half = window // 2
+                first, last = max(0, start - half), min(T, stop + half)
+                statistics = rolling_statistics(
+                    data[first:last], window, self.statistics, locomotion.fps
+                )[start - first : stop - first]
+                out[
+                    start:stop, w * n_stats : (w + 1) * n_stats
+                ] = statistics.reshape(stop - start, -1)
+        return out, names
+
+
+def _build_session(
+    builder: FeatureBuilder, session: Path, output_folder: Path
+) -> str:
+    from kino.locomotion import Locomotion, EgocentricLocomotion
+
+    locomotion = Locomotion.load(session / "allocentric")
+    egocentric = (
+        EgocentricLocomotion.load(session / "egocentric")
+        if builder.egocentric_paws
+        else None
+    )
+    data, base_names = builder.base_features(locomotion, egocentric)
+    names = builder.names(base_names)
+
+    store = ColumnStore(output_folder / session.name, mode="w")
+    out = store.allocate("features", (len(data), len(names)), dtype=np.float32)
+    builder.build(
+        locomotion, egocentric, out=out, data=data, base_names=base_names
+    )
+    out.flush()
+    store.save_metadata(features=names, fps=locomotion.fps)
+    return session.name
+
+
+def build_sessions(
+    sessions: Sequence[Union[str, Path]],
+    output_folder: Union[str, Path],
+    builder: FeatureBuilder = None,
+    n_workers: int = None,
+) -> List[Path]:
+    """
+        Builds the feature matrices of sessions processed with run_batch
+        (folders with allocentric and egocentric subfolders) in parallel.
+        Each matrix is saved as the "features" column of a ColumnStore in
+        output_folder/session_name, with the columns names in its metadata.
+
+        Returns:
+            folders with the feature matrices
+    """
+    builder = builder or FeatureBuilder()
+    output_folder = Path(output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    sessions = [Path(session) for session in sessions]
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        results = executor.map(
+            _build_session,
+            [builder] * len(sessions),
+            sessions,
+            [output_folder] * len(sessions),
+        )
+        names = list(
+            track(
+                results,
+                total=len(sessions),
+                description="Building features",
+                transient=True,
+            )
+        )
+    return [output_folder / name for name in names]
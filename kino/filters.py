@@ -0,0 +1,268 @@
+"""
+    Smoothing backends estimating position, velocity and acceleration
+    from noisy tracking data. All functions work on (n_frames, ...) arrays,
+    each column (e.g. the x/y coordinates of all bodyparts) is filtered
+    independently but in a single pass over all columns.
+"""
+
+import numpy as np
+from math import factorial
+from functools import lru_cache
+from typing import Tuple
+
+from kino.profiling import profiled
+
+
+def constant_acceleration_model(
+    dt: float, process_noise: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Transition matrix F and process noise covariance Q of a
+        constant acceleration model with state (position, velocity, acceleration)
+        and random jerk with spectral density process_noise.
+    """
+    F = np.array([[1, dt, dt ** 2 / 2], [0, 1, dt], [0, 0, 1]])
+    Q = process_noise * np.array(
+        [
+            [dt ** 5 / 20, dt ** 4 / 8, dt ** 3 / 6],
+            [dt ** 4 / 8, dt ** 3 / 3, dt ** 2 / 2],
+            [dt ** 3 / 6, dt ** 2 / 2, dt],
+        ]
+    )
+    return F, Q
+
+
+@profiled("filters.kalman_smooth")
+def kalman_smooth(
+    values: np.ndarray,
+    fps: int = 1,
+    process_noise: float = 1e7,
+    measurement_noise: float = 1.0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+        Kalman filter with a constant acceleration model followed by a
+        Rauch-Tung-Striebel smoother. NaNs are treated as missing measurements
+        (the state is predicted through gaps).
+
+        The covariances don't depend on the data, only on which values are missing,
+        so they are computed once for each group of columns with the same missing
+        values and the recursion over frames only updates the states.
+
+        Arguments:
+            values: (n_frames, ...) array with the measured positions
+            fps: frame rate, velocity and acceleration are in units per second
+            process_noise: spectral density of the jerk, larger values follow the data
+                more closely
+            measurement_noise: variance of the measurements noise
+
+        Returns:
+            position, velocity, acceleration: arrays with the same shape as values
+    """
+    shape = values.shape
+    Z = np.asarray(values, dtype=float).reshape(len(values), -1)
+    T, N = Z.shape
+    F, Q = constant_acceleration_model(1 / fps, process_noise)
+    R = measurement_noise
+
+    # columns with the same missing values share the covariances
+    observed = ~np.isnan(Z)
+    if observed.all():
+        masks, group = np.ones((T, 1), dtype=bool), np.zeros(N, dtype=int)
+    else:
+        masks, group = np.unique(observed, axis=1, return_inverse=True)
+        group = group.ravel()
+    G = masks.shape[1]
+
+    # initial state: first measured position and unknown velocity/acceleration
+    first = np.argmax(observed, axis=0)
+    x = np.zeros((N, 3))
+    x[:, 0] = np.nan_to_num(Z[first, np.arange(N)])
+    P = np.broadcast_to(np.diag([R, 1e6, 1e6]) * 1.0, (G, 3, 3)).copy()
+
+    # frames at which the missing values change
+    changes = np.append(
+        np.where(np.any(masks[1:] != masks[:-1], axis=1))[0] + 1, T
+    )
+
+    # forward pass: covariances and gains. Once the covariance reaches its
+    # steady state it stays the same until the missing values change.
+    P_filtered = np.empty((T, G, 3, 3))
+    gains = np.empty((T, G, 3))
+    t = 0
+    while t < T:
+        if t > 0:
+            P = F @ P @ F.T + Q
+        K = P[:, :, 0] / (P[:, 0, 0] + R)[:, None]
+        K[~masks[t]] = 0
+        P = P - K[:, :, None] * P[:, None, 0, :]
+        gains[t], P_filtered[t] = K, P
+
+        if t > 0 and np.abs(P - P_filtered[t - 1]).max() <= 1e-12 * P.max():
+            end = changes[np.searchsorted(changes, t, side="right")]
+            gains[t + 1 : end], P_filtered[t + 1 : end] = K, P
+            t = end - 1
+            P = P_filtered[t]
+        t += 1
+
+    # forward pass: states
+    Zf = np.nan_to_num(Z)
+    gains = gains[:, group] if G > 1 else gains
+    x_filtered = np.empty((T, N, 3))
+    for t in range(T):
+        if t > 0:
+            x = x @ F.T
+        x += gains[t] * (Zf[t] - x[:, 0])[:, None]
+        x_filtered[t] = x
+
+    # backward pass: smoother gains for all frames at once
+    P_predicted = F @ P_filtered @ F.T + Q
+    C = P_filtered @ F.T @ np.linalg.inv(P_predicted)
+    if G == 1:
+        C = C[:, 0].transpose(0, 2, 1)
+    x_predicted = x_filtered @ F.T
+
+    x_smoothed = x_filtered.copy()
+    for t in range(T - 2, -1, -1):
+        delta = x_smoothed[t + 1] - x_predicted[t]
+        if G == 1:
+            x_smoothed[t] += delta @ C[t]
+        else:
+            x_smoothed[t] += np.einsum("nij,nj->ni", C[t][group], delta)
+
+    # columns without any measurement
+    x_smoothed[:, ~observed.any(axis=0)] = np.nan
+
+    return tuple(x_smoothed[:, :, i].reshape(shape) for i in range(3))  # type: ignore
+
+
+@lru_cache(maxsize=None)
+def savgol_coefficients(window: int, order: int) -> np.ndarray:
+    """
+        Savitzky-Golay coefficients for a window of (odd) length window
+        and a polynomial of given order.
+
+        Returns:
+            (3, window, window) array: coefficients[d, i] are the weights of the
+            samples in the window giving the d-th derivative (in units per frame)
+            of the fitted polynomial at the i-th position of the window
+    """
+    if window % 2 == 0 or window <= order:
+        raise ValueError(
+            f"Savitzky-Golay window must be odd and longer than the order, got {window}"
+        )
+
+    positions = np.arange(window) - window // 2
+    fit = np.linalg.pinv(np.vander(positions, order + 1, increasing=True))
+
+    coefficients = np.zeros((3, window, window))
+    for d in range(3):
+        derivative = np.zeros((window, order + 1))
+        for k in range(d, order + 1):
+            derivative[:, k] = (
+                factorial(k) / factorial(k - d) * positions ** (k - d)
+            )
+        coefficients[d] = derivative @ fit
+    coefficients.flags.writeable = False
+    return coefficients
+
+
+def _fit_valid_samples(
+    Z: np.ndarray,
+    missing: np.ndarray,
+    estimates: np.ndarray,
+    window: int,
+    order: int,
+):
+    """
+        Re-estimates (in place) the frames whose Savitzky-Golay window has
+        missing samples by least squares fits to the valid samples, solved
+        for all such frames at once
+    """
+    T = len(Z)
+    half = window // 2
+    starts = np.clip(np.arange(T) - half, 0, T - window)
+    missing_before = np.concatenate(
+        [np.zeros((1, Z.shape[1])), np.cumsum(missing, axis=0)]
+    )
+    in_window = missing_before[starts + window] - missing_before[starts]
+    frame, column = np.nonzero((in_window > 0) & ~missing)
+
+    estimates[missing] = np.nan
+    if not len(frame):
+        return
+
+    samples = Z[starts[frame][:, None] + np.arange(window), column[:, None]]
+    valid = ~np.isnan(samples)
+    weights = valid.astype(float)
+
+    positions = np.arange(window) - half
+    vander = np.vander(positions, order + 1, increasing=True)
+    A = np.einsum("nw,wi,wj->nij", weights, vander, vander)
+    b = np.einsum("nw,wi->ni", np.where(valid, samples, 0), vander)
+
+    enough = valid.sum(axis=1) > order
+    polynomial = np.full((len(frame), order + 1), np.nan)
+    polynomial[enough] = np.linalg.solve(A[enough], b[enough][..., None])[
+        ..., 0
+    ]
+
+    # evaluate the derivatives at the frame's position in the window
+    position = (frame - starts[frame] - half)[:, None].astype(float)
+    powers = np.arange(order + 1)
+    for d in range(3):
+        scale = np.array(
+            [factorial(k) / factorial(k - d) if k >= d else 0 for k in powers]
+        )
+        terms = scale * position ** np.maximum(powers - d, 0)
+        estimates[frame, column, d] = np.sum(polynomial * terms, axis=1)
+
+
+@profiled("filters.savgol_smooth")
+def savgol_smooth(
+    values: np.ndarray, window: int = 11, order: int = 3, fps: int = 1,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+        Savitzky-Golay filter: fits a polynomial in a moving window to get
+        the smoothed position and its first and second derivatives, with a single
+        matrix product over all columns. At the edges the polynomial fitted to
+        the first/last window is used. In windows with missing (NaN) samples
+        the polynomial is fitted to the valid samples only: the output is NaN
+        at missing frames and where fewer than order + 1 samples are valid.
+
+        Arguments:
+            values: (n_frames, ...) array with the measured positions
+            window: (odd) number of frames in the window
+            order: order of the polynomial
+            fps: frame rate, velocity and acceleration are in units per second
+
+        Returns:
+            position, velocity, acceleration: arrays with the same shape as values
+    """
+    shape = values.shape
+    Z = np.asarray(values, dtype=float).reshape(len(values), -1)
+    T = len(Z)
+    if T < window:
+        raise ValueError(
+            f"Savitzky-Golay window ({window}) is longer than the data ({T})"
+        )
+
+    coefficients = savgol_coefficients(window, order)
+    half = window // 2
+
+    estimates = np.empty((T, Z.shape[1], 3))
+    windows = np.lib.stride_tricks.sliding_window_view(Z, window, axis=0)
+    estimates[half : T - half] = windows @ coefficients[:, half].T
+    estimates[:half] = np.einsum(
+        "dij,jc->icd", coefficients[:, :half], Z[:window]
+    )
+    estimates[T - half :] = np.einsum(
+        "dij,jc->icd", coefficients[:, half + 1 :], Z[T - window :]
+    )
+
+    missing = np.isnan(Z)
+    if missing.any():
+        _fit_valid_samples(Z, missing, estimates, window, order)
+
+    estimates[..., 1] *= fps
+    estimates[..., 2] *= fps ** 2
+    return tuple(estimates[..., i].reshape(shape) for i in range(3))  # type: ignore
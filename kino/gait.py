@@ -0,0 +1,287 @@
+"""
+    Gait analysis in the frequency domain. Paw speed signals (normalized to
+    the CoM speed, see Paw) are cut into overlapping windows with a strided
+    view and transformed with a single rfft call for all paws and windows.
+    The stride frequency is the peak of the power spectrum in each window
+    and the phase lag between two paws is the phase of their cross
+    spectrum at the stride frequency.
+"""
+
+from __future__ import annotations
+
+import warnings
+import numpy as np
+from itertools import combinations
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from kino.locomotion import Locomotion
+
+
+@dataclass
+class Spectrogram:
+    """
+        Short-time spectra of a set of signals: spectra has shape
+        (n_signals, n_windows, n_frequencies), time is the center
+        of each window in seconds.
+    """
+
+    names: List[str]
+    spectra: np.ndarray
+    frequencies: np.ndarray
+    time: np.ndarray
+
+    def __repr__(self) -> str:
+        return (
+            f"Spectrogram: {len(self.names)} signals, "
+            f"{len(self.time)} windows"
+        )
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """
+            Power of one signal: (n_windows, n_frequencies) array
+        """
+        return self.power[self.names.index(name)]
+
+    @property
+    def power(self) -> np.ndarray:
+        return np.abs(self.spectra) ** 2
+
+    def stride_frequency(
+        self, min_frequency: float = 1, max_frequency: float = 15
+    ) -> np.ndarray:
+        """
+            Dominant frequency in each window, refined with parabolic
+            interpolation around the peak: (n_signals, n_windows) array
+        """
+        return dominant_frequency(
+            self.power, self.frequencies, min_frequency, max_frequency
+        )
+
+    def phase_lag(
+        self,
+        first: str,
+        second: str,
+        min_frequency: float = 1,
+        max_frequency: float = 15,
+    ) -> np.ndarray:
+        """
+            Phase (degrees, in (-180, 180]) by which the first signal leads the
+            second at the dominant frequency of their average spectrum in
+            each window: (n_windows,) array
+        """
+        return self.phase_lags(
+            [(first, second)], min_frequency, max_frequency
+        )[0]
+
+    def phase_lags(
+        self,
+        pairs: List[Tuple[str, str]] = None,
+        min_frequency: float = 1,
+        max_frequency: float = 15,
+    ) -> np.ndarray:
+        """
+            Phase lags of several pairs of signals (all pairs if None):
+            (n_pairs, n_windows) array
+        """
+        pairs = pairs or list(combinations(self.names, 2))
+        a = self.spectra[[self.names.index(first) for first, _ in pairs]]
+        b = self.spectra[[self.names.index(second) for _, second in pairs]]
+        cross = a * np.conj(b)
+
+        band = (self.frequencies >= min_frequency) & (
+            self.frequencies <= max_frequency
+        )
+        power = np.where(band, np.abs(a) ** 2 + np.abs(b) ** 2, -np.inf)
+        peak = power.argmax(axis=-1)
+        phase = np.degrees(
+            np.angle(np.take_along_axis(cross, peak[..., None], -1)[..., 0])
+        )
+        largest = power.max(axis=-1)
+        phase[~np.isfinite(largest) | (largest == 0)] = np.nan
+        return phase
+
+    def coherence(self, first: str, second: str) -> np.ndarray:
+        """
+            Magnitude squared coherence of two signals at each frequency,
+            from the average of the cross spectra over all windows
+        """
+        a = self.spectra[self.names.index(first)]
+        b = self.spectra[self.names.index(second)]
+        cross = np.nanmean(a * np.conj(b), axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.abs(cross) ** 2 / (
+                np.nanmean(np.abs(a) ** 2, axis=0)
+                * np.nanmean(np.abs(b) ** 2, axis=0)
+            )
+
+
+def dominant_frequency(
+    power: np.ndarray,
+    frequencies: np.ndarray,
+    min_frequency: float = 0,
+    max_frequency: float = np.inf,
+) -> np.ndarray:
+    """
+        Frequency of the peak of power spectra (..., n_frequencies) within
+        [min_frequency, max_frequency], with parabolic interpolation
+        of the log power around the peak
+    """
+    band = np.flatnonzero(
+        (frequencies >= min_frequency) & (frequencies <= max_frequency)
+    )
+    in_band = power[..., band]
+    peak = in_band.argmax(axis=-1)
+
+    # neighbours of the peak (clipped at the edges of the band)
+    log_power = np.log(np.maximum(in_band, 1e-300))
+    left = np.take_along_axis(
+        log_power, np.maximum(peak - 1, 0)[..., None], -1
+    )[..., 0]
+    center = np.take_along_axis(log_power, peak[..., None], -1)[..., 0]
+    right = np.take_along_axis(
+        log_power, np.minimum(peak + 1, len(band) - 1)[..., None], -1
+    )[..., 0]
+    curvature = left - 2 * center + right
+    with np.errstate(invalid="ignore", divide="ignore"):
+        offset = np.where(curvature < 0, 0.5 * (left - right) / curvature, 0)
+    offset = np.clip(np.nan_to_num(offset), -0.5, 0.5)
+
+    resolution = frequencies[1] - frequencies[0]
+    frequency = frequencies[band][peak] + offset * resolution
+    # spectra without power in the band or with NaNs (missing windows)
+    missing = ~(in_band.max(axis=-1) > 0)
+    return np.where(missing, np.nan, frequency)
+
+
+class StreamingSpectrogram:
+    """
+        Computes short-time spectra of signals received in chunks: windows of
+        window frames every step frames, the same windows as for the whole
+        recording at once. Samples needed by the next windows are kept
+        between chunks.
+    """
+
+    def __init__(self, fps: int, window: int = 128, step: int = 16):
+        if step > window:
+            raise ValueError("The step can't be larger than the window")
+        self.fps = fps
+        self.window = window
+        self.step = step
+        self.frequencies = np.fft.rfftfreq(window, d=1 / fps)
+        self.taper = np.hanning(window)
+
+        self._buffer: np.ndarray = None
+        self._start = 0  # frame of the first sample in the buffer
+
+    def update(self, chunk: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Adds a (n_signals, n_frames) chunk.
+
+            Returns:
+                spectra (n_signals, n_windows, n_frequencies) and time of the
+                windows completed by the chunk
+        """
+        chunk = np.atleast_2d(np.asarray(chunk, dtype=np.float64))
+        if self._buffer is None:
+            self._buffer = chunk
+        else:
+            self._buffer = np.concatenate([self._buffer, chunk], axis=1)
+
+        n_windows = max(
+            0, (self._buffer.shape[1] - self.window) // self.step + 1
+        )
+        if not n_windows:
+            return (
+                np.zeros(
+                    (len(self._buffer), 0, len(self.frequencies)), complex
+                ),
+                np.zeros(0),
+            )
+
+        windows = np.lib.stride_tricks.sliding_window_view(
+            self._buffer, self.window, axis=1
+        )[:, : n_windows * self.step : self.step]
+        spectra = window_spectra(windows, self.taper)
+
+        starts = self._start + np.arange(n_windows) * self.step
+        time = (starts + self.window / 2) / self.fps
+
+        # keep the samples of the next windows
+        consumed = n_windows * self.step
+        self._buffer = self._buffer[:, consumed:]
+        self._start += consumed
+        return spectra, time
+
+
+def window_spectra(windows: np.ndarray, taper: np.ndarray) -> np.ndarray:
+    """
+        rfft of windows (..., window) after removing their mean, missing
+        samples (NaN) are set to the mean and windows without data are NaN
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(windows, axis=-1, keepdims=True)
+    centered = np.nan_to_num(windows - mean)
+    spectra = np.fft.rfft(centered * taper, axis=-1)
+    spectra[np.isnan(mean[..., 0])] = np.nan
+    return spectra
+
+
+def spectrogram(
+    signals: np.ndarray,
+    fps: int,
+    names: List[str] = None,
+    window: int = 128,
+    step: int = 16,
+) -> Spectrogram:
+    """
+        Short-time spectra of (n_signals, n_frames) signals, in windows of
+        window frames every step frames (Hann taper)
+    """
+    signals = np.atleast_2d(signals)
+    spectra, time = StreamingSpectrogram(fps, window, step).update(signals)
+    return Spectrogram(
+        names or [f"signal_{n}" for n in range(len(signals))],
+        spectra,
+        np.fft.rfftfreq(window, d=1 / fps),
+        time,
+    )
+
+
+def spectrogram_chunks(
+    chunks: Iterable[np.ndarray],
+    fps: int,
+    names: List[str] = None,
+    window: int = 128,
+    step: int = 16,
+) -> Iterator[Spectrogram]:
+    """
+        Spectrogram of a long recording read in (n_signals, n_frames)
+        chunks, yields the windows completed by each chunk
+    """
+    streaming = StreamingSpectrogram(fps, window, step)
+    for chunk in chunks:
+        spectra, time = streaming.update(chunk)
+        yield Spectrogram(
+            names or [f"signal_{n}" for n in range(len(spectra))],
+            spectra,
+            streaming.frequencies,
+            time,
+        )
+
+
+def paw_spectrogram(
+    locomotion: Locomotion, window: int = 128, step: int = 16
+) -> Spectrogram:
+    """
+        Spectrogram of the normalized speed of all paws of a Locomotion
+    """
+    names = list(locomotion.paws.keys())
+    signals = np.stack(
+        [np.asarray(locomotion.paws[paw].normalized_speed) for paw in names]
+    )
+    return spectrogram(
+        signals, locomotion.fps, names=names, window=window, step=step
+    )
@@ -1,32 +1,51 @@
 from __future__ import annotations
 
 import sys
+import weakref
 
 sys.path.append("./")
 
 import numpy as np
-from typing import Union
+from typing import Union, List, Tuple
 from dataclasses import dataclass
 
 from myterial import blue_grey_dark
 
 import kino.geometry as kg
 from kino.geometry import Vector
+from kino.io import Columnar
+from kino.profiling import profiled
+from kino.filters import kalman_smooth, savgol_smooth
 from kino.geometry import vectors_utils as vu
 from kino.math import (
     smooth,
     derivative,
     angular_derivative,
     resample_linear_1d,
+    nan_gradient,
+    interpolate_at,
+    uniform_time,
 )
 
 
-class Trajectory:
+class Trajectory(Columnar):
     """
         Class representing a 2D trajectory specified by a set of XY coordinates.
         Computes kinematics variables on the trajectory (e.g. velocity vector)
     """
 
+    _derived = dict(
+        xy=lambda traj: Vector(traj.x, traj.y),
+        points=lambda traj: np.array([traj.x, traj.y]).T,
+    )
+
+    # noise parameters for the "kalman" smoothing method
+    kalman_process_noise: float = 1e7
+    kalman_measurement_noise: float = 1.0
+
+    # polynomial order for the "savgol" smoothing method
+    savgol_order: int = 3
+
     def __init__(
         self,
         x: np.ndarray,
@@ -36,7 +55,26 @@ class Trajectory:
         smoothing_window: int = 5,
         compute_kinematics: bool = True,
         color: str = blue_grey_dark,
+        smoothing_method: str = "window",
+        timestamps: np.ndarray = None,
     ):
+        """
+            Arguments:
+                x, y: coordinates at each frame
+                name: name of the trajectory
+                fps: (nominal) frame rate
+                smoothing_window: window used to smooth the kinematics (method "window")
+                compute_kinematics: if True the kinematics are computed
+                color: color used for plots
+                smoothing_method: "window" (smooth derivatives in a moving window),
+                    "kalman" (constant acceleration Kalman/RTS smoother) or
+                    "savgol" (Savitzky-Golay filter). With "kalman" and "savgol"
+                    x and y are the smoothed positions.
+                timestamps: time of each frame in seconds, for recordings with
+                    irregular frame times. Derivatives are computed against
+                    these times ("window" method only, "kalman" and "savgol"
+                    need uniform timestamps: use resample first).
+        """
 
         self.x = np.array(x)
         self.y = np.array(y)
@@ -45,9 +83,120 @@ class Trajectory:
         self.fps = fps
         self.name = name
         self.color = color
+        self.timestamps = (
+            None if timestamps is None else np.asarray(timestamps, dtype=float)
+        )
 
         if compute_kinematics:
-            self.compute_kinematics(smoothing_window)
+            self.compute_kinematics(smoothing_window, method=smoothing_method)
+
+    @classmethod
+    def batch(
+        cls,
+        X: np.ndarray,
+        Y: np.ndarray,
+        names: List[str],
+        colors: List[str],
+        fps: int = 1,
+        smoothing_window: int = 5,
+        smoothing_method: str = "window",
+        timestamps: np.ndarray = None,
+    ) -> List[Trajectory]:
+        """
+            Creates multiple trajectories from (n_frames, n_trajectories) arrays
+            of coordinates. With the "kalman" method all trajectories are
+            smoothed together in a single pass.
+        """
+        if smoothing_method not in ("kalman", "savgol"):
+            return [
+                cls(
+                    X[:, n],
+                    Y[:, n],
+                    name=name,
+                    color=color,
+                    fps=fps,
+                    smoothing_window=smoothing_window,
+                    smoothing_method=smoothing_method,
+                    timestamps=timestamps,
+                )
+                for n, (name, color) in enumerate(zip(names, colors))
+            ]
+
+        check_uniform(timestamps, fps, smoothing_method)
+
+        position, velocity, acceleration = cls.estimate_kinematics(
+            np.stack([X, Y], axis=2),
+            smoothing_method,
+            window=smoothing_window,
+            fps=fps,
+        )
+        trajectories = []
+        for n, (name, color) in enumerate(zip(names, colors)):
+            trajectory = cls(
+                X[:, n],
+                Y[:, n],
+                name=name,
+                color=color,
+                fps=fps,
+                compute_kinematics=False,
+                timestamps=timestamps,
+            )
+            trajectory.set_kinematics(
+                Vector(velocity[:, n]),
+                Vector(acceleration[:, n]),
+                position=position[:, n],
+            )
+            trajectories.append(trajectory)
+        return trajectories
+
+    @classmethod
+    def estimate_kinematics(
+        cls, positions: np.ndarray, method: str, window: int = 5, fps: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Smoothed position, velocity and acceleration of (n_frames, ..., 2)
+            positions with the "kalman", "savgol" or "window" method. The
+            Savitzky-Golay filter uses 2 * window + 1 frames, like the "window"
+            method which averages the derivatives over window frames on each
+            side (positions are not smoothed).
+        """
+        if method == "window":
+            columns = np.asarray(positions, dtype=float).reshape(
+                len(positions), -1
+            )
+
+            def differentiate(values: np.ndarray) -> np.ndarray:
+                derivatives = np.column_stack(
+                    [nan_gradient(column) for column in values.T]
+                )
+                if window > 1:
+                    derivatives = np.column_stack(
+                        [smooth(column, window) for column in derivatives.T]
+                    )
+                return derivatives * fps
+
+            velocity = differentiate(columns)
+            acceleration = differentiate(velocity)
+            return (
+                np.asarray(positions, dtype=float),
+                velocity.reshape(positions.shape),
+                acceleration.reshape(positions.shape),
+            )
+        elif method == "kalman":
+            return kalman_smooth(
+                positions,
+                fps=fps,
+                process_noise=cls.kalman_process_noise,
+                measurement_noise=cls.kalman_measurement_noise,
+            )
+        elif method == "savgol":
+            return savgol_smooth(
+                positions,
+                window=2 * window + 1,
+                order=cls.savgol_order,
+                fps=fps,
+            )
+        raise ValueError(f'Invalid smoothing method: "{method}"')
 
     def __len__(self) -> int:
         try:
@@ -70,13 +219,14 @@ class Trajectory:
             else:
                 return self.xy
         elif isinstance(item, str):
-            return self.__dict__[item]
+            return getattr(self, item)
 
     def __matmul__(self, other: Union[int, np.ndarray]) -> Trajectory:
         """
             Override @ operator to filter path at timestamps
             (e.g. at given timepoints)
         """
+        timestamps = getattr(self, "timestamps", None)
         new_traj = Trajectory(
             self.x[other],
             self.y[other],
@@ -84,6 +234,7 @@ class Trajectory:
             name=self.name,
             compute_kinematics=False,
             color=self.color,
+            timestamps=None if timestamps is None else timestamps[other],
         )
 
         new_traj.velocity = self.velocity[other]
@@ -115,10 +266,25 @@ class Trajectory:
     @property
     def time(self) -> np.ndarray:
         """
-            Array with time for each frame, in seconds
+            Array with time for each frame, in seconds (the
+            timestamps if given, frames / fps otherwise)
         """
+        timestamps = getattr(self, "timestamps", None)
+        if timestamps is not None:
+            return timestamps
         return self.frames / self.fps
 
+    @property
+    def frame_time(self) -> np.ndarray:
+        """
+            Time of each frame in units of (nominal) frames, or None
+            if frames are equally spaced (no timestamps)
+        """
+        timestamps = getattr(self, "timestamps", None)
+        if timestamps is None or len(timestamps) < 2:
+            return None
+        return timestamps * self.fps
+
     @property
     def duration(self) -> float:
         return self.time[-1]
@@ -129,11 +295,24 @@ class Trajectory:
         """
         return self @ np.arange(start, end)
 
-    def compute_kinematics(self, window: int = 5):
+    @profiled("geometry.trajectory.compute_kinematics")
+    def compute_kinematics(self, window: int = 5, method: str = "window"):
         """
             Computes kinematic quantities like
             speed, velocity, acceleration...
         """
+        if method in ("kalman", "savgol"):
+            check_uniform(self.timestamps, self.fps, method)
+            position, velocity, acceleration = self.estimate_kinematics(
+                self.points, method, window=window, fps=self.fps
+            )
+            self.set_kinematics(
+                Vector(velocity), Vector(acceleration), position=position
+            )
+            return
+        elif method != "window":
+            raise ValueError(f'Invalid smoothing method: "{method}"')
+
         # compute kinematics vectors / scalar quantities
         (
             self.velocity,
@@ -141,7 +320,9 @@ class Trajectory:
             self.normal,
             self.acceleration,
             self.curvature,
-        ) = vu.compute_vectors_from_coordinates(self.x, self.y, fps=self.fps)
+        ) = vu.compute_vectors_from_coordinates(
+            self.x, self.y, fps=self.fps, frame_time=self.frame_time
+        )
 
         # smooth kinematics
         if window > 1:
@@ -150,19 +331,72 @@ class Trajectory:
             self.tangent = vu.smooth_vector(self.tangent, window)
             self.normal = vu.smooth_vector(self.normal, window)
             self.curvature = smooth(self.curvature, window)
+        self._compute_scalar_kinematics()
 
+    def set_kinematics(
+        self,
+        velocity: Vector,
+        acceleration: Vector,
+        position: np.ndarray = None,
+    ):
+        """
+            Sets the kinematics from velocity and acceleration estimated
+            elsewhere (e.g. by a smoother over multiple trajectories).
+
+            Arguments:
+                velocity: velocity in units per second
+                acceleration: acceleration in units per second squared, it's stored
+                    as the change of velocity per frame like for the "window" method
+                position: (n_frames, 2) array with smoothed positions replacing x, y
+        """
+        if position is not None:
+            self.x, self.y = position[:, 0], position[:, 1]
+            self.xy = Vector(self.x, self.y)
+            self.points = np.array([self.x, self.y]).T
+
+        self.velocity = velocity
+        self.acceleration = Vector(
+            acceleration.x / self.fps, acceleration.y / self.fps
+        )
+        self.tangent = velocity.to_unit_vector()
+        self.normal = Vector(-self.tangent.y, self.tangent.x)
+
+        speed = velocity.magnitude
+        self.curvature = (
+            np.abs(acceleration.x * velocity.y - velocity.x * acceleration.y)
+            / speed ** 3
+        )
+        self._compute_scalar_kinematics()
+
+    def _compute_scalar_kinematics(self):
+        """
+            Computes scalar quantities from the
+            velocity and acceleration vectors
+        """
         self.speed = self.velocity.magnitude
         self.acceleration_mag = self.acceleration.magnitude
 
+        # duration of each frame (in frames) with irregular timestamps:
+        # steps since the previous frame for the backward differences of
+        # the angular kinematics, central durations for the distance
+        frame_time = self.frame_time
+        if frame_time is None:
+            steps, durations = 1, 1
+        else:
+            steps = np.diff(frame_time, prepend=frame_time[0] - 1)
+            durations = np.gradient(frame_time)
+
         # compute tangential angle and angular velocity
         self.theta = 180 - self.tangent.angle
-        self.thetadot = angular_derivative(self.theta) * self.fps
+        self.thetadot = angular_derivative(self.theta) / steps * self.fps
         self.thetadot[:3] = self.thetadot[4]
-        self.thetadotdot = derivative(self.thetadot)
+        self.thetadotdot = derivative(self.thetadot) / steps
 
         # compute distance travelled
-        self.distance = np.sum(self.speed) / self.fps
-        self.comulative_distance = np.cumsum(self.speed) / self.fps
+        self.distance = np.nansum(self.speed * durations) / self.fps
+        self.comulative_distance = (
+            np.nancumsum(self.speed * durations) / self.fps
+        )
 
         # compute longitudinal and normal accelrations projections
         self.longitudinal_acceleration = self.acceleration.dot(
@@ -267,11 +501,51 @@ class Trajectory:
         return Trajectory(
             resample_linear_1d(self.x, n_timesteps),
             resample_linear_1d(self.y, n_timesteps),
+            name=self.name,
+            color=self.color,
+            fps=self.fps * n_timesteps / len(self),
+        )
+
+    def resample(
+        self,
+        fps: float,
+        smoothing_window: int = 5,
+        smoothing_method: str = "window",
+    ) -> Trajectory:
+        """
+            Resamples the trajectory at a uniform frame rate (higher or lower)
+            by linear interpolation of x, y at the trajectory's time
+            (timestamps if given) and recomputes the kinematics.
+        """
+        time = uniform_time(self.time, fps)
+        xy = interpolate_at(np.column_stack([self.x, self.y]), self.time, time)
+        return Trajectory(
+            xy[:, 0],
+            xy[:, 1],
+            name=self.name,
+            color=self.color,
+            fps=fps,
+            smoothing_window=smoothing_window,
+            smoothing_method=smoothing_method,
+        )
+
+
+def check_uniform(timestamps: np.ndarray, fps: float, method: str):
+    """
+        Raises an error if timestamps are not uniformly spaced at fps,
+        which is needed by the "kalman" and "savgol" methods
+    """
+    if timestamps is None or len(timestamps) < 2:
+        return
+    if not np.allclose(np.diff(timestamps), 1 / fps, rtol=1e-3):
+        raise ValueError(
+            f'The "{method}" method needs uniformly spaced timestamps, '
+            "resample the data at a uniform frame rate first"
         )
 
 
 @dataclass
-class AnchoredTrajectory:
+class AnchoredTrajectory(Columnar):
     """
         Represents a sequence of 2D vectors at a sequence of points (XY).
     """
@@ -288,8 +562,13 @@ class AnchoredTrajectory:
     def __repr__(self) -> str:
         return f"AnchoredTrajectory: {self.name} | {len(self)} points"
 
+    def __setattr__(self, name: str, value):
+        if name == "vector":
+            self.invalidate()
+        super().__setattr__(name, value)
+
     def __matmul__(self, other: Union[int, np.ndarray]) -> AnchoredTrajectory:
-        return AnchoredTrajectory(
+        snapshot = AnchoredTrajectory(
             self.x[other],
             self.y[other],
             self.vector[other],
@@ -297,18 +576,63 @@ class AnchoredTrajectory:
             self.name,
         )
 
+        # the snapshot's angular kinematics are the parent's at the selected
+        # frames: those already computed are copied, the others are computed
+        # from the parent (if it still exists) when first accessed
+        cache = self.__dict__.get("_angular", {})
+        snapshot._angular = {
+            name: value[other] for name, value in cache.items()
+        }
+        snapshot._parent = (weakref.ref(self), other)
+        return snapshot
+
+    def __getstate__(self) -> dict:
+        # the reference to the parent can't be pickled
+        state = dict(self.__dict__)
+        state.pop("_parent", None)
+        return state
+
+    def invalidate(self):
+        """
+            Clears the cached angular kinematics, e.g. after
+            modifying the vector in place
+        """
+        self.__dict__.pop("_angular", None)
+        self.__dict__.pop("_parent", None)
+
+    def _angular_kinematics(self, name: str) -> np.ndarray:
+        """
+            Computes theta, thetadot or thetadotdot the first time
+            they are accessed and caches them
+        """
+        cache = self.__dict__.setdefault("_angular", {})
+        if name in cache:
+            return cache[name]
+
+        parent = self.__dict__.get("_parent")
+        anchored = parent[0]() if parent is not None else None
+        if anchored is not None:
+            value = getattr(anchored, name)[parent[1]]
+        elif name == "theta":
+            value = self.vector.angle2
+        else:
+            if name == "thetadot":
+                value = smooth(angular_derivative(self.theta))
+            else:
+                value = smooth(derivative(self.thetadot))
+            value[:2] = value[3]
+
+        cache[name] = value
+        return value
+
     @property
     def theta(self):
-        return self.vector.angle2
+        return self._angular_kinematics("theta")
 
     @property
     def thetadot(self):
-        val = smooth(angular_derivative(self.theta))
-        val[:2] = val[3]
-        return val
+        return self._angular_kinematics("thetadot")
 
     @property
     def thetadotdot(self):
-        val = smooth(derivative(self.thetadot))
-        val[:2] = val[3]
-        return val
+        return self._angular_kinematics("thetadotdot")
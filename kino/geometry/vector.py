@@ -1,16 +1,9 @@
 from __future__ import annotations
 
-from rich import print
-from rich.panel import Panel
-from rich.table import Table
-from rich import box
 import numpy as np
 from typing import Union, Tuple, List
 
-from myterial import pink, blue
-
 from kino.geometry import coordinates
-from kino.draw.gliphs import Arrow, Arrows
 
 
 class Vector:  # 2D vector
@@ -103,6 +96,8 @@ class Vector:  # 2D vector
             return np.apply_along_axis(np.linalg.norm, 1, vec)
 
     def draw(self, **kwargs):
+        from kino.draw.gliphs import Arrow, Arrows
+
         if not self.single_vec:
             Arrows(0, 0, self.angle, L=self.magnitude, **kwargs)
         else:
@@ -212,6 +207,12 @@ def print_vectors_angles_summary():
         It prints a summary table with the value of Vector.angle
         and Vector.angle2 for vectors at different angles
     """
+    from rich import print
+    from rich.panel import Panel
+    from rich.table import Table
+    from rich import box
+    from myterial import pink, blue
+
     # XY going around each quarter of the unit circle
     X = [1, 1, 0, -1, -1, -1, 0, 1, 1]
     Y = [0, 1, 1, 1, 0, -1, -1, -1, 0]
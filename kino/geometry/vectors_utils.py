@@ -1,12 +1,15 @@
 import numpy as np
 from typing import Tuple
 from kino.geometry.vector import Vector
+from kino.profiling import profiled
+from kino.math import smooth, nan_gradient
 
 np.seterr(all="ignore")
 
 
+@profiled("geometry.compute_vectors_from_coordinates")
 def compute_vectors_from_coordinates(
-    x: np.ndarray, y: np.ndarray, fps: int = 1
+    x: np.ndarray, y: np.ndarray, fps: int = 1, frame_time: np.ndarray = None
 ) -> Tuple[Vector, Vector, Vector, Vector, np.array]:
     """
         Given the X and Y position at each frame -
@@ -22,10 +25,19 @@ def compute_vectors_from_coordinates(
             ii. curvature
         
         See: https://stackoverflow.com/questions/28269379/curve-curvature-in-numpy
+
+        frame_time is the time of each frame in units of frames (time * fps),
+        for recordings with irregular frame times (e.g. dropped frames).
+        Frames next to missing (NaN) frames use one sided differences, so
+        NaNs are not spread to their neighbours.
     """
+
+    def gradient(values: np.ndarray) -> np.ndarray:
+        return nan_gradient(values, frame_time)
+
     # compute velocity vector
-    dx_dt = np.gradient(x)
-    dy_dt = np.gradient(y)
+    dx_dt = gradient(x)
+    dy_dt = gradient(y)
     velocity = (
         np.array([[dx_dt[i], dy_dt[i]] for i in range(dx_dt.size)]) * fps
     )
@@ -43,8 +55,8 @@ def compute_vectors_from_coordinates(
     tangent_x = tangent[:, 0]
     tangent_y = tangent[:, 1]
 
-    deriv_tangent_x = np.gradient(tangent_x)
-    deriv_tangent_y = np.gradient(tangent_y)
+    deriv_tangent_x = gradient(tangent_x)
+    deriv_tangent_y = gradient(tangent_y)
 
     dT_dt = np.array(
         [
@@ -60,9 +72,9 @@ def compute_vectors_from_coordinates(
     normal = np.array([1 / length_dT_dt] * 2).transpose() * dT_dt
 
     # get acceleration and curvature
-    d2s_dt2 = np.gradient(ds_dt)
-    d2x_dt2 = np.gradient(dx_dt)
-    d2y_dt2 = np.gradient(dy_dt)
+    d2s_dt2 = gradient(ds_dt)
+    d2x_dt2 = gradient(dx_dt)
+    d2y_dt2 = gradient(dy_dt)
 
     curvature = (
         np.abs(d2x_dt2 * dy_dt - dx_dt * d2y_dt2)
@@ -91,18 +103,11 @@ def vectors_mean(*vectors: Vector):
     return Vector(*np.mean([[v.x, v.y] for v in vectors], 0))
 
 
+@profiled("geometry.smooth_vector")
 def smooth_vector(vec: Vector, window: int = 5) -> Vector:
     """
         Given a Vector object with a series of 2D vectors,
-        it smooths the dynamics by binning the vector over time and 
-        take the mean vector for each bin.
+        it smooths the dynamics by taking the mean vector in
+        a window around each frame.
     """
-    T = len(vec)
-    means = []
-    for t in np.arange(0, T):
-        t_0 = t - window if t > window else 0
-        t_1 = t + window if T - t > window else T
-
-        means.append(vectors_mean(*[vec[i] for i in np.arange(t_0, t_1)]))
-
-    return Vector.from_list(means)
+    return Vector(smooth(vec.x, window), smooth(vec.y, window))
@@ -0,0 +1,271 @@
+"""
+    Spatial maps (occupancy, mean of kinematic quantities and heading
+    distribution in each bin) computed with np.bincount over flattened bin
+    indices. Maps are accumulators: data can be added in chunks and maps
+    built separately (e.g. in parallel for multiple sessions) can be merged.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from typing import Dict, List, Tuple, Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from kino.geometry import Trajectory
+    from kino.locomotion import Locomotion, EgocentricLocomotion
+
+
+class SpatialMap:
+    """
+        Accumulates the number of samples, sums of quantities and heading
+        counts in square bins of size bin_size over the area xlim, ylim.
+        Maps have shape (n_y_bins, n_x_bins), as needed by plt.imshow
+        with origin="lower".
+    """
+
+    def __init__(
+        self,
+        xlim: Tuple[float, float],
+        ylim: Tuple[float, float],
+        bin_size: float = 1,
+        n_heading_bins: int = 12,
+        fps: int = 1,
+    ):
+        self.xlim = tuple(xlim)
+        self.ylim = tuple(ylim)
+        self.bin_size = bin_size
+        self.n_heading_bins = n_heading_bins
+        self.fps = fps
+
+        self.shape = (
+            int(np.ceil((self.ylim[1] - self.ylim[0]) / bin_size)),
+            int(np.ceil((self.xlim[1] - self.xlim[0]) / bin_size)),
+        )
+        n_bins = self.shape[0] * self.shape[1]
+
+        self.counts = np.zeros(n_bins)
+        self.heading_counts = np.zeros(n_bins * n_heading_bins)
+        self.sums: Dict[str, np.ndarray] = {}
+        self.sums_counts: Dict[str, np.ndarray] = {}
+        self.n_outside = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"SpatialMap: {self.shape} bins, {int(self.counts.sum())} samples"
+        )
+
+    def __add__(self, other: SpatialMap) -> SpatialMap:
+        merged = SpatialMap(
+            self.xlim, self.ylim, self.bin_size, self.n_heading_bins, self.fps
+        )
+        merged.merge(self)
+        merged.merge(other)
+        return merged
+
+    def __iadd__(self, other: SpatialMap) -> SpatialMap:
+        return self.merge(other)
+
+    @property
+    def xedges(self) -> np.ndarray:
+        return self.xlim[0] + np.arange(self.shape[1] + 1) * self.bin_size
+
+    @property
+    def yedges(self) -> np.ndarray:
+        return self.ylim[0] + np.arange(self.shape[0] + 1) * self.bin_size
+
+    @property
+    def extent(self) -> List[float]:
+        """
+            Extent of the map for plt.imshow
+        """
+        return [
+            self.xedges[0],
+            self.xedges[-1],
+            self.yedges[0],
+            self.yedges[-1],
+        ]
+
+    def bin_index(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+            Flattened bin index of each point, -1 for points outside
+            of the map or with NaN coordinates
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        with np.errstate(invalid="ignore"):
+            ix = np.floor((x - self.xlim[0]) / self.bin_size)
+            iy = np.floor((y - self.ylim[0]) / self.bin_size)
+            inside = (
+                (ix >= 0)
+                & (ix < self.shape[1])
+                & (iy >= 0)
+                & (iy < self.shape[0])
+            )
+        index = np.full(len(x), -1, dtype=np.int64)
+        index[inside] = iy[inside].astype(np.int64) * self.shape[1] + ix[
+            inside
+        ].astype(np.int64)
+        return index
+
+    def add(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        heading: np.ndarray = None,
+        **quantities: np.ndarray,
+    ) -> SpatialMap:
+        """
+            Adds samples to the map.
+
+            Arguments:
+                x, y: coordinates of each sample
+                heading: angle (degrees) at each sample
+                quantities: values at each sample (e.g. speed=trajectory.speed)
+                    whose mean in each bin is computed
+        """
+        index = self.bin_index(x, y)
+        inside = index >= 0
+        self.n_outside += int((~inside).sum())
+        index = index[inside]
+        n_bins = len(self.counts)
+
+        self.counts += np.bincount(index, minlength=n_bins)
+
+        if heading is not None:
+            heading = np.asarray(heading, dtype=float)[inside]
+            valid = ~np.isnan(heading)
+            heading_bin = (
+                np.mod(heading[valid], 360) / 360 * self.n_heading_bins
+            ).astype(np.int64) % self.n_heading_bins
+            self.heading_counts += np.bincount(
+                index[valid] * self.n_heading_bins + heading_bin,
+                minlength=n_bins * self.n_heading_bins,
+            )
+
+        for name, values in quantities.items():
+            values = np.asarray(values, dtype=float)[inside]
+            valid = ~np.isnan(values)
+            if name not in self.sums:
+                self.sums[name] = np.zeros(n_bins)
+                self.sums_counts[name] = np.zeros(n_bins)
+            self.sums[name] += np.bincount(
+                index[valid], weights=values[valid], minlength=n_bins
+            )
+            self.sums_counts[name] += np.bincount(
+                index[valid], minlength=n_bins
+            )
+        return self
+
+    def add_trajectory(
+        self,
+        trajectory: Trajectory,
+        heading: np.ndarray = None,
+        quantities: Sequence[str] = ("speed",),
+    ) -> SpatialMap:
+        """
+            Adds the positions and kinematic quantities of a Trajectory. If heading
+            is not given, the direction of movement is used.
+        """
+        if heading is None:
+            heading = trajectory.velocity.angle
+        return self.add(
+            trajectory.x,
+            trajectory.y,
+            heading=heading,
+            **{name: getattr(trajectory, name) for name in quantities},
+        )
+
+    def add_locomotion(
+        self,
+        locomotion: Locomotion,
+        bodypart: str = "com",
+        quantities: Sequence[str] = ("speed",),
+    ) -> SpatialMap:
+        """
+            Adds a bodypart of a Locomotion, with the
+            orientation of the body axis as heading
+        """
+        return self.add_trajectory(
+            locomotion.bodyparts[bodypart],
+            heading=locomotion.body_axis.vector.angle2,
+            quantities=quantities,
+        )
+
+    def merge(self, other: SpatialMap) -> SpatialMap:
+        """
+            Adds the data of another map with the same bins and frame
+            rate to this one (counts are numbers of frames)
+        """
+        if (
+            other.xlim != self.xlim
+            or other.ylim != self.ylim
+            or other.bin_size != self.bin_size
+            or other.n_heading_bins != self.n_heading_bins
+        ):
+            raise ValueError("Can only merge maps with the same bins")
+        if other.fps != self.fps:
+            raise ValueError(
+                f"Can only merge maps with the same fps, got {self.fps} and "
+                f"{other.fps} (resample the data to a common frame rate)"
+            )
+
+        self.counts += other.counts
+        self.heading_counts += other.heading_counts
+        self.n_outside += other.n_outside
+        for name in other.sums:
+            if name not in self.sums:
+                self.sums[name] = np.zeros_like(self.counts)
+                self.sums_counts[name] = np.zeros_like(self.counts)
+            self.sums[name] += other.sums[name]
+            self.sums_counts[name] += other.sums_counts[name]
+        return self
+
+    @property
+    def occupancy(self) -> np.ndarray:
+        """
+            Time (in seconds) spent in each bin
+        """
+        return self.counts.reshape(self.shape) / self.fps
+
+    def mean(self, name: str) -> np.ndarray:
+        """
+            Mean of a quantity in each bin (NaN in bins without samples)
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sums[name] / self.sums_counts[name]
+        return mean.reshape(self.shape)
+
+    @property
+    def heading_distribution(self) -> np.ndarray:
+        """
+            Fraction of samples with heading in each heading bin:
+            (n_y_bins, n_x_bins, n_heading_bins) array
+        """
+        counts = self.heading_counts.reshape(
+            self.shape + (self.n_heading_bins,)
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return counts / counts.sum(axis=2, keepdims=True)
+
+
+def egocentric_paws_maps(
+    egocentric: EgocentricLocomotion,
+    xlim: Tuple[float, float] = (-5, 5),
+    ylim: Tuple[float, float] = (-5, 5),
+    bin_size: float = 0.25,
+    quantities: Sequence[str] = ("speed",),
+    maps: Dict[str, SpatialMap] = None,
+) -> Dict[str, SpatialMap]:
+    """
+        Maps of the paws positions in the body reference frame (from
+        Locomotion.to_egocentric). Pass the maps returned by a previous call
+        to accumulate data across sessions.
+    """
+    maps = maps or {}
+    for paw in egocentric.animal.paws:
+        if paw not in maps:
+            maps[paw] = SpatialMap(xlim, ylim, bin_size, fps=egocentric.fps)
+        maps[paw].add_trajectory(
+            egocentric.bodyparts[paw], quantities=quantities
+        )
+    return maps
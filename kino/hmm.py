@@ -0,0 +1,412 @@
+"""
+    Unsupervised segmentation of locomotor states (e.g. rest, walk, run, turn)
+    with a Gaussian hidden Markov model. Forward-backward and Viterbi work in
+    log space, vectorized over states and over sessions: sessions are padded
+    to the same length and processed together, padded frames have no emission
+    so they don't change the likelihood of the data.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from pathlib import Path
+from scipy.special import logsumexp
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+from typing import TYPE_CHECKING
+
+from kino.io import ColumnStore
+from kino.query import Intervals
+
+if TYPE_CHECKING:
+    from kino.locomotion import Locomotion
+
+
+LOG_2PI = np.log(2 * np.pi)
+
+
+def locomotion_states_features(locomotion: Locomotion) -> np.ndarray:
+    """
+        Features used for segmentation: com speed, absolute
+        angular velocity and fraction of paws in swing phase.
+
+        Returns:
+            (n_frames, 3) array
+    """
+    com = locomotion.com
+    swing = np.mean(
+        [np.asarray(paw.is_swing) for paw in locomotion.paws.values()], axis=0
+    )
+    return np.column_stack([com.speed, np.abs(com.thetadot), swing])
+
+
+def _pad(sequences: Sequence[np.ndarray],) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Pads sequences of (n_frames, n_features) arrays to the same length,
+        returns a (n_sequences, n_frames, n_features) array (NaN padded) and
+        a boolean mask of the valid frames
+    """
+    lengths = [len(sequence) for sequence in sequences]
+    padded = np.full(
+        (len(sequences), max(lengths), sequences[0].shape[1]), np.nan
+    )
+    mask = np.zeros(padded.shape[:2], dtype=bool)
+    for n, sequence in enumerate(sequences):
+        padded[n, : len(sequence)] = sequence
+        mask[n, : len(sequence)] = True
+    return padded, mask
+
+
+class GaussianHMM:
+    """
+        Hidden Markov model with Gaussian emissions (diagonal covariance).
+        Features are z-scored with the mean and std of the training data.
+        Missing (NaN) features are marginalized out.
+    """
+
+    def __init__(
+        self,
+        n_states: int = 4,
+        n_iter: int = 50,
+        tol: float = 1e-4,
+        min_variance: float = 1e-3,
+        self_transition: float = 0.95,
+        seed: int = 0,
+    ):
+        self.n_states = n_states
+        self.n_iter = n_iter
+        self.tol = tol
+        self.min_variance = min_variance
+        self.self_transition = self_transition
+        self.seed = seed
+
+        self.log_likelihoods: List[float] = []
+
+    def __repr__(self) -> str:
+        return f"GaussianHMM: {self.n_states} states"
+
+    def _initialize(self, X: np.ndarray):
+        """
+            Initializes the parameters from a (n_frames, n_features)
+            array of (z-scored) features with k-means
+        """
+        from sklearn.cluster import KMeans
+
+        complete = X[~np.isnan(X).any(axis=1)]
+        rng = np.random.default_rng(self.seed)
+        if len(complete) > 50_000:
+            complete = complete[
+                rng.choice(len(complete), 50_000, replace=False)
+            ]
+
+        kmeans = KMeans(self.n_states, n_init=4, random_state=self.seed)
+        labels = kmeans.fit_predict(complete)
+
+        self.means = kmeans.cluster_centers_
+        self.variances = np.stack(
+            [
+                complete[labels == k].var(axis=0)
+                if (labels == k).sum() > 1
+                else np.ones(X.shape[1])
+                for k in range(self.n_states)
+            ]
+        )
+        self.variances = np.maximum(self.variances, self.min_variance)
+
+        off_diagonal = (1 - self.self_transition) / max(self.n_states - 1, 1)
+        self.transitions = np.full(
+            (self.n_states, self.n_states), off_diagonal
+        )
+        np.fill_diagonal(self.transitions, self.self_transition)
+        self.start = np.full(self.n_states, 1 / self.n_states)
+
+    def _sort_states(self):
+        """
+            Sorts states by the mean of the first feature (e.g. speed)
+        """
+        order = np.argsort(self.means[:, 0])
+        self.means, self.variances = self.means[order], self.variances[order]
+        self.start = self.start[order]
+        self.transitions = self.transitions[np.ix_(order, order)]
+
+    def standardize(self, X: np.ndarray) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.offset) / self.scale
+
+    def log_emissions(self, X: np.ndarray) -> np.ndarray:
+        """
+            Log likelihood of (z-scored) features under each state:
+            (..., n_frames, n_states) array, 0 at frames without features
+        """
+        X = X[..., None, :]
+        missing = np.isnan(X)
+        squared = np.where(
+            missing,
+            0,
+            (X - self.means) ** 2 / self.variances
+            + np.log(self.variances)
+            + LOG_2PI,
+        )
+        return -0.5 * squared.sum(axis=-1)
+
+    def _forward_backward(
+        self, log_B: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Forward-backward over a batch of sequences.
+
+            Arguments:
+                log_B: (n_sequences, n_frames, n_states) log emissions
+
+            Returns:
+                log alpha, log beta (same shape as log_B) and the
+                log likelihood of each sequence
+        """
+        S, T, K = log_B.shape
+        log_A = np.log(self.transitions)
+
+        log_alpha = np.empty_like(log_B)
+        log_alpha[:, 0] = np.log(self.start) + log_B[:, 0]
+        for t in range(1, T):
+            log_alpha[:, t] = log_B[:, t] + logsumexp(
+                log_alpha[:, t - 1, :, None] + log_A, axis=1
+            )
+
+        log_beta = np.zeros_like(log_B)
+        for t in range(T - 2, -1, -1):
+            log_beta[:, t] = logsumexp(
+                log_A + (log_B[:, t + 1] + log_beta[:, t + 1])[:, None, :],
+                axis=2,
+            )
+        return log_alpha, log_beta, logsumexp(log_alpha[:, -1], axis=1)
+
+    def fit(self, sequences: Sequence[np.ndarray]) -> GaussianHMM:
+        """
+            Fits the model with Baum-Welch (EM) on multiple sequences at
+            once, e.g. the features of all sessions of a cohort.
+
+            Arguments:
+                sequences: list of (n_frames, n_features) arrays
+        """
+        sequences = [np.asarray(s, dtype=float) for s in sequences]
+        stacked = np.concatenate(sequences)
+        self.offset = np.nanmean(stacked, axis=0)
+        self.scale = np.nanstd(stacked, axis=0)
+        self.scale[~(self.scale > 0)] = 1
+
+        X, mask = _pad([self.standardize(s) for s in sequences])
+        self._initialize(X[mask])
+        observed = ~np.isnan(X) & mask[..., None]
+        values = np.where(observed, X, 0)
+
+        self.log_likelihoods = []
+        for _ in range(self.n_iter):
+            log_B = self.log_emissions(X)
+            log_B[~mask] = 0
+            log_alpha, log_beta, log_likelihood = self._forward_backward(log_B)
+            self.log_likelihoods.append(float(log_likelihood.sum()))
+
+            # posterior probability of the states at each frame
+            gamma = np.exp(
+                log_alpha + log_beta - log_likelihood[:, None, None]
+            )
+            gamma[~mask] = 0
+
+            # expected number of transitions, summed over frames
+            # without building (n_frames, n_states, n_states) arrays
+            u = log_alpha[:, :-1]
+            v = log_B[:, 1:] + log_beta[:, 1:]
+            u_max = u.max(axis=2, keepdims=True)
+            v_max = v.max(axis=2, keepdims=True)
+            scale = np.exp(u_max + v_max - log_likelihood[:, None, None])
+            scale[~mask[:, 1:]] = 0
+            xi = self.transitions * np.einsum(
+                "sti,stj->ij", np.exp(u - u_max), np.exp(v - v_max) * scale
+            )
+
+            # M step
+            self.start = gamma[:, 0].sum(axis=0) + 1e-10
+            self.start /= self.start.sum()
+            self.transitions = (xi + 1e-10) / (xi + 1e-10).sum(
+                axis=1, keepdims=True
+            )
+
+            weights = np.einsum("stk,std->kd", gamma, observed)
+            weights = np.maximum(weights, 1e-10)
+            self.means = np.einsum("stk,std->kd", gamma, values) / weights
+            squared = np.einsum("stk,std->kd", gamma, values ** 2) / weights
+            self.variances = np.maximum(
+                squared - self.means ** 2, self.min_variance
+            )
+
+            if len(self.log_likelihoods) > 1 and abs(
+                self.log_likelihoods[-1] - self.log_likelihoods[-2]
+            ) < self.tol * abs(self.log_likelihoods[-2]):
+                break
+
+        self._sort_states()
+        return self
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+            Posterior probability of each state at each
+            frame: (n_frames, n_states) array
+        """
+        log_B = self.log_emissions(self.standardize(X))[None]
+        log_alpha, log_beta, log_likelihood = self._forward_backward(log_B)
+        return np.exp(log_alpha + log_beta - log_likelihood[:, None, None])[0]
+
+    def decode(self, sequences: Sequence[np.ndarray]) -> List[np.ndarray]:
+        """
+            Most likely sequence of states (Viterbi) of each
+            sequence, all sequences are decoded at once
+        """
+        X, mask = _pad([self.standardize(s) for s in sequences])
+        log_B = self.log_emissions(X)
+        log_A = np.log(self.transitions)
+        S, T, K = log_B.shape
+
+        delta = np.log(self.start) + log_B[:, 0]
+        last = np.empty((S, K))
+        backpointers = np.zeros((S, T, K), dtype=np.int16)
+        lengths = mask.sum(axis=1)
+        for t in range(1, T):
+            scores = delta[:, :, None] + log_A
+            backpointers[:, t] = scores.argmax(axis=1)
+            delta = scores.max(axis=1) + log_B[:, t]
+            ending = lengths == t + 1
+            last[ending] = delta[ending]
+        last[lengths == 1] = (np.log(self.start) + log_B[:, 0])[lengths == 1]
+
+        states = []
+        for s, length in enumerate(lengths):
+            path = np.empty(length, dtype=int)
+            path[-1] = last[s].argmax()
+            for t in range(length - 1, 0, -1):
+                path[t - 1] = backpointers[s, t, path[t]]
+            states.append(path)
+        return states
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+            Most likely sequence of states of one sequence
+        """
+        return self.decode([X])[0]
+
+    def decode_stream(
+        self, chunks: Iterable[np.ndarray]
+    ) -> Iterator[np.ndarray]:
+        """
+            Online Viterbi decoding of a sequence received in chunks (e.g. from
+            a long recording or a live stream). States are yielded as soon as
+            the most likely paths ending in every state agree on them, so the
+            output is the same as decoding the whole sequence at once.
+        """
+        log_A = np.log(self.transitions)
+        delta = None
+        # backpointers of the frames whose state was not yielded yet
+        backpointers: List[np.ndarray] = []
+
+        for chunk in chunks:
+            log_B = self.log_emissions(self.standardize(chunk))
+            for t in range(len(log_B)):
+                if delta is None:
+                    delta = np.log(self.start) + log_B[t]
+                    backpointers.append(np.arange(self.n_states))
+                    continue
+                scores = delta[:, None] + log_A
+                backpointers.append(scores.argmax(axis=0))
+                delta = scores.max(axis=0) + log_B[t]
+
+            # trace back from every end state until the paths merge
+            paths = np.arange(self.n_states)
+            merged = None
+            for t in range(len(backpointers) - 1, 0, -1):
+                paths = backpointers[t][paths]
+                if (paths == paths[0]).all():
+                    merged = t - 1
+                    break
+            if merged is None:
+                continue
+
+            # states up to the merge point are final
+            state = paths[0]
+            decided = np.empty(merged + 1, dtype=int)
+            decided[-1] = state
+            for t in range(merged, 0, -1):
+                decided[t - 1] = backpointers[t][decided[t]]
+            yield decided
+            backpointers = backpointers[merged + 1 :]
+
+        if delta is not None and backpointers:
+            path = np.empty(len(backpointers), dtype=int)
+            path[-1] = delta.argmax()
+            for t in range(len(backpointers) - 1, 0, -1):
+                path[t - 1] = backpointers[t][path[t]]
+            yield path
+
+    def save(self, path: Union[str, Path]) -> ColumnStore:
+        """
+            Saves the model parameters to a folder
+        """
+        store = ColumnStore(path, mode="w")
+        for name in (
+            "start",
+            "transitions",
+            "means",
+            "variances",
+            "offset",
+            "scale",
+        ):
+            store.write(name, getattr(self, name))
+        store.save_metadata(
+            n_states=self.n_states,
+            n_iter=self.n_iter,
+            tol=self.tol,
+            min_variance=self.min_variance,
+            self_transition=self.self_transition,
+            seed=self.seed,
+        )
+        return store
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> GaussianHMM:
+        """
+            Loads a model saved with .save
+        """
+        store = ColumnStore(path, mode="r")
+        model = cls(**store.attributes)
+        for name in store.columns:
+            setattr(model, name, np.asarray(store.read(name)))
+        return model
+
+
+def state_intervals(
+    states: np.ndarray, fps: int = 1, n_states: int = None, **kwargs
+) -> Dict[int, Intervals]:
+    """
+        Converts a sequence of states to the Intervals spent in each
+        state (kwargs are passed to Intervals.from_mask, e.g. min_duration)
+    """
+    n_states = n_states or int(states.max()) + 1
+    return {
+        state: Intervals.from_mask(states == state, fps=fps, **kwargs)
+        for state in range(n_states)
+    }
+
+
+def segment(
+    locomotion: Locomotion, model: GaussianHMM, **kwargs
+) -> Tuple[np.ndarray, Dict[int, Intervals]]:
+    """
+        Segments a Locomotion with a model fitted on
+        locomotion_states_features.
+
+        Returns:
+            state at each frame and the Intervals spent in each state
+    """
+    states = model.predict(locomotion_states_features(locomotion))
+    return (
+        states,
+        state_intervals(
+            states, fps=locomotion.fps, n_states=model.n_states, **kwargs
+        ),
+    )
@@ -0,0 +1,193 @@
+"""
+    Columnar storage for kinematics data: each container (Trajectory,
+    AnchoredTrajectory, Paw...) is saved to a folder with one .npy file per
+    quantity and a metadata.json file with everything else.
+    Columns are memory mapped on load and only read from disk when accessed.
+"""
+
+from __future__ import annotations
+
+import json
+import numpy as np
+from pathlib import Path
+from typing import Union, Any, Callable, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from kino.geometry.vector import Vector
+
+METADATA_FILE = "metadata.json"
+
+
+def to_json(value: Any) -> Any:
+    """
+        Converts numpy scalars and tuples to JSON friendly types
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    elif isinstance(value, (tuple, list)):
+        return [to_json(v) for v in value]
+    elif isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    return value
+
+
+class ColumnStore:
+    """
+        A folder storing one .npy file per column plus a metadata.json
+        file. Columns are loaded lazily as memory mapped arrays.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], mode: str = "r", mmap_mode: str = "r"
+    ):
+        self.path = Path(path)
+        self.mmap_mode = mmap_mode
+
+        if mode == "w":
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.metadata: dict = dict(columns=[], vectors=[], attributes={})
+        elif mode == "r":
+            with open(self.path / METADATA_FILE, "r") as fin:
+                self.metadata = json.load(fin)
+        else:
+            raise ValueError(f'Invalid mode "{mode}", use "r" or "w"')
+
+    def __repr__(self) -> str:
+        return f'ColumnStore @ "{self.path}" | {len(self.columns)} columns'
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.metadata["columns"]
+
+    @property
+    def columns(self) -> list:
+        return self.metadata["columns"]
+
+    @property
+    def attributes(self) -> dict:
+        return self.metadata["attributes"]
+
+    def write(self, column: str, data: Union[np.ndarray, Vector]):
+        """
+            Writes a column to file. Vectors are stored as n_frames-by-2
+            arrays.
+        """
+        from kino.geometry.vector import Vector
+
+        if isinstance(data, Vector):
+            self.metadata["vectors"].append(column)
+            data = data.as_array()
+
+        np.save(self.path / f"{column}.npy", np.asarray(data))
+        self.metadata["columns"].append(column)
+
+    def allocate(
+        self,
+        column: str,
+        shape: tuple,
+        dtype: np.dtype = np.float64,
+        vector: bool = False,
+    ) -> np.memmap:
+        """
+            Creates an empty column on disk and returns it as a writable
+            memory mapped array, to be filled in chunks.
+        """
+        if vector:
+            self.metadata["vectors"].append(column)
+        self.metadata["columns"].append(column)
+
+        return np.lib.format.open_memmap(
+            self.path / f"{column}.npy", mode="w+", dtype=dtype, shape=shape
+        )
+
+    def read(self, column: str) -> Union[np.ndarray, Vector]:
+        """
+            Memory maps a column from file
+        """
+        from kino.geometry.vector import Vector
+
+        if column not in self:
+            raise KeyError(f'Column "{column}" not found in {self}')
+
+        data = np.load(self.path / f"{column}.npy", mmap_mode=self.mmap_mode)
+        if column in self.metadata["vectors"]:
+            return Vector(data[:, 0], data[:, 1])
+        return data
+
+    def save_metadata(self, **attributes):
+        """
+            Writes the metadata file, must be called after all columns
+            are written
+        """
+        self.metadata["attributes"].update(to_json(attributes))
+        with open(self.path / METADATA_FILE, "w") as fout:
+            json.dump(self.metadata, fout, indent=2)
+
+
+class Columnar:
+    """
+        Mixin class adding save/load to kinematics containers.
+        Arrays and Vector attributes are saved as columns, scalar/string
+        attributes as metadata. On load columns are only memory mapped
+        when first accessed.
+    """
+
+    # attributes which are not saved but re-computed from other attributes
+    _derived: Dict[str, Callable] = {}
+
+    def save(self, path: Union[str, Path]) -> ColumnStore:
+        """
+            Saves the object's data to a folder
+        """
+        from kino.geometry.vector import Vector
+
+        store = ColumnStore(path, mode="w")
+
+        attributes = {}
+        for name, value in vars(self).items():
+            if name.startswith("_") or name in self._derived:
+                continue
+
+            if isinstance(value, Vector) and not value.single_vec:
+                store.write(name, value)
+            elif isinstance(value, (np.ndarray, list)):
+                store.write(name, np.asarray(value))
+            elif value is None or isinstance(
+                value, (int, float, str, bool, np.generic)
+            ):
+                attributes[name] = value
+
+        store.save_metadata(**attributes)
+        return store
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap_mode: str = "r"):
+        """
+            Loads an object saved with .save. No data is read
+            from disk until it is accessed.
+        """
+        store = ColumnStore(path, mode="r", mmap_mode=mmap_mode)
+
+        obj = cls.__new__(cls)
+        obj.__dict__.update(store.attributes)
+        obj._store = store
+        return obj
+
+    def __getattr__(self, name: str) -> Any:
+        # only called when the attribute was not found: try loading it
+        store = self.__dict__.get("_store")
+        if store is None or name.startswith("__"):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+
+        if name in store:
+            value = store.read(name)
+        elif name in self._derived:
+            value = self._derived[name](self)
+        else:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+
+        self.__dict__[name] = value
+        return value
@@ -0,0 +1,153 @@
+"""
+    Joints of an animal's skeleton: pairs of bones sharing a bodypart
+    (e.g. neck -> body and body -> tail_base). The skeleton is compiled into
+    index arrays so that the kinematics of all joints and bones are computed
+    in one pass over a pose tensor (n_frames, n_bodyparts, 2).
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from itertools import combinations
+from dataclasses import dataclass
+from typing import List, Union
+
+from kino.animal import Animal
+from kino.io import Columnar
+from kino.math import nan_unwrap
+
+
+class JointGraph:
+    """
+        Index arrays for the bones and joints of an Animal. A joint's angle
+        is the angle from the vector center -> a to the vector center -> b.
+    """
+
+    def __init__(self, animal: Animal):
+        names = list(animal.bodyparts_names)
+        bones = [(bone.bp1.name, bone.bp2.name) for bone in animal.bones]
+
+        self.bodyparts = names
+        self.bones = [bone.name for bone in animal.bones]
+        self.bone_start = np.array([names.index(bp1) for bp1, _ in bones])
+        self.bone_end = np.array([names.index(bp2) for _, bp2 in bones])
+
+        self.joints: List[str] = []
+        center, a, b = [], [], []
+        for (bone1, bone2) in combinations(bones, 2):
+            shared = set(bone1) & set(bone2)
+            if len(shared) != 1:
+                continue
+            bp = shared.pop()
+            bp1 = bone1[0] if bone1[1] == bp else bone1[1]
+            bp2 = bone2[0] if bone2[1] == bp else bone2[1]
+
+            self.joints.append(f"{bp1}_{bp}_{bp2}")
+            center.append(names.index(bp))
+            a.append(names.index(bp1))
+            b.append(names.index(bp2))
+
+        self.joint_center = np.array(center, dtype=int)
+        self.joint_a = np.array(a, dtype=int)
+        self.joint_b = np.array(b, dtype=int)
+
+    def __repr__(self) -> str:
+        return (
+            f"JointGraph: {len(self.bones)} bones, {len(self.joints)} joints"
+        )
+
+    def bone_lengths(self, pose: np.ndarray) -> np.ndarray:
+        """
+            Length of each bone at each frame: (n_frames, n_bones) array
+        """
+        delta = pose[:, self.bone_end] - pose[:, self.bone_start]
+        return np.sqrt(np.einsum("...i,...i->...", delta, delta))
+
+    def joint_angles(self, pose: np.ndarray) -> np.ndarray:
+        """
+            Angle (degrees, in (-180, 180]) of each joint at
+            each frame: (n_frames, n_joints) array
+        """
+        center = pose[:, self.joint_center]
+        a = pose[:, self.joint_a] - center
+        b = pose[:, self.joint_b] - center
+
+        cross = a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+        dot = np.einsum("...i,...i->...", a, b)
+        return np.degrees(np.arctan2(cross, dot))
+
+    def compute(
+        self, pose: np.ndarray, fps: int = 1, time: np.ndarray = None
+    ) -> JointKinematics:
+        """
+            Computes the joint angles, angular velocities and bone lengths.
+            time (seconds) is used for the angular velocity of frames that
+            are not equally spaced.
+        """
+        angles = self.joint_angles(pose)
+
+        radians = np.radians(angles)
+        if np.isnan(radians).any():
+            unwrapped = np.column_stack(
+                [nan_unwrap(radians[:, n]) for n in range(radians.shape[1])]
+            )
+        else:
+            unwrapped = np.unwrap(radians, axis=0)
+
+        if len(angles) > 1:
+            if time is None:
+                angular_velocity = (
+                    np.degrees(np.gradient(unwrapped, axis=0)) * fps
+                )
+            else:
+                angular_velocity = np.degrees(
+                    np.gradient(unwrapped, np.asarray(time, float), axis=0)
+                )
+        else:
+            angular_velocity = np.zeros_like(angles)
+
+        return JointKinematics(
+            joints=self.joints,
+            bones=self.bones,
+            angle=angles,
+            angular_velocity=angular_velocity,
+            bone_length=self.bone_lengths(pose),
+        )
+
+
+@dataclass
+class JointKinematics(Columnar):
+    """
+        Joint angles (degrees), angular velocities (degrees/s) with shape
+        (n_frames, n_joints) and bone lengths with shape (n_frames, n_bones).
+        Indexing by joint or bone name returns its angle or length.
+    """
+
+    joints: List[str]
+    bones: List[str]
+    angle: np.ndarray
+    angular_velocity: np.ndarray
+    bone_length: np.ndarray
+
+    def __repr__(self) -> str:
+        return f"JointKinematics: {len(self.joints)} joints, {len(self.bones)} bones"
+
+    def __len__(self) -> int:
+        return len(self.angle)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        joints, bones = list(self.joints), list(self.bones)
+        if name in joints:
+            return self.angle[:, joints.index(name)]
+        elif name in bones:
+            return self.bone_length[:, bones.index(name)]
+        raise KeyError(f'No joint or bone called "{name}"')
+
+    def __matmul__(self, other: Union[int, np.ndarray]) -> JointKinematics:
+        return JointKinematics(
+            self.joints,
+            self.bones,
+            self.angle[other],
+            self.angular_velocity[other],
+            self.bone_length[other],
+        )
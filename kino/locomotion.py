@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+import warnings
 from copy import deepcopy
-import pandas as pd
-from typing import Union, List
+from pathlib import Path
+from typing import Union, List, TYPE_CHECKING
 import rich.repr
 import numpy as np
 
@@ -14,6 +15,15 @@ from kino.animal import Animal, Bone
 from kino.geometry import Trajectory, AnchoredTrajectory, coordinates, Vector
 from kino.steps import Paw
 from kino.math import smooth
+from kino.io import ColumnStore
+from kino.cleaning import clean_tracking
+from kino.joints import JointGraph, JointKinematics
+from kino.pose import resample_tracking
+import kino.query as kq
+from kino.profiling import profiled, stage
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class Locomotion:
@@ -24,57 +34,125 @@ class Locomotion:
 
     view: str = "allocentric"
 
+    # smoothing window for the CoM kinematics
+    com_smoothing_window: int = 10
+
+    # smoothing method of the bodyparts trajectories ("window", "kalman" or "savgol")
+    smoothing_method: str = "window"
+
+    # cleaning of the tracking data (see __init__)
+    likelihood_threshold: float = None
+    max_gap: int = 0
+    gap_fill_method: str = "linear"
+
+    @profiled("locomotion")
     def __init__(
         self,
         animal: Animal,
         tracking: Union[dict, pd.DataFrame, pd.Series],
         fps: int = 1,
+        likelihood_threshold: float = None,
+        max_gap: int = 0,
+        gap_fill_method: str = "linear",
+        smoothing_method: str = "window",
+        timestamps: np.ndarray = None,
     ):
+        """
+            Arguments:
+                animal: Animal with bodyparts, bones and paws
+                tracking: {bodypart}_x, {bodypart}_y columns (and optionally
+                    {bodypart}_likelihood)
+                fps: tracking frame rate
+                likelihood_threshold: points with likelihood below threshold
+                    are set to NaN
+                max_gap: gaps up to max_gap frames long are filled
+                    (None: fill all gaps, 0: don't fill)
+                gap_fill_method: "linear" or "spline" interpolation
+                smoothing_method: "window", "kalman" or "savgol", see Trajectory
+                timestamps: time of each frame (seconds) if frames are not
+                    equally spaced, kinematics are computed against these
+                    times (fps is then the nominal frame rate). See also
+                    .resample
+        """
         self.animal = animal
-        self.tracking = tracking
         self.fps = fps
+        self.smoothing_method = smoothing_method
+        self.likelihood_threshold = likelihood_threshold
+        self.max_gap = max_gap
+        self.gap_fill_method = gap_fill_method
+        self.timestamps = (
+            None if timestamps is None else np.asarray(timestamps, dtype=float)
+        )
+
+        if likelihood_threshold is not None or max_gap != 0:
+            with stage("locomotion.cleaning"):
+                tracking = clean_tracking(
+                    animal,
+                    tracking,
+                    likelihood_threshold=likelihood_threshold,
+                    max_gap=max_gap,
+                    method=gap_fill_method,
+                )
+        self.tracking = tracking
 
         # Create a Trajectory object for each of the animal's bodyparts
         self.bodyparts = {}
-        for bp in animal.bodyparts:
-            bp_trajectory = Trajectory(
-                tracking[f"{bp.name}_x"],
-                tracking[f"{bp.name}_y"],
-                name=bp.name,
-                color=bp.color,
+        with stage("locomotion.bodyparts"):
+            trajectories = Trajectory.batch(
+                np.column_stack(
+                    [tracking[f"{bp.name}_x"] for bp in animal.bodyparts]
+                ),
+                np.column_stack(
+                    [tracking[f"{bp.name}_y"] for bp in animal.bodyparts]
+                ),
+                names=[bp.name for bp in animal.bodyparts],
+                colors=[bp.color for bp in animal.bodyparts],
                 fps=fps,
+                smoothing_method=smoothing_method,
+                timestamps=self.timestamps,
             )
-            setattr(self, bp.name, bp_trajectory)
-            self.bodyparts[bp.name] = bp_trajectory
+            for bp_trajectory in trajectories:
+                setattr(self, bp_trajectory.name, bp_trajectory)
+                self.bodyparts[bp_trajectory.name] = bp_trajectory
 
         # create an AnchoredTrajectory object for each bone (2D vectors at a point)
-        self.bones = {}
-        for bone in animal.bones:
-            self.bones[bone.name] = self._make_bone(bone)
-
-        # create bones for head and body axis
-        self.head = self._make_bone(animal.head)
-        self.body_axis = self._make_bone(animal.body_axis)
+        with stage("locomotion.bones"):
+            self.bones = {}
+            for bone in animal.bones:
+                self.bones[bone.name] = self._make_bone(bone)
+
+            # create bones for head and body axis
+            self.head = self._make_bone(animal.head)
+            self.body_axis = self._make_bone(animal.body_axis)
+
+        # compute joint angles and bone lengths over the skeleton
+        with stage("locomotion.joints"):
+            self.joints = JointGraph(animal).compute(
+                self.pose, fps=fps, time=self.timestamps
+            )
 
         # compute center of mass of paws positions
-        self.compute_center_of_mass(*self.animal.paws)
+        with stage("locomotion.com"):
+            self.compute_center_of_mass(*self.animal.paws)
 
         # create paws objects and detect steps
-        self.paws = {
-            paw_name: Paw(
-                paw_name,
-                Trajectory(
-                    tracking[f"{paw_name}_x"],
-                    tracking[f"{paw_name}_y"],
-                    name=paw_name,
-                    color=self.bodyparts[paw_name].color,
-                    fps=fps,
-                    smoothing_window=-1,
-                ),
-                self.bodyparts["com"],
-            )
-            for paw_name in animal.paws
-        }
+        with stage("locomotion.paws"):
+            self.paws = {
+                paw_name: Paw(
+                    paw_name,
+                    Trajectory(
+                        tracking[f"{paw_name}_x"],
+                        tracking[f"{paw_name}_y"],
+                        name=paw_name,
+                        color=self.bodyparts[paw_name].color,
+                        fps=fps,
+                        smoothing_window=-1,
+                        timestamps=self.timestamps,
+                    ),
+                    self.bodyparts["com"],
+                )
+                for paw_name in animal.paws
+            }
 
     def __getitem__(self, item: Union[int, str]):
         """
@@ -104,6 +182,30 @@ class Locomotion:
     def __len__(self):
         return len(self.body)
 
+    @property
+    def time(self) -> np.ndarray:
+        """
+            Time of each frame, in seconds
+        """
+        timestamps = getattr(self, "timestamps", None)
+        if timestamps is not None:
+            return timestamps
+        return np.arange(len(self)) / self.fps
+
+    @property
+    def pose(self) -> np.ndarray:
+        """
+            Pose tensor with the position of the animal's bodyparts:
+            (n_frames, n_bodyparts, 2) array
+        """
+        return np.stack(
+            [
+                np.column_stack([self.bodyparts[bp].x, self.bodyparts[bp].y])
+                for bp in self.animal.bodyparts_names
+            ],
+            axis=1,
+        )
+
     def __matmul__(self, other: Union[int, np.ndarray]) -> Locomotion:
         """
             Ovveriding @ operator to index the locomotor state at a frame
@@ -116,13 +218,213 @@ class Locomotion:
         for bpname, bp in new_locomotion.bodyparts.items():
             setattr(new_locomotion, bpname, bp)
 
+        # bones are indexed from the original ones, so that their angular
+        # kinematics are computed (and cached) only once
         new_locomotion.bones = {
-            name: bone @ other for name, bone in new_locomotion.bones.items()
+            name: bone @ other for name, bone in self.bones.items()
         }
-        new_locomotion.head = new_locomotion.head @ other
-        new_locomotion.body_axis = new_locomotion.body_axis @ other
+        new_locomotion.head = self.head @ other
+        new_locomotion.body_axis = self.body_axis @ other
+        new_locomotion.joints = new_locomotion.joints @ other
+        if getattr(new_locomotion, "timestamps", None) is not None:
+            new_locomotion.timestamps = new_locomotion.timestamps[other]
         return new_locomotion
 
+    def resample(self, fps: float) -> Locomotion:
+        """
+            Resamples the tracking data of all bodyparts at a uniform frame
+            rate (e.g. to analyse together sessions recorded at different
+            frame rates) and recomputes the kinematics. Frames are
+            interpolated at the timestamps if given. Gaps are filled as in
+            the original Locomotion, with max_gap scaled to the new frame
+            rate (points with low likelihood are already masked).
+        """
+        timestamps = getattr(self, "timestamps", None)
+        tracking, _ = resample_tracking(
+            self.animal,
+            self.tracking,
+            fps,
+            fps=self.fps,
+            timestamps=timestamps,
+        )
+        max_gap = self.max_gap
+        if max_gap:
+            max_gap = max(1, int(round(max_gap * fps / self.fps)))
+        resampled = Locomotion(
+            self.animal,
+            tracking,
+            fps=fps,
+            max_gap=max_gap,
+            gap_fill_method=self.gap_fill_method,
+            smoothing_method=self.smoothing_method,
+        )
+        resampled.likelihood_threshold = self.likelihood_threshold
+        return resampled
+
+    def evaluate(self, expression: str) -> np.ndarray:
+        """
+            Evaluates a boolean expression over the kinematics at all
+            frames, e.g. "(com.speed > 20) & (abs(com.thetadot) < 50)".
+            See kino.query.evaluate
+        """
+        return kq.evaluate(self, expression)
+
+    def query(
+        self, expression: str, min_duration: float = 0, max_gap: float = 0
+    ) -> kq.Intervals:
+        """
+            Finds the intervals (bouts) in which an expression is true,
+            lasting at least min_duration seconds after merging intervals
+            separated by gaps up to max_gap seconds.
+        """
+        return kq.Intervals.from_mask(
+            self.evaluate(expression),
+            fps=self.fps,
+            min_duration=min_duration,
+            max_gap=max_gap,
+        )
+
+    def save(self, path: Union[str, Path]) -> ColumnStore:
+        """
+            Saves the locomotion data to a folder in a columnar format:
+            one sub folder for each bodypart, bone and paw with one file
+            per kinematic quantity and the tracking data (after cleaning,
+            before smoothing) in the tracking sub folder. Animal, fps, view
+            and the cleaning and smoothing parameters are stored
+            as JSON metadata.
+        """
+        path = Path(path)
+        store = ColumnStore(path, mode="w")
+
+        for name, bp in self.bodyparts.items():
+            bp.save(path / "bodyparts" / name)
+
+        for name, bone in self.bones.items():
+            bone.save(path / "bones" / name)
+        self.head.save(path / "head")
+        self.body_axis.save(path / "body_axis")
+        self.joints.save(path / "joints")
+
+        paws = getattr(self, "paws", {})
+        for name, paw in paws.items():
+            paw.save(path / "paws" / name)
+            paw.trajectory.save(path / "paws" / name / "trajectory")
+
+        tracking = getattr(self, "tracking", None)
+        if tracking is not None:
+            tracking_store = ColumnStore(path / "tracking", mode="w")
+            for column in tracking.keys():
+                tracking_store.write(column, np.asarray(tracking[column]))
+            tracking_store.save_metadata()
+
+        timestamps = getattr(self, "timestamps", None)
+        if timestamps is not None:
+            store.write("timestamps", timestamps)
+
+        store.save_metadata(
+            view=self.view,
+            fps=self.fps,
+            animal=self.animal.animal_data,
+            bodyparts=list(self.bodyparts.keys()),
+            bones=list(self.bones.keys()),
+            paws=list(paws.keys()),
+            likelihood_threshold=self.likelihood_threshold,
+            max_gap=self.max_gap,
+            gap_fill_method=self.gap_fill_method,
+            smoothing_method=self.smoothing_method,
+        )
+        return store
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap_mode: str = "r") -> Locomotion:
+        """
+            Loads a Locomotion saved with .save. The data are memory mapped
+            and only read from disk when accessed.
+        """
+        path = Path(path)
+        store = ColumnStore(path, mode="r", mmap_mode=mmap_mode)
+        if (
+            store.attributes["view"] == EgocentricLocomotion.view
+            and cls is Locomotion
+        ):
+            return EgocentricLocomotion.load(path, mmap_mode=mmap_mode)
+
+        locomotion = cls.__new__(cls)
+        locomotion._load_columns(store, mmap_mode)
+
+        # tracking data used to create the bodyparts, recreated from
+        # their (smoothed) coordinates if not saved
+        if (path / "tracking").exists():
+            tracking_store = ColumnStore(
+                path / "tracking", mode="r", mmap_mode=mmap_mode
+            )
+            locomotion.tracking = {
+                column: tracking_store.read(column)
+                for column in tracking_store.columns
+            }
+        else:
+            locomotion.tracking = {}
+            for bp in locomotion.animal.bodyparts:
+                locomotion.tracking[f"{bp.name}_x"] = locomotion.bodyparts[
+                    bp.name
+                ].x
+                locomotion.tracking[f"{bp.name}_y"] = locomotion.bodyparts[
+                    bp.name
+                ].y
+
+        locomotion.com = locomotion.bodyparts["com"]
+        locomotion.paws = {}
+        for name in store.attributes["paws"]:
+            paw = Paw.load(path / "paws" / name, mmap_mode=mmap_mode)
+            paw.trajectory = Trajectory.load(
+                path / "paws" / name / "trajectory", mmap_mode=mmap_mode
+            )
+            paw.com = locomotion.com
+            locomotion.paws[name] = paw
+        return locomotion
+
+    def _load_columns(self, store: ColumnStore, mmap_mode: str):
+        """
+            Loads the bodyparts and bones saved in a ColumnStore
+        """
+        self.animal = Animal(store.attributes["animal"])
+        self.fps = store.attributes["fps"]
+        for name in (
+            "likelihood_threshold",
+            "max_gap",
+            "gap_fill_method",
+            "smoothing_method",
+        ):
+            default = getattr(type(self), name)
+            setattr(self, name, store.attributes.get(name, default))
+        self.timestamps = (
+            store.read("timestamps") if "timestamps" in store else None
+        )
+
+        self.bodyparts = {}
+        for name in store.attributes["bodyparts"]:
+            bp = Trajectory.load(
+                store.path / "bodyparts" / name, mmap_mode=mmap_mode
+            )
+            setattr(self, name, bp)
+            self.bodyparts[name] = bp
+
+        self.bones = {
+            name: AnchoredTrajectory.load(
+                store.path / "bones" / name, mmap_mode=mmap_mode
+            )
+            for name in store.attributes["bones"]
+        }
+        self.head = AnchoredTrajectory.load(
+            store.path / "head", mmap_mode=mmap_mode
+        )
+        self.body_axis = AnchoredTrajectory.load(
+            store.path / "body_axis", mmap_mode=mmap_mode
+        )
+        self.joints = JointKinematics.load(
+            store.path / "joints", mmap_mode=mmap_mode
+        )
+
     def _make_bone(self, bone: Bone) -> AnchoredTrajectory:
         """
             Given a Bone specified by two bodyparts, creates a 
@@ -146,9 +448,11 @@ class Locomotion:
         # get bodyparts Trajectories
         bps_trajectories = [self.bodyparts[bp] for bp in bps]
 
-        # get average trajectory
-        X = np.mean(np.vstack([bp.x for bp in bps_trajectories]), 0)
-        Y = np.mean(np.vstack([bp.y for bp in bps_trajectories]), 0)
+        # get average trajectory, ignoring bodyparts missing at a frame
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            X = np.nanmean(np.vstack([bp.x for bp in bps_trajectories]), 0)
+            Y = np.nanmean(np.vstack([bp.y for bp in bps_trajectories]), 0)
 
         self.com = Trajectory(
             X,
@@ -156,61 +460,78 @@ class Locomotion:
             name="CoM",
             fps=self.fps,
             color=blue_grey_dark,
-            smoothing_window=10,
+            smoothing_window=self.com_smoothing_window,
+            smoothing_method=self.smoothing_method,
+            timestamps=getattr(self, "timestamps", None),
         )
         self.com.acceleration_mag = smooth(self.com.acceleration_mag)
         self.bodyparts["com"] = self.com
         return self.com
 
+    @profiled("locomotion.to_egocentric")
     def to_egocentric(self) -> EgocentricLocomotion:
         """
             returns a Locomotion object in which the position of the paws is 
             in the egocentric reference frame, centered at the animal's
             center of mass and oriented like the animal's body axis
         """
-        egocentric = EgocentricLocomotion.from_allocentric(self)
+        with stage("locomotion.to_egocentric.copy"):
+            egocentric = EgocentricLocomotion.from_allocentric(self)
 
         # create rotation matrices to rotate all tracking such that body axis faces North
-        Rs = [
-            coordinates.R(-theta + 90)
-            for theta in self.body_axis.vector.angle2
-        ]
+        with stage("locomotion.to_egocentric.rotation_matrices"):
+            Rs = [
+                coordinates.R(-theta + 90)
+                for theta in self.body_axis.vector.angle2
+            ]
 
         # store rotation and translation data
         egocentric.rotation_matrices = Rs
         egocentric.allocentric_position = self.bodyparts["com"]  # type: ignore
 
-        # transform the coordinates of each bodypart
-        com = self.bodyparts["com"]
-        for bpname, bp in egocentric.bodyparts.items():
-            allo_bp = self.bodyparts[bpname]
-
-            # translate all bodyparts so that the CoM is at the origin at frames
-            xy = np.array(
-                [allo_bp.x - com.x, allo_bp.y - com.y]
-            ).T  # n_frames-by-2
-
-            # apply rotation matrices
-            xy_rotated = np.vstack([R @ xy[i, :] for i, R in enumerate(Rs)])
-
-            # create new bodypart
-            egocentric.bodyparts[bpname] = Trajectory(
-                xy_rotated[:, 0],
-                xy_rotated[:, 1],
-                name=bpname,
-                fps=bp.fps,
-                color=bp.color,
+        with stage("locomotion.to_egocentric.bodyparts"):
+            # transform the coordinates of each bodypart
+            com = self.bodyparts["com"]
+            rotated = []
+            for bpname in egocentric.bodyparts.keys():
+                allo_bp = self.bodyparts[bpname]
+
+                # translate all bodyparts so that the CoM is at the origin at frames
+                xy = np.array(
+                    [allo_bp.x - com.x, allo_bp.y - com.y]
+                ).T  # n_frames-by-2
+
+                # apply rotation matrices
+                rotated.append(
+                    np.vstack([R @ xy[i, :] for i, R in enumerate(Rs)])
+                )
+
+            # create new bodyparts
+            names = list(egocentric.bodyparts.keys())
+            trajectories = Trajectory.batch(
+                np.column_stack([xy[:, 0] for xy in rotated]),
+                np.column_stack([xy[:, 1] for xy in rotated]),
+                names=names,
+                colors=[egocentric.bodyparts[bp].color for bp in names],
+                fps=self.fps,
+                smoothing_method=self.smoothing_method,
+                timestamps=getattr(self, "timestamps", None),
+            )
+            egocentric.bodyparts = {
+                trajectory.name: trajectory for trajectory in trajectories
+            }
+
+        with stage("locomotion.to_egocentric.bones"):
+            # re-create bones
+            egocentric.bones = {}
+            for bone in egocentric.animal.bones:
+                egocentric.bones[bone.name] = egocentric._make_bone(bone)
+
+            # create bones for head and body axis
+            egocentric.head = egocentric._make_bone(egocentric.animal.head)
+            egocentric.body_axis = egocentric._make_bone(
+                egocentric.animal.body_axis
             )
-        # re-create bones
-        egocentric.bones = {}
-        for bone in egocentric.animal.bones:
-            egocentric.bones[bone.name] = egocentric._make_bone(bone)
-
-        # create bones for head and body axis
-        egocentric.head = egocentric._make_bone(egocentric.animal.head)
-        egocentric.body_axis = egocentric._make_bone(
-            egocentric.animal.body_axis
-        )
 
         # logger.debug(
         #     f'Created {egocentric.view} locomotion for animal "{egocentric.animal.name}"'
@@ -235,16 +556,49 @@ class EgocentricLocomotion(Locomotion):
         # self.allocentric_position: Trajectory = None
         # self.body_axis: AnchoredTrajectory = None
 
+    def save(self, path: Union[str, Path]) -> ColumnStore:
+        """
+            Saves the egocentric locomotion data, including the
+            rotation matrices and allocentric position
+        """
+        store = super().save(path)
+        store.write("rotation_matrices", np.asarray(self.rotation_matrices))
+        self.allocentric_position.save(Path(path) / "allocentric_position")
+        store.save_metadata()
+        return store
+
+    @classmethod
+    def load(
+        cls, path: Union[str, Path], mmap_mode: str = "r"
+    ) -> EgocentricLocomotion:
+        """
+            Loads an EgocentricLocomotion saved with .save
+        """
+        path = Path(path)
+        store = ColumnStore(path, mode="r", mmap_mode=mmap_mode)
+
+        egocentric = cls.__new__(cls)
+        egocentric._load_columns(store, mmap_mode)
+        egocentric.rotation_matrices = store.read("rotation_matrices")
+        egocentric.allocentric_position = Trajectory.load(
+            path / "allocentric_position", mmap_mode=mmap_mode
+        )
+        return egocentric
+
     @classmethod
     def from_allocentric(cls, allocentric: Locomotion) -> EgocentricLocomotion:
         egocentric = EgocentricLocomotion(
             allocentric.animal, fps=allocentric.fps
         )
+        egocentric.timestamps = getattr(allocentric, "timestamps", None)
+        egocentric.smoothing_method = allocentric.smoothing_method
         egocentric.bodyparts = deepcopy(allocentric.bodyparts)
         egocentric.bones = deepcopy(allocentric.bones)
         egocentric.body_axis = deepcopy(allocentric.body_axis)
         egocentric.head = deepcopy(allocentric.head)
 
+        # joint angles and bone lengths don't depend on the reference frame
+        egocentric.joints = allocentric.joints
         return egocentric
 
     def project_to_egocentric_at_frame(
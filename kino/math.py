@@ -1,6 +1,5 @@
 import numpy as np
 from typing import List, Tuple
-from scipy import stats
 import math
 
 
@@ -17,7 +16,23 @@ def unwrap(angles: np.ndarray) -> np.ndarray:
         Given an array of angles (in degrees),
         in returns the unwrapped angles in degrees
     """
-    return np.degrees(np.unwrap(np.radians(angles)))
+    return np.degrees(nan_unwrap(np.radians(angles)))
+
+
+def nan_unwrap(angles: np.ndarray) -> np.ndarray:
+    """
+        np.unwrap (angles in radians) ignoring NaNs, which would
+        otherwise propagate to all following values
+    """
+    angles = np.asarray(angles, dtype=float)
+    valid = ~np.isnan(angles)
+    if valid.all():
+        return np.unwrap(angles)
+
+    unwrapped = angles.copy()
+    if valid.any():
+        unwrapped[valid] = np.unwrap(angles[valid])
+    return unwrapped
 
 
 def pi_2_pi(theta: float) -> float:
@@ -39,11 +54,11 @@ def resample_linear_1d(original: np.ndarray, target_length: int) -> np.ndarray:
         Similar to scipy resample for 1D arrays, but with no aberration, see:
             https://stackoverflow.com/questions/20322079/downsample-a-1d-numpy-array
     """
-    original = np.array(original, dtype=np.float)
+    original = np.array(original, dtype=float)
     index_arr = np.linspace(
-        0, len(original) - 1, num=target_length, dtype=np.float
+        0, len(original) - 1, num=target_length, dtype=float
     )
-    index_floor = np.array(index_arr, dtype=np.int)  # Round down
+    index_floor = np.array(index_arr, dtype=int)  # Round down
     index_ceil = index_floor + 1
     index_rem = index_arr - index_floor  # Remain
 
@@ -88,12 +103,42 @@ def derivative(X: np.ndarray, axis: int = 0, order: int = 1) -> np.ndarray:
     return np.diff(X, n=order, axis=axis, prepend=0)
 
 
+def nan_gradient(values: np.ndarray, spacing: np.ndarray = None) -> np.ndarray:
+    """
+        np.gradient of a 1D array (optionally with the coordinates of the
+        samples) which doesn't spread NaNs: frames next to a NaN use a one
+        sided difference instead of the central one, only NaN frames (and
+        isolated valid frames) are NaN in the output.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return np.full_like(values, np.nan)
+    if spacing is None:
+        gradient = np.gradient(values)
+        steps = np.ones(len(values) - 1)
+    else:
+        gradient = np.gradient(values, spacing)
+        steps = np.diff(spacing)
+
+    fill = np.isnan(gradient) & ~np.isnan(values)
+    if not fill.any():
+        return gradient
+
+    difference = np.diff(values) / steps
+    forward = np.append(difference, np.nan)
+    backward = np.insert(difference, 0, np.nan)
+    gradient[fill] = np.where(
+        np.isnan(forward[fill]), backward[fill], forward[fill]
+    )
+    return gradient
+
+
 def angular_derivative(angles: np.ndarray) -> np.ndarray:
     """
         Takes the deriative of an angular variable (in degrees)
     """
     # convert to radians and take derivative
-    rad = np.unwrap(np.deg2rad(angles))
+    rad = nan_unwrap(np.deg2rad(angles))
     diff = derivative(rad)
     return np.rad2deg(diff)
 
@@ -102,8 +147,12 @@ def convolve_with_gaussian(
     data: np.ndarray, kernel_width: int = 21
 ) -> np.ndarray:
     """
-        Convolves a 1D array with a gaussian kernel of given width
+        Convolves a 1D array with a gaussian kernel of given width.
+        NaNs are ignored: the kernel's weights are re-normalized
+        around them and they are kept in the output.
     """
+    from scipy import stats
+
     # create kernel and normalize area under curve
     norm = stats.norm(0, kernel_width)
     X = np.linspace(norm.ppf(0.0001), norm.ppf(0.9999), kernel_width)
@@ -111,19 +160,94 @@ def convolve_with_gaussian(
     _kernel = norm.pdf(X)
     kernel = _kernel / np.sum(_kernel)
 
-    return np.convolve(data, kernel, mode="same")
+    nans = np.isnan(data)
+    if not nans.any():
+        return np.convolve(data, kernel, mode="same")
+
+    # scale by the fraction of the kernel's weight lost to NaNs
+    valid = (~nans).astype(float)
+    weight = np.convolve(valid, kernel, mode="same")
+    full_weight = np.convolve(np.ones_like(valid), kernel, mode="same")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        convolved = (
+            np.convolve(np.where(nans, 0, data), kernel, mode="same")
+            * full_weight
+            / weight
+        )
+    convolved[nans] = np.nan
+    return convolved
 
 
 def smooth(data: np.ndarray, window: int = 5) -> np.ndarray:
     """
-        Smooth a 1D numpy array by binning the values and taking
-        the mean for each bin.
+        Smooth a 1D numpy array by taking the mean in a window
+        [t - window, t + window) around each frame (truncated at the edges).
+        NaNs are ignored in the mean but kept in the output.
     """
+    data = np.asarray(data, dtype=float)
     T = len(data)
-    means = []
-    for t in np.arange(0, T):
-        t_0 = t - window if t > window else 0
-        t_1 = t + window if T - t > window else T
 
-        means.append(np.mean(data[t_0:t_1]))
-    return np.array(means)
+    # sums over the window with a convolution: the window for frame
+    # t ends at index t + window - 1 of the full convolution
+    nans = np.isnan(data)
+    kernel = np.ones(2 * window)
+    sums = np.convolve(np.where(nans, 0, data), kernel)[
+        window - 1 : window - 1 + T
+    ]
+    counts = np.convolve((~nans).astype(float), kernel)[
+        window - 1 : window - 1 + T
+    ]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    means[nans] = np.nan
+    return means
+
+
+def running_extremum(function, data: np.ndarray, size: int) -> np.ndarray:
+    """
+        Running minimum/maximum (function=np.minimum/np.maximum, or
+        np.fmin/np.fmax to ignore NaNs) over windows [t, t + size) along the
+        first axis, computed by combining windows of doubling size.
+        The output has len(data) - size + 1 entries.
+    """
+    covered = 1
+    while covered < size:
+        step = min(covered, size - covered)
+        data = function(data[:-step], data[step:])
+        covered += step
+    return data
+
+
+def interpolate_at(
+    values: np.ndarray, time: np.ndarray, new_time: np.ndarray
+) -> np.ndarray:
+    """
+        Linear interpolation of values (n_frames, ...) sampled at (increasing)
+        time to new_time, for all trailing dimensions at once. Times outside
+        of the original range are NaN, as are samples next to a NaN sample.
+    """
+    values = np.asarray(values, dtype=float)
+    time = np.asarray(time, dtype=float)
+    new_time = np.asarray(new_time, dtype=float)
+    if len(time) < 2:
+        return np.full((len(new_time),) + values.shape[1:], np.nan)
+
+    index = np.clip(
+        np.searchsorted(time, new_time, side="right") - 1, 0, len(time) - 2
+    )
+    weight = (new_time - time[index]) / (time[index + 1] - time[index])
+    weight = weight.reshape((-1,) + (1,) * (values.ndim - 1))
+    resampled = values[index] * (1 - weight) + values[index + 1] * weight
+
+    outside = (new_time < time[0]) | (new_time > time[-1])
+    resampled[outside] = np.nan
+    return resampled
+
+
+def uniform_time(time: np.ndarray, fps: float) -> np.ndarray:
+    """
+        Times at a uniform rate fps between the first and last of time
+    """
+    n_frames = int(np.floor((time[-1] - time[0]) * fps + 1e-9)) + 1
+    return time[0] + np.arange(n_frames) / fps
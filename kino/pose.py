@@ -0,0 +1,96 @@
+"""
+    Conversion between tracking data ({bodypart}_x, {bodypart}_y columns
+    in a DataFrame or dictionary) and a pose tensor with shape
+    (n_frames, n_bodyparts, 2) with bodyparts in the order of
+    animal.bodyparts_names.
+"""
+
+import numpy as np
+from typing import Tuple, Optional
+
+from kino.animal import Animal
+from kino.math import interpolate_at, uniform_time
+
+
+def to_pose_tensor(
+    animal: Animal, tracking
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+        Stacks the tracking data of all bodyparts in a pose tensor.
+
+        Returns:
+            pose: (n_frames, n_bodyparts, 2) array
+            likelihood: (n_frames, n_bodyparts) array with {bodypart}_likelihood
+                values, or None if they are not in the tracking data.
+    """
+    pose = np.stack(
+        [
+            np.column_stack(
+                [
+                    np.asarray(tracking[f"{bp}_x"], dtype=float),
+                    np.asarray(tracking[f"{bp}_y"], dtype=float),
+                ]
+            )
+            for bp in animal.bodyparts_names
+        ],
+        axis=1,
+    )
+
+    try:
+        likelihood = np.column_stack(
+            [
+                np.asarray(tracking[f"{bp}_likelihood"], dtype=float)
+                for bp in animal.bodyparts_names
+            ]
+        )
+    except KeyError:
+        likelihood = None
+    return pose, likelihood
+
+
+def to_tracking(animal: Animal, pose: np.ndarray) -> dict:
+    """
+        Converts a pose tensor to tracking data
+    """
+    tracking = {}
+    for n, bp in enumerate(animal.bodyparts_names):
+        tracking[f"{bp}_x"] = pose[:, n, 0]
+        tracking[f"{bp}_y"] = pose[:, n, 1]
+    return tracking
+
+
+def resample_tracking(
+    animal: Animal,
+    tracking,
+    target_fps: float,
+    fps: float = None,
+    timestamps: np.ndarray = None,
+) -> Tuple[dict, np.ndarray]:
+    """
+        Resamples the tracking data of all bodyparts (and their likelihoods)
+        at a uniform frame rate, by linear interpolation of the pose tensor
+        in a single call. Frames are either at a constant fps or at
+        the given timestamps (seconds).
+
+        Returns:
+            tracking: resampled tracking data
+            time: time of each resampled frame (seconds)
+    """
+    pose, likelihood = to_pose_tensor(animal, tracking)
+    if timestamps is None:
+        if fps is None:
+            raise ValueError("Either fps or timestamps must be given")
+        timestamps = np.arange(len(pose)) / fps
+    timestamps = np.asarray(timestamps, dtype=float)
+    if len(timestamps) != len(pose):
+        raise ValueError(
+            f"Got {len(timestamps)} timestamps for {len(pose)} frames"
+        )
+
+    time = uniform_time(timestamps, target_fps)
+    resampled = to_tracking(animal, interpolate_at(pose, timestamps, time))
+    if likelihood is not None:
+        likelihood = interpolate_at(likelihood, timestamps, time)
+        for n, bp in enumerate(animal.bodyparts_names):
+            resampled[f"{bp}_likelihood"] = likelihood[:, n]
+    return resampled, time
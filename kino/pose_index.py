@@ -0,0 +1,320 @@
+"""
+    Nearest neighbours search of body postures across sessions. Each frame's
+    egocentric pose is flattened to a vector (optionally compressed with PCA)
+    and stored in a KD-tree or ball tree. Sessions added after the tree is
+    built are searched by brute force until the tree is rebuilt.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from pathlib import Path
+from typing import Iterator, List, Tuple, Union, TYPE_CHECKING
+
+from scipy.spatial.distance import cdist
+from sklearn.decomposition import PCA
+from sklearn.neighbors import BallTree, KDTree
+
+from kino.io import ColumnStore
+
+if TYPE_CHECKING:
+    from kino.locomotion import EgocentricLocomotion
+
+
+TREES = dict(kd=KDTree, ball=BallTree)
+
+
+def pose_vectors(
+    egocentric: EgocentricLocomotion, bodyparts: List[str] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Flattened egocentric pose at each frame.
+
+        Returns:
+            (n_frames, 2 * n_bodyparts) array and boolean array, True
+            at frames in which all bodyparts are tracked
+    """
+    bodyparts = bodyparts or list(egocentric.animal.bodyparts_names)
+    vectors = np.column_stack(
+        [
+            np.column_stack(
+                [egocentric.bodyparts[bp].x, egocentric.bodyparts[bp].y]
+            )
+            for bp in bodyparts
+        ]
+    )
+    return vectors, ~np.isnan(vectors).any(axis=1)
+
+
+class PoseIndex:
+    """
+        Index of the postures of multiple sessions. Queries return the
+        session and frame of the matching postures.
+    """
+
+    def __init__(
+        self,
+        bodyparts: List[str] = None,
+        n_components: int = None,
+        tree: str = "kd",
+        leaf_size: int = 40,
+        rebuild_fraction: float = 0.25,
+        pca_samples: int = 100_000,
+        block_size: int = 4096,
+    ):
+        """
+            Arguments:
+                bodyparts: bodyparts used for the pose vectors (all if None)
+                n_components: number of PCA components (no PCA if None)
+                tree: "kd" or "ball"
+                leaf_size: leaf size of the tree
+                rebuild_fraction: the tree is rebuilt before a query when the frames
+                    not in the tree are more than this fraction of those in it
+                pca_samples: max number of frames used to fit the PCA
+                block_size: number of frames not in the tree compared to the
+                    queries at once
+        """
+        if tree not in TREES:
+            raise ValueError(f"Tree must be one of {list(TREES)}, not {tree}")
+
+        self.bodyparts = bodyparts
+        self.n_components = n_components
+        self.tree = tree
+        self.leaf_size = leaf_size
+        self.rebuild_fraction = rebuild_fraction
+        self.pca_samples = pca_samples
+        self.block_size = block_size
+
+        # data of each session are appended to lists of chunks
+        # and only concatenated when needed
+        self.sessions: List[str] = []
+        self._chunks: dict = dict(vectors=[], session_index=[], frames=[])
+        self._n_frames = 0
+
+        # PCA projection and tree, set when the index is built
+        self.mean: np.ndarray = None
+        self.components: np.ndarray = None
+        self._tree = None
+        self._n_indexed = 0
+
+    def __len__(self) -> int:
+        return self._n_frames
+
+    def _concatenated(self, name: str) -> np.ndarray:
+        chunks = self._chunks[name]
+        if len(chunks) != 1:
+            if not chunks:
+                return np.zeros(
+                    (0, 0) if name == "vectors" else 0,
+                    dtype=np.float32 if name == "vectors" else int,
+                )
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """
+            Pose vectors of all frames: (n_frames, 2 * n_bodyparts) array
+        """
+        return self._concatenated("vectors")
+
+    @property
+    def session_index(self) -> np.ndarray:
+        return self._concatenated("session_index")
+
+    @property
+    def frames(self) -> np.ndarray:
+        return self._concatenated("frames")
+
+    def __repr__(self) -> str:
+        return f"PoseIndex: {len(self.sessions)} sessions, {len(self)} frames"
+
+    def add(self, egocentric: EgocentricLocomotion, session: str = None):
+        """
+            Adds the postures of a session, frames in which
+            not all bodyparts are tracked are skipped
+        """
+        session = session or f"session_{len(self.sessions)}"
+        if session in self.sessions:
+            raise ValueError(f'Session "{session}" is already in the index')
+        if self.bodyparts is None:
+            self.bodyparts = list(egocentric.animal.bodyparts_names)
+
+        vectors, valid = pose_vectors(egocentric, self.bodyparts)
+        frames = np.flatnonzero(valid)
+
+        self.sessions.append(session)
+        self._chunks["vectors"].append(vectors[frames].astype(np.float32))
+        self._chunks["session_index"].append(
+            np.full(len(frames), len(self.sessions) - 1)
+        )
+        self._chunks["frames"].append(frames)
+        self._n_frames += len(frames)
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        """
+            Projects pose vectors on the PCA components
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if self.components is None:
+            return vectors
+        return (vectors - self.mean) @ self.components.T
+
+    def build(self):
+        """
+            Fits the PCA (if used) and builds the tree with all frames
+        """
+        if self.n_components is not None:
+            samples = self.vectors
+            if len(samples) > self.pca_samples:
+                choice = np.random.default_rng(0).choice(
+                    len(samples), self.pca_samples, replace=False
+                )
+                samples = samples[np.sort(choice)]
+            pca = PCA(n_components=self.n_components).fit(samples)
+            self.mean, self.components = pca.mean_, pca.components_
+
+        self._tree = TREES[self.tree](
+            self.project(self.vectors), leaf_size=self.leaf_size
+        )
+        self._n_indexed = len(self)
+
+    def _prepare(self, poses: np.ndarray) -> np.ndarray:
+        if (
+            self._tree is None
+            or len(self) - self._n_indexed
+            > self.rebuild_fraction * self._n_indexed
+        ):
+            self.build()
+
+        poses = np.asarray(poses, dtype=np.float64)
+        if poses.ndim == 3:  # (n_queries, n_bodyparts, 2)
+            poses = poses.reshape(len(poses), -1)
+        return self.project(np.atleast_2d(poses))
+
+    def _pending(
+        self, queries: np.ndarray
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+            Distances to the frames not in the tree, block_size frames
+            at a time.
+
+            Yields:
+                index of the first frame and (n_queries, n_frames) distances
+        """
+        vectors = self.vectors
+        for start in range(self._n_indexed, len(self), self.block_size):
+            block = self.project(vectors[start : start + self.block_size])
+            yield start, cdist(queries, block)
+
+    def knn(
+        self, poses: np.ndarray, k: int = 10
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Finds the k most similar postures to each query pose.
+
+            Arguments:
+                poses: (n_queries, n_bodyparts, 2) or (n_queries, 2 * n_bodyparts)
+                    array of egocentric poses (bodyparts as in the index)
+                k: number of neighbours
+
+            Returns:
+                distances, session name and frame of the
+                neighbours: (n_queries, k) arrays
+        """
+        queries = self._prepare(poses)
+        distances, indices = self._tree.query(
+            queries, k=min(k, self._n_indexed)
+        )
+
+        # keep the k nearest between the tree's and each block's neighbours
+        for start, pending in self._pending(queries):
+            distances = np.hstack([distances, pending])
+            indices = np.hstack(
+                [
+                    indices,
+                    np.broadcast_to(
+                        np.arange(start, start + pending.shape[1]),
+                        pending.shape,
+                    ),
+                ]
+            )
+            order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+            distances = np.take_along_axis(distances, order, axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+
+        sessions = np.asarray(self.sessions, dtype=object)
+        return (
+            distances,
+            sessions[self.session_index[indices]],
+            self.frames[indices],
+        )
+
+    def radius(
+        self, poses: np.ndarray, radius: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Finds all postures within a distance from each query pose.
+
+            Returns:
+                index of the query, distance, session name and
+                frame of each match
+        """
+        queries = self._prepare(poses)
+        indices, distances = self._tree.query_radius(
+            queries, r=radius, return_distance=True
+        )
+        query = np.repeat(np.arange(len(queries)), [len(i) for i in indices])
+        indices = np.concatenate(indices).astype(int)
+        distances = np.concatenate(distances)
+
+        for start, pending in self._pending(queries):
+            q, p = np.nonzero(pending <= radius)
+            query = np.concatenate([query, q])
+            indices = np.concatenate([indices, p + start])
+            distances = np.concatenate([distances, pending[q, p]])
+
+        sessions = np.asarray(self.sessions, dtype=object)
+        return (
+            query,
+            distances,
+            sessions[self.session_index[indices]],
+            self.frames[indices],
+        )
+
+    def save(self, path: Union[str, Path]) -> ColumnStore:
+        """
+            Saves the index to a folder. The tree is not
+            saved but rebuilt when first queried after loading.
+        """
+        store = ColumnStore(path, mode="w")
+        store.write("vectors", self.vectors)
+        store.write("session_index", self.session_index)
+        store.write("frames", self.frames)
+        store.save_metadata(
+            sessions=self.sessions,
+            bodyparts=self.bodyparts,
+            n_components=self.n_components,
+            tree=self.tree,
+            leaf_size=self.leaf_size,
+            rebuild_fraction=self.rebuild_fraction,
+            pca_samples=self.pca_samples,
+            block_size=self.block_size,
+        )
+        return store
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> PoseIndex:
+        """
+            Loads an index saved with .save
+        """
+        store = ColumnStore(path, mode="r")
+        attributes = dict(store.attributes)
+        sessions = attributes.pop("sessions")
+
+        index = cls(**attributes)
+        index.sessions = sessions
+        for name in index._chunks:
+            index._chunks[name] = [np.asarray(store.read(name))]
+        index._n_frames = len(index._chunks["frames"][0])
+        return index
@@ -0,0 +1,211 @@
+"""
+    Opt-in instrumentation of the main processing stages.
+    Enable it by setting the environment variable KINO_PROFILE=1
+    (or KINO_PROFILE=memory to also track memory allocations) or with:
+
+        with profiling.profile(memory=True) as prof:
+            locomotion = Locomotion(...)
+        print(prof.table())
+
+    When disabled, instrumented functions only pay for checking a flag.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import tracemalloc
+from functools import wraps
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Union, Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from rich.table import Table
+
+_env = os.environ.get("KINO_PROFILE", "").lower()
+_enabled: bool = _env not in ("", "0", "false")
+_memory: bool = _env == "memory"
+
+# stack of [memory at stage start, peak memory of nested stages]
+_memory_stack: List[List[int]] = []
+
+
+class Profile:
+    """
+        Wall time, number of calls and peak allocated bytes of each stage
+    """
+
+    def __init__(self, stats: Dict[str, dict] = None):
+        self.stats: Dict[str, dict] = stats or {}
+
+    def __repr__(self) -> str:
+        return f"Profile | {len(self.stats)} stages"
+
+    def __getitem__(self, stage: str) -> dict:
+        return self.stats[stage]
+
+    def __contains__(self, stage: str) -> bool:
+        return stage in self.stats
+
+    def record(self, stage: str, duration: float, allocated: int = 0):
+        if stage not in self.stats:
+            self.stats[stage] = dict(calls=0, time=0.0, allocated=0)
+        self.stats[stage]["calls"] += 1
+        self.stats[stage]["time"] += duration
+        self.stats[stage]["allocated"] = max(
+            self.stats[stage]["allocated"], allocated
+        )
+
+    def merge(self, other: Union[Profile, Dict[str, dict]]):
+        """
+            Adds the stats from another profile (e.g. from a worker process)
+        """
+        other = other.stats if isinstance(other, Profile) else other
+        for stage, stats in other.items():
+            if stage not in self.stats:
+                self.stats[stage] = dict(calls=0, time=0.0, allocated=0)
+            self.stats[stage]["calls"] += stats["calls"]
+            self.stats[stage]["time"] += stats["time"]
+            self.stats[stage]["allocated"] = max(
+                self.stats[stage]["allocated"], stats["allocated"]
+            )
+
+    def reset(self):
+        self.stats = {}
+
+    def to_dict(self) -> Dict[str, dict]:
+        return {stage: dict(stats) for stage, stats in self.stats.items()}
+
+    def to_json(self, path: Union[str, Path]):
+        with open(path, "w") as fout:
+            json.dump(self.to_dict(), fout, indent=2)
+
+    def table(self) -> Table:
+        """
+            Rich table with stats sorted by stage name, so that
+            nested stages follow their parent stage
+        """
+        from rich.table import Table
+        from rich import box
+        from myterial import orange
+
+        tb = Table(box=box.SIMPLE_HEAVY)
+        tb.add_column("stage", header_style=f"bold {orange}")
+        for col in ("calls", "total (s)", "per call (ms)", "peak (MB)"):
+            tb.add_column(col, header_style=f"bold {orange}", justify="right")
+
+        for stage, stats in sorted(self.stats.items()):
+            tb.add_row(
+                stage,
+                str(stats["calls"]),
+                f"{stats['time']:.4f}",
+                f"{stats['time'] / stats['calls'] * 1000:.3f}",
+                f"{stats['allocated'] / 1e6:.2f}"
+                if stats["allocated"]
+                else "-",
+            )
+        return tb
+
+
+# profile collecting stats in the current process
+current = Profile()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable(memory: bool = False):
+    global _enabled, _memory
+    _enabled, _memory = True, memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _enabled, _memory
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _enabled, _memory = False, False
+
+
+@contextmanager
+def profile(memory: bool = False) -> Iterator[Profile]:
+    """
+        Enables profiling within the context and yields the
+        profile with the stats collected in the context
+    """
+    was_enabled, was_memory = _enabled, _memory
+    previous = current.to_dict()
+    current.reset()
+    enable(memory=memory)
+
+    result = Profile()
+    try:
+        yield result
+    finally:
+        result.merge(current)
+        current.reset()
+        current.merge(previous)
+        disable()
+        if was_enabled:
+            enable(memory=was_memory)
+
+
+class stage:
+    """
+        Context manager recording the time (and memory) spent in a stage
+    """
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        if not _enabled:
+            return self
+        if _memory:
+            _memory_stack.append([tracemalloc.get_traced_memory()[0], 0])
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        if not _enabled:
+            return
+        duration = time.perf_counter() - self.start
+
+        allocated = 0
+        if _memory and _memory_stack:
+            start_memory, nested_peak = _memory_stack.pop()
+            peak = max(tracemalloc.get_traced_memory()[1], nested_peak)
+            allocated = peak - start_memory
+            if _memory_stack:
+                _memory_stack[-1][1] = max(_memory_stack[-1][1], peak)
+
+        current.record(self.name, duration, allocated)
+
+
+def profiled(name: str) -> Callable:
+    """
+        Decorator recording the time (and memory) spent in a function
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return inner
+
+    return decorator
+
+
+if _memory:
+    tracemalloc.start()
@@ -0,0 +1,351 @@
+"""
+    Queries over kinematic variables: boolean expressions evaluated on
+    all frames at once (e.g. "(com.speed > 20) & (abs(com.thetadot) < 50)")
+    and converted to intervals (bouts) which can be joined with other
+    intervals (e.g. steps).
+"""
+
+from __future__ import annotations
+
+import ast
+import operator
+import numpy as np
+from typing import Any, Dict, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from kino.locomotion import Locomotion
+    from kino.steps import Paw
+
+
+# numpy functions which can be used in expressions (as np.{name})
+NUMPY_FUNCTIONS = (
+    "abs",
+    "absolute",
+    "sqrt",
+    "square",
+    "exp",
+    "log",
+    "sin",
+    "cos",
+    "tan",
+    "arctan2",
+    "degrees",
+    "radians",
+    "sign",
+    "isnan",
+    "isfinite",
+    "logical_and",
+    "logical_or",
+    "logical_not",
+    "minimum",
+    "maximum",
+    "clip",
+    "where",
+)
+
+OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.BitAnd: operator.and_,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+    ast.Invert: operator.invert,
+    ast.Not: np.logical_not,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+
+def detected(*trajectories) -> np.ndarray:
+    """
+        True at frames in which all trajectories have
+        valid (non NaN) coordinates
+    """
+    valid = np.ones(len(trajectories[0].x), dtype=bool)
+    for trajectory in trajectories:
+        valid &= ~np.isnan(trajectory.x) & ~np.isnan(trajectory.y)
+    return valid
+
+
+class ExpressionEvaluator:
+    """
+        Evaluates expressions parsed with ast, allowing only comparisons,
+        arithmetic/logical operators, constants, names, (public) attributes,
+        subscripts and calls to a fixed set of functions
+    """
+
+    def __init__(self, names: Dict[str, Any], functions: Tuple = ()):
+        self.names = names
+        self.functions = list(functions) + [
+            getattr(np, name) for name in NUMPY_FUNCTIONS
+        ]
+
+    def __call__(self, expression: str) -> Any:
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as error:
+            raise ValueError(f'Invalid expression "{expression}": {error}')
+        return self.visit(tree.body)
+
+    def visit(self, node: ast.AST) -> Any:
+        if isinstance(node, ast.Constant) and isinstance(
+            node.value, (int, float, bool, str)
+        ):
+            return node.value
+        elif isinstance(node, ast.Name):
+            if node.id not in self.names:
+                raise ValueError(f'Unknown name "{node.id}" in expression')
+            return self.names[node.id]
+        elif isinstance(node, ast.Attribute):
+            if node.attr.startswith("_"):
+                raise ValueError(f'Invalid attribute "{node.attr}"')
+            return getattr(self.visit(node.value), node.attr)
+        elif isinstance(node, ast.Subscript):
+            return self.visit(node.value)[self.visit(node.slice)]
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in OPERATORS:
+            return OPERATORS[type(node.op)](self.visit(node.operand))
+        elif isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            return OPERATORS[type(node.op)](
+                self.visit(node.left), self.visit(node.right)
+            )
+        elif isinstance(node, ast.BoolOp):
+            combine = (
+                np.logical_and
+                if isinstance(node.op, ast.And)
+                else np.logical_or
+            )
+            result = self.visit(node.values[0])
+            for value in node.values[1:]:
+                result = combine(result, self.visit(value))
+            return result
+        elif isinstance(node, ast.Compare):
+            result, left = True, self.visit(node.left)
+            for op, comparator in zip(node.ops, node.comparators):
+                if type(op) not in OPERATORS:
+                    break
+                right = self.visit(comparator)
+                result = result & OPERATORS[type(op)](left, right)
+                left = right
+            else:
+                return result
+        elif isinstance(node, ast.Call) and not node.keywords:
+            function = self.visit(node.func)
+            if not any(function is allowed for allowed in self.functions):
+                raise ValueError(
+                    f'Function "{ast.unparse(node.func)}" can\'t be used '
+                    "in expressions"
+                )
+            args = []
+            for arg in node.args:
+                if isinstance(arg, ast.Starred):
+                    args.extend(self.visit(arg.value))
+                else:
+                    args.append(self.visit(arg))
+            return function(*args)
+
+        raise ValueError(
+            f'Unsupported expression "{ast.unparse(node)}" '
+            f"({type(node).__name__})"
+        )
+
+
+def evaluate(locomotion: Locomotion, expression: str) -> np.ndarray:
+    """
+        Evaluates a boolean expression over the kinematics of a
+        Locomotion. Bodyparts (including com), bones, head, body_axis and
+        joints can be used by name, together with some numpy functions
+        (np., see NUMPY_FUNCTIONS), abs, isnan, and detected(*bodyparts).
+        paws is the list of paws trajectories, e.g.:
+            "(com.speed > 20) & (abs(com.thetadot) < 50) & detected(*paws)"
+
+        The expression is parsed and only operators, attributes and
+        calls to these functions are evaluated (no eval).
+
+        Returns:
+            boolean array with the value of the expression at each frame
+    """
+    names = dict(
+        np=np,
+        abs=np.abs,
+        isnan=np.isnan,
+        detected=detected,
+        paws=[locomotion.bodyparts[paw] for paw in locomotion.animal.paws],
+        head=locomotion.head,
+        body_axis=locomotion.body_axis,
+    )
+    if hasattr(locomotion, "joints"):
+        names["joints"] = locomotion.joints
+    names.update(locomotion.bones)
+    names.update(locomotion.bodyparts)
+
+    evaluator = ExpressionEvaluator(names, functions=(detected,))
+    with np.errstate(invalid="ignore"):
+        result = evaluator(expression)
+    return np.asarray(result, dtype=bool)
+
+
+class Intervals:
+    """
+        Interval index: a set of intervals [start, end) in frames sorted by start.
+        Intervals can overlap (e.g. steps of different paws).
+    """
+
+    def __init__(self, start, end, fps: int = 1):
+        start = np.asarray(start, dtype=int).ravel()
+        end = np.asarray(end, dtype=int).ravel()
+        if start.shape != end.shape:
+            raise ValueError(
+                "Intervals need the same number of starts and ends"
+            )
+
+        order = np.argsort(start, kind="stable")
+        self.start = start[order]
+        self.end = end[order]
+        self.fps = fps
+
+        # running max of the ends, used to find overlaps with binary search
+        self._max_end = (
+            np.maximum.accumulate(self.end) if len(self) else self.end
+        )
+
+    @classmethod
+    def from_mask(
+        cls,
+        mask: np.ndarray,
+        fps: int = 1,
+        min_duration: float = 0,
+        max_gap: float = 0,
+    ) -> Intervals:
+        """
+            Converts a boolean array to intervals of consecutive True frames.
+
+            Arguments:
+                mask: boolean array
+                fps: frame rate
+                min_duration: intervals shorter than this (in seconds) are removed
+                max_gap: intervals separated by gaps up to this long (in seconds)
+                    are merged before removing short intervals
+        """
+        padded = np.concatenate([[0], np.asarray(mask, dtype=np.int8), [0]])
+        changes = np.flatnonzero(np.diff(padded))
+        start, end = changes[::2], changes[1::2]
+
+        if max_gap > 0 and len(start) > 1:
+            separate = start[1:] - end[:-1] > max_gap * fps
+            start = start[np.concatenate([[True], separate])]
+            end = end[np.concatenate([separate, [True]])]
+
+        keep = end - start >= min_duration * fps
+        return cls(start[keep], end[keep], fps=fps)
+
+    @classmethod
+    def from_steps(cls, paw: Paw) -> Intervals:
+        """
+            Intervals of a paw's swing phases
+        """
+        return cls(paw.swings_start, paw.swings_end, fps=paw.trajectory.fps)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def __repr__(self) -> str:
+        return f"Intervals: {len(self)} intervals, {self.duration.sum():.2f}s"
+
+    def __getitem__(self, item) -> Union[Tuple[int, int], Intervals]:
+        if isinstance(item, (int, np.integer)):
+            return int(self.start[item]), int(self.end[item])
+        return Intervals(self.start[item], self.end[item], fps=self.fps)
+
+    def __iter__(self):
+        return zip(self.start, self.end)
+
+    @property
+    def duration(self) -> np.ndarray:
+        """
+            Duration of each interval in seconds
+        """
+        return (self.end - self.start) / self.fps
+
+    def to_mask(self, n_frames: int) -> np.ndarray:
+        """
+            Boolean array with True at frames in any of the intervals
+        """
+        counts = np.zeros(n_frames + 1, dtype=int)
+        np.add.at(counts, np.clip(self.start, 0, n_frames), 1)
+        np.add.at(counts, np.clip(self.end, 0, n_frames), -1)
+        return np.cumsum(counts[:-1]) > 0
+
+    def overlaps(self, other: Intervals) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Overlap join: finds all pairs of intervals (one from self
+            and one from other) sharing at least one frame.
+
+            Returns:
+                indices in self and in other of each overlapping pair
+        """
+        # candidates in other: start before the end of self's interval and
+        # (running max of) end after its start
+        first = np.searchsorted(other._max_end, self.start, side="right")
+        last = np.searchsorted(other.start, self.end, side="left")
+        counts = np.maximum(last - first, 0)
+
+        i = np.repeat(np.arange(len(self)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        j = np.repeat(first, counts) + offsets
+
+        # running max of ends may include intervals ending before the start
+        overlapping = other.end[j] > self.start[i]
+        return i[overlapping], j[overlapping]
+
+    def contains(self, other: Intervals) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Containment join: finds all pairs in which self's interval
+            fully contains other's interval.
+
+            Returns:
+                indices in self and in other of each pair
+        """
+        i, j = self.overlaps(other)
+        inside = (other.start[j] >= self.start[i]) & (
+            other.end[j] <= self.end[i]
+        )
+        return i[inside], j[inside]
+
+    def overlapping(self, other: Intervals) -> Intervals:
+        """
+            Intervals of self overlapping with any interval of other
+        """
+        i, _ = self.overlaps(other)
+        return self[np.unique(i)]
+
+    def within(self, other: Intervals) -> Intervals:
+        """
+            Intervals of self fully contained in an interval of other
+        """
+        _, j = other.contains(self)
+        return self[np.unique(j)]
+
+    def intersection(self, other: Intervals) -> Intervals:
+        """
+            Frames shared by intervals of self and other,
+            as a new set of intervals
+        """
+        i, j = self.overlaps(other)
+        return Intervals(
+            np.maximum(self.start[i], other.start[j]),
+            np.minimum(self.end[i], other.end[j]),
+            fps=self.fps,
+        )
@@ -0,0 +1,299 @@
+"""
+    Asyncio server receiving pose frames from a tracker over TCP or a
+    unix socket and feeding them into a StreamingLocomotion.
+
+    Binary frame format (little endian):
+        uint32 frame index | float64 timestamp | float32 x n_bodyparts x 2
+    with bodyparts in the order of animal.bodyparts_names.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import struct
+import time
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Union, List, Tuple, Optional, Dict
+
+from loguru import logger
+
+from kino.animal import Animal
+from kino.streaming import StreamingLocomotion
+
+HEADER = struct.Struct("<Id")
+
+
+def frame_size(n_bodyparts: int) -> int:
+    """
+        Number of bytes in a pose frame
+    """
+    return HEADER.size + n_bodyparts * 2 * 4
+
+
+def encode_pose(frame: int, timestamp: float, pose: np.ndarray) -> bytes:
+    """
+        Encodes a pose (n_bodyparts x 2 array) into a binary frame
+    """
+    return (
+        HEADER.pack(frame, timestamp) + np.asarray(pose, dtype="<f4").tobytes()
+    )
+
+
+def decode_poses(
+    buffer: bytes, n_bodyparts: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+        Decodes a buffer with N complete binary frames
+
+        Returns:
+            frames: N array of frame indices
+            timestamps: N array of timestamps
+            poses: N x n_bodyparts x 2 array
+    """
+    dtype = np.dtype(
+        [
+            ("frame", "<u4"),
+            ("timestamp", "<f8"),
+            ("pose", "<f4", (n_bodyparts, 2)),
+        ]
+    )
+    data = np.frombuffer(buffer, dtype=dtype)
+    return data["frame"], data["timestamp"], data["pose"]
+
+
+class LatencyHistogram:
+    """
+        Histogram of latencies with log spaced bins between 1us and 10s
+    """
+
+    def __init__(self, name: str, n_bins: int = 70):
+        self.name = name
+        self.edges = np.logspace(-6, 1, n_bins + 1)
+        self.counts = np.zeros(n_bins + 2, dtype=np.int64)
+        self.total = 0.0
+        self.max = 0.0
+
+    def __len__(self) -> int:
+        return int(self.counts.sum())
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return f"Latency {self.name}: no data"
+        return (
+            f"Latency {self.name}: n={len(self)} | mean {self.mean * 1e6:.1f}us"
+            f" | p50 {self.percentile(50) * 1e6:.1f}us"
+            f" | p99 {self.percentile(99) * 1e6:.1f}us"
+            f" | max {self.max * 1e6:.1f}us"
+        )
+
+    @property
+    def mean(self) -> float:
+        return self.total / max(len(self), 1)
+
+    def record(self, seconds: float):
+        self.counts[np.searchsorted(self.edges, seconds)] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """
+            Upper edge of the bin containing the q-th percentile
+        """
+        cumulative = np.cumsum(self.counts)
+        idx = np.searchsorted(cumulative, q / 100 * cumulative[-1])
+        return float(self.edges[min(idx, len(self.edges) - 1)])
+
+
+@dataclass
+class KinematicsUpdate:
+    """
+        Kinematics at a frame, published to subscribers
+    """
+
+    frame: int
+    timestamp: float
+    com: np.ndarray
+    com_speed: float
+    heading: float
+    egocentric: np.ndarray
+    swing_onsets: Tuple[str, ...]
+
+
+class PoseServer:
+    """
+        Receives pose frames from a tracker, batches them into a
+        StreamingLocomotion and publishes kinematics updates to subscribers.
+        Publishing waits for subscribers with full queues which in turn stops
+        reading from the socket (backpressure).
+    """
+
+    def __init__(
+        self,
+        animal: Animal,
+        fps: int = 1,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        path: Union[str, Path] = None,
+        buffer_size: int = 512,
+        max_batch: int = 64,
+    ):
+        self.animal = animal
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_batch = max_batch
+
+        self.n_bodyparts = animal.n_bodyparts
+        self.frame_size = frame_size(self.n_bodyparts)
+        self.locomotion = StreamingLocomotion(
+            animal, fps=fps, buffer_size=buffer_size
+        )
+        self.locomotion.on_swing_onset(self._on_swing_onset)
+        self._onsets: List[str] = []
+
+        self.subscribers: List[asyncio.Queue] = []
+        self.latency: Dict[str, LatencyHistogram] = {
+            stage: LatencyHistogram(stage)
+            for stage in ("decode", "kinematics", "publish", "total")
+        }
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.n_frames = 0
+
+    def __repr__(self) -> str:
+        address = self.path or f"{self.host}:{self.port}"
+        return f"PoseServer @ {address} | {self.n_frames} frames received"
+
+    def subscribe(self, maxsize: int = 256) -> asyncio.Queue:
+        """
+            Returns a queue receiving a KinematicsUpdate for each frame
+            and None when a tracker disconnects
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.remove(queue)
+
+    async def start(self):
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(
+                self._handle_tracker, path=str(self.path)
+            )
+        else:
+            self.server = await asyncio.start_server(
+                self._handle_tracker, host=self.host, port=self.port
+            )
+            self.port = self.server.sockets[0].getsockname()[1]
+        logger.debug(f"Started {self}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        logger.debug(f"Stopped {self}")
+
+    async def __aenter__(self) -> PoseServer:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    def _on_swing_onset(self, paw: str, frame: int):
+        self._onsets.append(paw)
+
+    async def _handle_tracker(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """
+            Reads all frames available (up to max_batch) from the
+            tracker's connection and processes them as a batch
+        """
+        pending = b""
+        while True:
+            data = await reader.read(self.frame_size * self.max_batch)
+            if not data:
+                break
+            received = time.perf_counter()
+
+            pending += data
+            n_complete = len(pending) // self.frame_size
+            if not n_complete:
+                continue
+            batch = pending[: n_complete * self.frame_size]
+            pending = pending[n_complete * self.frame_size :]
+            await self._process_batch(batch, received)
+
+        writer.close()
+        await self._publish(None)
+
+    async def _process_batch(self, batch: bytes, received: float):
+        t0 = time.perf_counter()
+        frames, timestamps, poses = decode_poses(batch, self.n_bodyparts)
+        self.latency["decode"].record(time.perf_counter() - t0)
+
+        for frame, timestamp, pose in zip(frames, timestamps, poses):
+            t0 = time.perf_counter()
+            self._onsets.clear()
+            self.locomotion.update(pose)
+            update = KinematicsUpdate(
+                frame=int(frame),
+                timestamp=float(timestamp),
+                com=self.locomotion.position.last[-1].copy(),
+                com_speed=float(self.locomotion.speed.last[-1]),
+                heading=float(self.locomotion.heading.last),
+                egocentric=self.locomotion.egocentric.last.copy(),
+                swing_onsets=tuple(self._onsets),
+            )
+            t1 = time.perf_counter()
+            self.latency["kinematics"].record(t1 - t0)
+
+            await self._publish(update)
+            t2 = time.perf_counter()
+            self.latency["publish"].record(t2 - t1)
+            self.latency["total"].record(t2 - received)
+            self.n_frames += 1
+
+    async def _publish(self, update: Optional[KinematicsUpdate]):
+        for queue in self.subscribers:
+            await queue.put(update)
+
+
+async def replay_tracking(
+    animal: Animal,
+    tracking,
+    host: str = "127.0.0.1",
+    port: int = None,
+    path: Union[str, Path] = None,
+    rate: float = None,
+    n_frames: int = None,
+):
+    """
+        Fake tracker client: sends the poses in tracking data (in the format
+        used by Locomotion, e.g. from example_tracking.h5) to a PoseServer.
+
+        Arguments:
+            rate: frames per second at which poses are sent, if None
+                they are sent as fast as possible
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(str(path))
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    n_frames = n_frames or len(tracking[f"{animal.bodyparts_names[0]}_x"])
+    start = time.perf_counter()
+    for frame in range(n_frames):
+        pose = StreamingLocomotion.pose_from_tracking(animal, tracking, frame)
+        writer.write(encode_pose(frame, time.time(), pose))
+        await writer.drain()
+
+        if rate is not None:
+            delay = start + (frame + 1) / rate - time.perf_counter()
+            await asyncio.sleep(max(delay, 0))
+
+    writer.close()
+    await writer.wait_closed()
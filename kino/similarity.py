@@ -0,0 +1,410 @@
+"""
+    Distances between trajectories (paths): dynamic time warping (DTW)
+    and discrete Fréchet distance. The dynamic programming is vectorized over
+    anti-diagonals (cells on the same anti-diagonal don't depend on each other)
+    and over batches of pairs of trajectories. Pairs whose lower bound exceeds
+    max_distance are pruned without computing their distance and the
+    computation of the others is abandoned as soon as it exceeds max_distance.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Sequence, Tuple, Union, TYPE_CHECKING
+
+from kino.math import running_extremum
+from kino.progress import track
+
+if TYPE_CHECKING:
+    from kino.geometry import Trajectory
+
+
+METRICS = ("dtw", "frechet")
+
+
+def as_points(trajectory: Union[Trajectory, np.ndarray]) -> np.ndarray:
+    """
+        (n_points, 2) array with the points of a Trajectory
+        or array, without NaN points
+    """
+    if hasattr(trajectory, "x"):
+        points = np.column_stack([trajectory.x, trajectory.y])
+    else:
+        points = np.asarray(trajectory, dtype=float)
+    return points[~np.isnan(points).any(axis=1)].astype(float)
+
+
+def band_width(n: int, m: int, window: int = None) -> float:
+    """
+        Width of the Sakoe-Chiba band: cells (i, j) with |i - j| <= width are used.
+        The band is widened to the difference in length of the two
+        trajectories so that the end can always be reached.
+    """
+    if window is None:
+        return np.inf
+    return max(window, abs(n - m))
+
+
+def _pad(points: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    lengths = np.array([len(p) for p in points])
+    padded = np.full((len(points), lengths.max(), 2), np.nan)
+    for n, p in enumerate(points):
+        padded[n, : len(p)] = p
+    return padded, lengths
+
+
+def lower_bound(
+    a: np.ndarray, b: np.ndarray, metric: str = "dtw", window: int = None
+) -> float:
+    """
+        Lower bound of the distance between two trajectories: distance of the
+        first/last points and, with a band, the distance of each point of a to
+        the bounding box of the points of b it can be matched to (LB_Keogh).
+    """
+    return float(
+        _lower_bounds([as_points(a)], [as_points(b)], metric, window)[0]
+    )
+
+
+def _lower_bounds(
+    A: Sequence[np.ndarray],
+    B: Sequence[np.ndarray],
+    metric: str,
+    window: int = None,
+) -> np.ndarray:
+    a, la = _pad(A)
+    b, lb = _pad(B)
+    pairs = np.arange(len(a))
+
+    first = np.linalg.norm(a[:, 0] - b[:, 0], axis=1)
+    last = np.linalg.norm(a[pairs, la - 1] - b[pairs, lb - 1], axis=1)
+    if metric == "dtw":
+        bounds = np.where((la == 1) & (lb == 1), first, first + last)
+    else:
+        bounds = np.maximum(first, last)
+
+    # the widest band of the batch is used for all pairs: a wider
+    # envelope gives a looser but still valid bound
+    width = max(band_width(n, m, window) for n, m in zip(la, lb))
+    if width >= max(a.shape[1], b.shape[1]):
+        return bounds
+
+    # envelope of b around each point of a, b is padded with its first/last point
+    width = int(width)
+    b[np.arange(b.shape[1])[None] >= lb[:, None]] = np.repeat(
+        b[pairs, lb - 1], b.shape[1] - lb, axis=0
+    )
+    padded = np.concatenate(
+        [
+            np.repeat(b[:, :1], width, axis=1),
+            b,
+            np.repeat(
+                b[:, -1:], width + max(0, a.shape[1] - b.shape[1]), axis=1
+            ),
+        ],
+        axis=1,
+    )
+    padded = padded.swapaxes(0, 1)
+    low = running_extremum(np.minimum, padded, 2 * width + 1)[: a.shape[1]]
+    high = running_extremum(np.maximum, padded, 2 * width + 1)[: a.shape[1]]
+    low, high = low.swapaxes(0, 1), high.swapaxes(0, 1)
+
+    outside = np.maximum(low - a, 0) + np.maximum(a - high, 0)
+    distance = np.sqrt(np.einsum("pij,pij->pi", outside, outside))
+    distance[np.isnan(distance)] = 0  # padding of a
+    keogh = distance.sum(axis=1) if metric == "dtw" else distance.max(axis=1)
+    return np.maximum(bounds, keogh)
+
+
+def batch_distances(
+    A: Sequence[np.ndarray],
+    B: Sequence[np.ndarray],
+    metric: str = "dtw",
+    window: int = None,
+    max_distance: float = None,
+) -> np.ndarray:
+    """
+        Distance between each pair of trajectories (A[n], B[n]), computed
+        for all pairs at once by sweeping the anti-diagonals of the
+        dynamic programming matrices.
+
+        Arguments:
+            A, B: sequences of (n_points, 2) arrays
+            metric: "dtw" or "frechet"
+            window: width of the Sakoe-Chiba band (no band if None)
+            max_distance: pairs whose distance is larger are set to inf
+
+        Returns:
+            distance of each pair
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Metric must be one of {METRICS}, not {metric}")
+    combine = np.add if metric == "dtw" else np.maximum
+
+    a, la = _pad(A)
+    b, lb = _pad(B)
+    N, M = a.shape[1], b.shape[1]
+    width = np.array([band_width(n, m, window) for n, m in zip(la, lb)])
+    end = la + lb - 2
+
+    distances = np.full(len(A), np.inf)
+    active = np.arange(len(A))
+    previous_min = np.full(len(A), np.inf)
+
+    # D[:, i + 1] is the accumulated distance at cell (i, k - i) of
+    # the current anti-diagonal k, D[:, 0] is a sentinel for i = -1
+    previous2 = np.full((len(A), N + 1), np.inf)
+    previous = np.full((len(A), N + 1), np.inf)
+    current = np.full((len(A), N + 1), np.inf)
+    max_width = width.max()
+    for k in range(end.max() + 1):
+        lo, hi = max(0, k - M + 1), min(N - 1, k)
+        if max_width < np.inf:
+            lo = max(lo, int(np.ceil((k - max_width) / 2)))
+            hi = min(hi, int(np.floor((k + max_width) / 2)))
+        i = np.arange(lo, hi + 1)
+        j = k - i
+
+        delta = a[:, i] - b[:, j]
+        cost = np.sqrt(np.einsum("pli,pli->pl", delta, delta))
+        outside = np.abs(i - j)[None] > width[:, None]
+        cost[outside | np.isnan(cost)] = np.inf
+
+        if k == 0:
+            accumulated = cost
+        else:
+            best = np.minimum(
+                np.minimum(previous2[:, i], previous[:, i]), previous[:, i + 1]
+            )
+            accumulated = combine(cost, best)
+        current.fill(np.inf)
+        current[:, i + 1] = accumulated
+
+        finished = end == k
+        if finished.any():
+            distances[active[finished]] = current[finished, la[finished]]
+
+        # any path crosses anti-diagonal k or k - 1 and distances only grow
+        # along paths: stop computing pairs that can't be below max_distance
+        keep = end > k
+        if max_distance is not None:
+            current_min = accumulated.min(axis=1, initial=np.inf)
+            keep &= np.minimum(current_min, previous_min) <= max_distance
+            previous_min = current_min
+        if not keep.all():
+            if not keep.any():
+                break
+            active, a, b, la, lb, width, end, previous_min = (
+                x[keep]
+                for x in (active, a, b, la, lb, width, end, previous_min)
+            )
+            previous, current = previous[keep], current[keep]
+            previous2 = np.empty_like(current)
+        previous2, previous, current = previous, current, previous2
+
+    if max_distance is not None:
+        distances[distances > max_distance] = np.inf
+    return distances
+
+
+def dtw(
+    a: Union[Trajectory, np.ndarray],
+    b: Union[Trajectory, np.ndarray],
+    window: int = None,
+) -> float:
+    """
+        Dynamic time warping distance: sum of the distances between
+        matched points along the best warping path
+    """
+    return float(
+        batch_distances([as_points(a)], [as_points(b)], "dtw", window)[0]
+    )
+
+
+def frechet(
+    a: Union[Trajectory, np.ndarray],
+    b: Union[Trajectory, np.ndarray],
+    window: int = None,
+) -> float:
+    """
+        Discrete Fréchet distance: largest distance between matched
+        points along the best warping path
+    """
+    return float(
+        batch_distances([as_points(a)], [as_points(b)], "frechet", window)[0]
+    )
+
+
+# points of all trajectories in shared memory, set in each worker
+_shared = {}
+
+
+def _attach(name: str, shape: Tuple[int, int], offsets: np.ndarray):
+    """
+        Worker initializer: maps the points of all trajectories
+        from shared memory
+    """
+    memory = shared_memory.SharedMemory(name=name)
+    _shared["memory"] = memory
+    _shared["points"] = np.ndarray(shape, dtype=float, buffer=memory.buf)
+    _shared["offsets"] = offsets
+
+
+def _compute_pairs(
+    first: np.ndarray,
+    second: np.ndarray,
+    metric: str,
+    window: int = None,
+    max_distance: float = None,
+) -> np.ndarray:
+    points, offsets = _shared["points"], _shared["offsets"]
+    A = [points[offsets[n] : offsets[n + 1]] for n in first]
+    B = [points[offsets[n] : offsets[n + 1]] for n in second]
+
+    distances = np.full(len(A), np.inf)
+    if max_distance is not None:
+        candidates = np.flatnonzero(
+            _lower_bounds(A, B, metric, window) <= max_distance
+        )
+    else:
+        candidates = np.arange(len(A))
+
+    if len(candidates):
+        distances[candidates] = batch_distances(
+            [A[n] for n in candidates],
+            [B[n] for n in candidates],
+            metric,
+            window,
+            max_distance,
+        )
+    return distances
+
+
+def cache_key(
+    trajectories: Sequence[np.ndarray],
+    metric: str,
+    window: int = None,
+    max_distance: float = None,
+) -> str:
+    """
+        Hash of the trajectories and parameters, used to name cached results
+    """
+    digest = hashlib.sha1(f"{metric}-{window}-{max_distance}".encode())
+    for points in trajectories:
+        digest.update(np.int64(len(points)).tobytes())
+        digest.update(np.ascontiguousarray(points).tobytes())
+    return digest.hexdigest()
+
+
+def pairwise_distances(
+    trajectories: Sequence[Union[Trajectory, np.ndarray]],
+    metric: str = "dtw",
+    window: int = None,
+    max_distance: float = None,
+    n_workers: int = 1,
+    batch_size: int = 256,
+    cache: Union[str, Path] = None,
+) -> np.ndarray:
+    """
+        Distance between all pairs of trajectories as a condensed
+        distance matrix (same order as scipy.spatial.distance.pdist).
+
+        Arguments:
+            trajectories: Trajectory objects or (n_points, 2) arrays
+            metric: "dtw" or "frechet"
+            window: width of the Sakoe-Chiba band (no band if None)
+            max_distance: pairs farther apart than this are set to inf, which
+                allows to prune most pairs when only neighbours are needed
+            n_workers: number of worker processes. Trajectories are
+                shared with the workers through shared memory.
+            batch_size: number of pairs computed at once
+            cache: folder where results are saved and loaded from
+
+        Returns:
+            (n * (n - 1) / 2,) array
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Metric must be one of {METRICS}, not {metric}")
+    points = [as_points(trajectory) for trajectory in trajectories]
+
+    if cache is not None:
+        cache = Path(cache)
+        cache.mkdir(parents=True, exist_ok=True)
+        path = (
+            cache
+            / f"{metric}_{cache_key(points, metric, window, max_distance)}.npy"
+        )
+        if path.exists():
+            return np.load(path)
+
+    # pairs are sorted by length so that batches need little padding
+    first, second = np.triu_indices(len(points), k=1)
+    lengths = np.array([len(p) for p in points])
+    order = np.argsort(
+        np.maximum(lengths[first], lengths[second]), kind="stable"
+    )
+    batches = [
+        order[start : start + batch_size]
+        for start in range(0, len(order), batch_size)
+    ]
+
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    data = np.concatenate(points) if points else np.zeros((0, 2))
+    arguments = (
+        [first[batch] for batch in batches],
+        [second[batch] for batch in batches],
+        [metric] * len(batches),
+        [window] * len(batches),
+        [max_distance] * len(batches),
+    )
+
+    condensed = np.full(len(first), np.inf)
+    if n_workers == 1:
+        _shared.update(points=data, offsets=offsets)
+        try:
+            for batch, *args in zip(batches, *arguments):
+                condensed[batch] = _compute_pairs(*args)
+        finally:
+            _shared.clear()
+    else:
+        memory = shared_memory.SharedMemory(
+            create=True, size=max(data.nbytes, 1)
+        )
+        try:
+            np.ndarray(data.shape, dtype=float, buffer=memory.buf)[:] = data
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                initializer=_attach,
+                initargs=(memory.name, data.shape, offsets),
+            ) as executor:
+                results = executor.map(_compute_pairs, *arguments)
+                for batch, distances in track(
+                    zip(batches, results),
+                    total=len(batches),
+                    description="Computing distances",
+                    transient=True,
+                ):
+                    condensed[batch] = distances
+        finally:
+            memory.close()
+            memory.unlink()
+
+    if cache is not None:
+        np.save(path, condensed)
+    return condensed
+
+
+def squareform(condensed: np.ndarray) -> np.ndarray:
+    """
+        Converts a condensed distance matrix to a square one
+    """
+    n = int(np.round((1 + np.sqrt(1 + 8 * len(condensed))) / 2))
+    square = np.zeros((n, n))
+    first, second = np.triu_indices(n, k=1)
+    square[first, second] = condensed
+    square[second, first] = condensed
+    return square
@@ -0,0 +1,209 @@
+"""
+    Multiple animals tracked in the same session. The poses of all animals
+    are stored in a single (n_animals, n_frames, n_bodyparts, 2) tensor
+    so that kinematics and inter-animal measures are computed for all
+    animals at once.
+"""
+
+from __future__ import annotations
+
+import warnings
+import numpy as np
+from typing import Dict, List, Union
+
+from kino.animal import Animal
+from kino.geometry import Trajectory
+from kino.pose import to_pose_tensor, to_tracking
+from kino.profiling import profiled
+
+
+class MultiAnimalLocomotion:
+    """
+        Locomotion of multiple animals with the same skeleton.
+
+        Per-frame quantities have the animals as first axis, e.g. velocity
+        has shape (n_animals, n_frames, n_bodyparts, 2). Pairwise measures
+        have shape (n_frames, n_animals, n_animals).
+    """
+
+    @profiled("multi_animal")
+    def __init__(
+        self,
+        animal: Animal,
+        pose: np.ndarray,
+        fps: int = 1,
+        names: List[str] = None,
+        smoothing_window: int = 5,
+        smoothing_method: str = "window",
+    ):
+        """
+            Arguments:
+                animal: Animal with the skeleton of all animals
+                pose: (n_animals, n_frames, n_bodyparts, 2) array
+                fps: frame rate
+                names: name of each animal
+                smoothing_window, smoothing_method: used to estimate velocity and
+                    acceleration ("window", "savgol" or "kalman", see
+                    Trajectory.estimate_kinematics)
+        """
+        self.animal = animal
+        self.pose = np.asarray(pose, dtype=float)
+        self.fps = fps
+        self.names = names or [f"animal_{n}" for n in range(len(self.pose))]
+        if len(self.names) != len(self.pose):
+            raise ValueError("The number of names and animals doesn't match")
+
+        bodyparts = list(animal.bodyparts_names)
+        self._paws = [bodyparts.index(paw) for paw in animal.paws]
+        self._body_axis = (
+            bodyparts.index(animal.body_axis.bp1.name),
+            bodyparts.index(animal.body_axis.bp2.name),
+        )
+
+        # velocity and acceleration of all bodyparts, frames as first axis
+        _, velocity, acceleration = Trajectory.estimate_kinematics(
+            self.pose.transpose(1, 0, 2, 3),
+            smoothing_method,
+            window=smoothing_window,
+            fps=fps,
+        )
+        self.velocity = velocity.transpose(1, 0, 2, 3)
+        self.acceleration = acceleration.transpose(1, 0, 2, 3)
+        self.speed = np.linalg.norm(self.velocity, axis=-1)
+
+    @classmethod
+    def from_tracking(
+        cls, animal: Animal, trackings: Dict[str, dict], fps: int = 1, **kwargs
+    ) -> MultiAnimalLocomotion:
+        """
+            Creates the container from the tracking data
+            of each animal ({name: tracking})
+        """
+        pose = np.stack(
+            [
+                to_pose_tensor(animal, tracking)[0]
+                for tracking in trackings.values()
+            ]
+        )
+        return cls(
+            animal, pose, fps=fps, names=list(trackings.keys()), **kwargs
+        )
+
+    def __len__(self) -> int:
+        return self.pose.shape[1]
+
+    def __repr__(self) -> str:
+        return f"MultiAnimalLocomotion: {self.n_animals} animals, {len(self)} frames"
+
+    def __getitem__(self, name: Union[str, int]):
+        """
+            Locomotion of one animal, by name or index
+        """
+        from kino.locomotion import Locomotion
+
+        index = self.names.index(name) if isinstance(name, str) else name
+        return Locomotion(
+            self.animal,
+            to_tracking(self.animal, self.pose[index]),
+            fps=self.fps,
+        )
+
+    @property
+    def n_animals(self) -> int:
+        return len(self.pose)
+
+    @property
+    def com(self) -> np.ndarray:
+        """
+            Center of mass of the paws: (n_animals, n_frames, 2) array,
+            ignoring paws missing at a frame (as Locomotion's CoM)
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            return np.nanmean(self.pose[:, :, self._paws], axis=2)
+
+    @property
+    def body_axis(self) -> np.ndarray:
+        """
+            Body axis vector: (n_animals, n_frames, 2) array
+        """
+        bp1, bp2 = self._body_axis
+        return self.pose[:, :, bp2] - self.pose[:, :, bp1]
+
+    @property
+    def heading(self) -> np.ndarray:
+        """
+            Orientation of the body axis in degrees
+            (in [0, 360)): (n_animals, n_frames) array
+        """
+        axis = self.body_axis
+        return np.mod(np.degrees(np.arctan2(axis[..., 1], axis[..., 0])), 360)
+
+    def _positions(self, bodypart: str) -> np.ndarray:
+        if bodypart == "com":
+            return self.com
+        return self.pose[
+            :, :, list(self.animal.bodyparts_names).index(bodypart)
+        ]
+
+    def distances(self, bodypart: str = "com") -> np.ndarray:
+        """
+            Distance between each pair of animals at each frame,
+            measured between a bodypart (or the center of mass):
+            (n_frames, n_animals, n_animals) array
+        """
+        positions = self._positions(bodypart).transpose(1, 0, 2)
+        delta = positions[:, None] - positions[:, :, None]
+        return np.sqrt(np.einsum("...i,...i->...", delta, delta))
+
+    def bearings(self, bodypart: str = "com") -> np.ndarray:
+        """
+            Bearing of each animal relative to the others: bearings[t, i, j]
+            is the angle (degrees, in [-180, 180)) between animal i's body axis and
+            the direction from animal i to animal j. 0 means that j is
+            straight ahead of i, positive angles are to i's left.
+        """
+        positions = self._positions(bodypart).transpose(1, 0, 2)
+        delta = positions[:, None] - positions[:, :, None]
+        direction = np.degrees(np.arctan2(delta[..., 1], delta[..., 0]))
+        bearing = direction - self.heading.T[:, :, None]
+        return np.mod(bearing + 180, 360) - 180
+
+    def rotation_matrices(self) -> np.ndarray:
+        """
+            Rotation matrices aligning each animal's body axis with
+            the y axis, like Locomotion.to_egocentric: (n_animals, n_frames, 2, 2)
+        """
+        theta = np.radians(90 - self.heading)
+        cos, sin = np.cos(theta), np.sin(theta)
+        return np.stack(
+            [np.stack([cos, -sin], -1), np.stack([sin, cos], -1)], -2
+        )
+
+    def to_egocentric(self, reference: Union[str, int] = None) -> np.ndarray:
+        """
+            Projects the pose of every animal into the egocentric reference
+            frame of an animal (centered at its center of mass and with its
+            body axis facing up).
+
+            Arguments:
+                reference: name or index of the animal whose reference frame is
+                    used. If None every animal is projected into every other's frame.
+
+            Returns:
+                (n_animals, n_frames, n_bodyparts, 2) array or with reference=None
+                (n_animals [reference], n_animals, n_frames, n_bodyparts, 2) array
+        """
+        com = self.com
+        Rs = self.rotation_matrices()
+        if reference is not None:
+            index = (
+                self.names.index(reference)
+                if isinstance(reference, str)
+                else reference
+            )
+            centered = self.pose - com[index][None, :, None]
+            return np.einsum("tij,atbj->atbi", Rs[index], centered)
+
+        centered = self.pose[None] - com[:, None, :, None]
+        return np.einsum("rtij,ratbj->ratbi", Rs, centered)
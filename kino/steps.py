@@ -1,12 +1,84 @@
 import numpy as np
+from typing import Tuple, List
 
 # from loguru import logger
 
 from kino.math import convolve_with_gaussian
+from kino.cleaning import nan_runs
 from kino.geometry import Trajectory
+from kino.io import Columnar
+from kino.profiling import profiled
 
 
-class Paw:
+def select_swings(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    com_speed: np.ndarray,
+    fps: int,
+    gaps: np.ndarray = None,
+) -> Tuple[List[int], List[int], List[float]]:
+    """
+        Given the onsets/offsets of swing phases, it pairs them
+        and keeps only swings happening while the animal is moving.
+        Swings overlapping frames in gaps (boolean array) or starting
+        when the CoM speed is unknown are discarded.
+
+        Returns:
+            swings_start, swings_end, swings_duration
+    """
+    if not len(starts):
+        return [], [], []
+    ends = [end for end in ends if end > starts[0]]
+
+    # number of gap frames before each frame
+    if gaps is not None:
+        in_gaps = np.concatenate([[0], np.cumsum(gaps)])
+
+    # check that steps meet min/max duration and distance requirements
+    swings_start, swings_end, swings_duration = [], [], []
+    for start, end in zip(starts, ends):
+        if not com_speed[start] >= 20:
+            continue
+        if gaps is not None and in_gaps[end + 1] > in_gaps[start]:
+            continue
+
+        dur = (end - start) / fps
+        # dist = (
+        #     np.sum(self.trajectory.speed[start:end]) / self.trajectory.fps
+        # )
+
+        # if dur > 0.01 and dur < 0.5 and dist > 2 and dist < 10:
+        #     if len(self.swings_end) and start < self.swings_end[-1]:
+        #         continue  # start before previous step ends
+        swings_start.append(start)
+        swings_end.append(end)
+        swings_duration.append(dur)
+    return swings_start, swings_end, swings_duration
+
+
+def long_gaps(values: np.ndarray, max_gap: int) -> np.ndarray:
+    """
+        Boolean array, True at frames in runs of NaNs
+        longer than max_gap frames
+    """
+    _, first, last = nan_runs(values[:, None])
+    long = last - first > max_gap
+    edges = np.zeros(len(values) + 1, dtype=int)
+    np.add.at(edges, first[long], 1)
+    np.add.at(edges, last[long], -1)
+    return np.cumsum(edges)[:-1] > 0
+
+
+class Paw(Columnar):
+    # width of gaussian kernels used to smooth the CoM and paw speeds
+    com_kernel_width: int = 21
+    kernel_width: int = 6
+
+    # missing frames up to max_gap long keep the swing/stance state of the
+    # frame before them, swings overlapping longer gaps are discarded
+    max_gap: int = 5
+
+    @profiled("steps.paw")
     def __init__(
         self, name: str, trajectory: Trajectory, com: Trajectory,
     ):
@@ -15,13 +87,17 @@ class Paw:
         self.com = com
 
         self.normalized_speed = convolve_with_gaussian(
-            trajectory.speed - convolve_with_gaussian(com.speed),
-            kernel_width=6,
+            trajectory.speed
+            - convolve_with_gaussian(
+                com.speed, kernel_width=self.com_kernel_width
+            ),
+            kernel_width=self.kernel_width,
         )
 
         self.speed_th = -8 if "hl" in name else -5
         self.detect_swing()
 
+    @profiled("steps.paw.detect_swing")
     def detect_swing(self):
         """
             Detects when the paws is in a swing movement
@@ -35,28 +111,24 @@ class Paw:
         self.is_swing = np.zeros_like(self.normalized_speed)
         self.is_swing[self.normalized_speed > self.speed_th] = 1
 
+        # missing frames take the state of the last valid frame
+        # so that gaps don't split swing/stance phases
+        missing = np.isnan(self.normalized_speed)
+        gaps = None
+        if missing.any():
+            last_valid = np.maximum.accumulate(
+                np.where(missing, 0, np.arange(len(missing)))
+            )
+            self.is_swing = self.is_swing[last_valid]
+            gaps = long_gaps(self.normalized_speed, self.max_gap)
+
         # get onset/offset of swing phase
         starts = np.where(np.diff(self.is_swing) > 0)[0]
         ends = np.where(np.diff(self.is_swing) < 0)[0] + 1
-        ends = [end for end in ends if end > starts[0]]
-
-        # check that steps meet min/max duration and distance requirements
-        self.swings_start, self.swings_end, self.swings_duration = [], [], []
-        for start, end in zip(starts, ends):
-            if self.com.speed[start] < 20:
-                continue
-
-            dur = (end - start) / self.trajectory.fps
-            # dist = (
-            #     np.sum(self.trajectory.speed[start:end]) / self.trajectory.fps
-            # )
-
-            # if dur > 0.01 and dur < 0.5 and dist > 2 and dist < 10:
-            #     if len(self.swings_end) and start < self.swings_end[-1]:
-            #         continue  # start before previous step ends
-            self.swings_start.append(start)
-            self.swings_end.append(end)
-            self.swings_duration.append(dur)
-        # logger.debug(
-        #     f'Paw "{self.name}" detect {len(starts)} potential steps, kept {len(self.swings_start)}'
-        # )
+        (
+            self.swings_start,
+            self.swings_end,
+            self.swings_duration,
+        ) = select_swings(
+            starts, ends, self.com.speed, self.trajectory.fps, gaps=gaps
+        )
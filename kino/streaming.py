@@ -0,0 +1,275 @@
+"""
+    Online kinematics for closed-loop experiments: poses are added one frame
+    at the time and kinematics are updated incrementally with causal
+    (exponential moving average) filters. All per-frame computations write to
+    pre-allocated ring buffers.
+"""
+
+from __future__ import annotations
+
+import math
+import numpy as np
+from typing import Callable, List, Union
+
+from kino.animal import Animal
+from kino.locomotion import Locomotion
+from kino.steps import Paw
+
+
+def ema_alpha(window: float) -> float:
+    """
+        Smoothing factor of an exponential moving average spanning
+        a window of given width
+    """
+    return 2 / (max(window, 1) + 1)
+
+
+def gaussian_ema_alpha(kernel_width: int) -> float:
+    """
+        Smoothing factor of an exponential moving average matching the
+        width of the gaussian kernels in kino.math.convolve_with_gaussian
+        (kernel_width samples spanning +/- 3.72 standard deviations)
+    """
+    sigma = kernel_width / 7.44
+    return ema_alpha(2 * sigma + 1)
+
+
+class RingBuffer:
+    """
+        Fixed size buffer storing the last n values of an array.
+    """
+
+    def __init__(self, size: int, shape: tuple = (), dtype: type = float):
+        if size < 2:
+            raise ValueError("RingBuffer size must be at least 2")
+        self.data = np.zeros((size,) + shape, dtype=dtype)
+        self.size = size
+        self.index = -1
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __repr__(self) -> str:
+        return f"RingBuffer | {self.count}/{self.size} items"
+
+    @property
+    def last(self) -> np.ndarray:
+        """
+            View of the last item added
+        """
+        return self.data[self.index]
+
+    def previous(self, lag: int = 1) -> np.ndarray:
+        """
+            View of the item added 'lag' steps before the last one
+        """
+        return self.data[(self.index - lag) % self.size]
+
+    def next_slot(self) -> np.ndarray:
+        """
+            Advances the buffer and returns a view on the new slot
+            to be filled in place
+        """
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        return self.data[self.index]
+
+    def push(self, value: Union[float, np.ndarray]):
+        self.next_slot()
+        self.data[self.index] = value
+
+    def to_array(self) -> np.ndarray:
+        """
+            Returns a copy of the buffer content, from oldest to newest
+        """
+        if self.count < self.size:
+            return self.data[: self.count].copy()
+        return np.roll(self.data, -(self.index + 1), axis=0)
+
+
+class StreamingLocomotion:
+    """
+        Incremental version of Locomotion: a pose (n_bodyparts x 2 array with
+        bodyparts in the order of animal.bodyparts_names) is added at each
+        frame and velocity, speed, heading, center of mass and egocentric pose
+        are updated with causal filters. Swing onsets are detected online
+        and reported to the callbacks registered with on_swing_onset.
+    """
+
+    view: str = "allocentric"
+
+    def __init__(
+        self,
+        animal: Animal,
+        fps: int = 1,
+        buffer_size: int = 512,
+        smoothing_window: int = 5,
+        com_smoothing_window: int = Locomotion.com_smoothing_window,
+    ):
+        self.animal = animal
+        self.fps = fps
+        self.frame = -1
+
+        # last entry is the CoM
+        self.bodyparts_names = list(animal.bodyparts_names) + ["com"]
+        n_bps = len(self.bodyparts_names)
+        self._paws_idx = np.array(
+            [self.bodyparts_names.index(paw) for paw in animal.paws]
+        )
+        self._axis_idx = (
+            self.bodyparts_names.index(animal.body_axis.bp1.name),
+            self.bodyparts_names.index(animal.body_axis.bp2.name),
+        )
+
+        # ring buffers with kinematics for each bodypart
+        self.position = RingBuffer(buffer_size, (n_bps, 2))
+        self.velocity = RingBuffer(buffer_size, (n_bps, 2))
+        self.speed = RingBuffer(buffer_size, (n_bps,))
+        self.egocentric = RingBuffer(buffer_size, (n_bps, 2))
+        self.heading = RingBuffer(buffer_size)
+
+        # filters parameters
+        self._alpha = np.full((n_bps, 1), ema_alpha(smoothing_window))
+        self._alpha[-1] = ema_alpha(com_smoothing_window)
+        self._com_alpha = gaussian_ema_alpha(Paw.com_kernel_width)
+        self._paw_alpha = gaussian_ema_alpha(Paw.kernel_width)
+
+        # swing detection state
+        self.paws = list(animal.paws)
+        self.speed_th = np.array([-8 if "hl" in p else -5 for p in self.paws])
+        self.normalized_speed = np.zeros(len(self.paws))
+        self.is_swing = np.zeros(len(self.paws), dtype=bool)
+        self.swing_onset = np.zeros(len(self.paws), dtype=bool)
+        self._callbacks: List[Callable] = []
+        self._com_speed = 0.0
+
+        # scratch arrays
+        self._paws_xy = np.zeros((len(self.paws), 2))
+        self._delta = np.zeros((n_bps, 2))
+        self._centered = np.zeros((n_bps, 2))
+        self._R = np.zeros((2, 2))
+        self._paws_speed = np.zeros(len(self.paws))
+        self._swing = np.zeros(len(self.paws), dtype=bool)
+
+    def __repr__(self) -> str:
+        return f"Streaming locomotion | {self.frame + 1} frames"
+
+    def __len__(self) -> int:
+        return self.frame + 1
+
+    def __getitem__(self, item: str) -> np.ndarray:
+        """
+            Returns the current position of a bodypart
+        """
+        return self.position.last[self.bodyparts_names.index(item)]
+
+    def on_swing_onset(self, callback: Callable):
+        """
+            Registers a function called as callback(paw_name, frame)
+            when a swing starts
+        """
+        self._callbacks.append(callback)
+
+    def update(self, pose: np.ndarray) -> bool:
+        """
+            Adds the pose at the next frame and updates the kinematics.
+
+            Arguments:
+                pose: n_bodyparts x 2 array with XY coordinates
+
+            Returns:
+                True if a swing started at this frame
+        """
+        self.frame += 1
+        first = self.frame == 0
+        previous_position = self.position.last
+        previous_velocity = self.velocity.last
+
+        # update position and CoM
+        position = self.position.next_slot()
+        position[:-1] = pose
+        np.take(position, self._paws_idx, axis=0, out=self._paws_xy)
+        np.mean(self._paws_xy, axis=0, out=position[-1])
+
+        # update velocity with backward difference + EMA
+        velocity = self.velocity.next_slot()
+        if first:
+            velocity[:] = 0
+            self._paws_speed[:] = 0
+        else:
+            np.subtract(position, previous_position, out=self._delta)
+            self._delta *= self.fps
+
+            # paws speed is not smoothed for swing detection, like in Paw
+            np.take(self._delta, self._paws_idx, axis=0, out=self._paws_xy)
+            np.hypot(
+                self._paws_xy[:, 0], self._paws_xy[:, 1], out=self._paws_speed
+            )
+
+            self._delta -= previous_velocity
+            self._delta *= self._alpha
+            np.add(previous_velocity, self._delta, out=velocity)
+
+        speed = self.speed.next_slot()
+        np.hypot(velocity[:, 0], velocity[:, 1], out=speed)
+
+        # update heading (angle of body axis, in degrees in range 0-360)
+        tail, neck = self._axis_idx
+        theta = math.degrees(
+            math.atan2(
+                position[neck, 1] - position[tail, 1],
+                position[neck, 0] - position[tail, 0],
+            )
+        )
+        theta = theta + 360 if theta < 0 else theta
+        self.heading.push(theta)
+
+        # egocentric pose: centered at CoM and rotated to face north
+        rot = math.radians(-theta + 90)
+        cos, sin = math.cos(rot), math.sin(rot)
+        self._R[0, 0], self._R[0, 1] = cos, sin
+        self._R[1, 0], self._R[1, 1] = -sin, cos
+        np.subtract(position, position[-1], out=self._centered)
+        np.dot(self._centered, self._R, out=self.egocentric.next_slot())
+
+        return self._detect_swing_onset(speed, first)
+
+    def _detect_swing_onset(self, speed: np.ndarray, first: bool) -> bool:
+        """
+            Online version of Paw.detect_swing: the paw speed relative to
+            the (smoothed) CoM speed is compared to a threshold
+        """
+        com_speed = speed[-1]
+        self._com_speed += self._com_alpha * (com_speed - self._com_speed)
+
+        self._paws_speed -= self._com_speed
+        self._paws_speed -= self.normalized_speed
+        self._paws_speed *= self._paw_alpha
+        self.normalized_speed += self._paws_speed
+
+        np.greater(self.normalized_speed, self.speed_th, out=self._swing)
+        np.greater(self._swing, self.is_swing, out=self.swing_onset)
+        self.is_swing[:] = self._swing
+
+        if first or com_speed < 20 or not self.swing_onset.any():
+            self.swing_onset[:] = False
+            return False
+
+        for idx in np.flatnonzero(self.swing_onset):
+            for callback in self._callbacks:
+                callback(self.paws[idx], self.frame)
+        return True
+
+    @staticmethod
+    def pose_from_tracking(animal: Animal, tracking, frame: int) -> np.ndarray:
+        """
+            Gets the pose at a frame from tracking data in the format
+            used by Locomotion
+        """
+        return np.array(
+            [
+                [tracking[f"{bp}_x"][frame], tracking[f"{bp}_y"][frame]]
+                for bp in animal.bodyparts_names
+            ]
+        )
@@ -0,0 +1,120 @@
+"""
+    Deterministic synthetic tracking data of a quadruped trotting
+    along a curved path, with the same columns layout as the tracking
+    data expected by Locomotion ({bodypart}_x, {bodypart}_y).
+"""
+
+import numpy as np
+import pandas as pd
+from copy import deepcopy
+
+from kino.animal import default_animal_data
+
+# position of each bodypart in the body frame (x: lateral, y: forward), in cm
+BODY_LAYOUT = dict(
+    snout=(0, 4.5),
+    neck=(0, 2.5),
+    body=(0, 0),
+    tail_base=(0, -3.5),
+    left_fl=(-1.2, 1.8),
+    right_fl=(1.2, 1.8),
+    left_hl=(-1.4, -1.8),
+    right_hl=(1.4, -1.8),
+)
+
+# stride phase offset of each paw (trot: diagonal pairs move together)
+PAWS_PHASE = dict(left_fl=0, right_hl=0, right_fl=0.5, left_hl=0.5)
+
+
+def synthetic_animal_data(n_bodyparts: int = None) -> dict:
+    """
+        Returns the default animal data, with extra bodyparts (connected
+        to the body) added to reach n_bodyparts
+    """
+    animal_data = deepcopy(default_animal_data)
+    n_extra = (n_bodyparts or 0) - len(animal_data["bodyparts"])
+    if n_extra > 0:
+        extra = tuple(f"extra_{n}" for n in range(n_extra))
+        animal_data["bodyparts"] = tuple(animal_data["bodyparts"]) + extra
+        animal_data["colors"].update({bp: "k" for bp in extra})
+        animal_data["skeleton"] = tuple(animal_data["skeleton"]) + tuple(
+            ("body", bp, "k") for bp in extra
+        )
+    return animal_data
+
+
+def _sawtooth(phase: np.ndarray, duty: float) -> np.ndarray:
+    """
+        Paw displacement along the body axis over a stride (in -0.5, 0.5):
+        moves backward during stance (phase < duty) and forward in swing
+    """
+    phase = np.mod(phase, 1)
+    stance = phase < duty
+    return np.where(
+        stance, 0.5 - phase / duty, -0.5 + (phase - duty) / (1 - duty),
+    )
+
+
+def synthetic_tracking(
+    n_frames: int = 1000,
+    fps: int = 60,
+    n_bodyparts: int = None,
+    duty: float = 0.6,
+    noise: float = 0.05,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+        Generates tracking data of a quadruped trotting along a curved path
+        with varying speed. Paws are stationary (in the world reference frame)
+        during stance.
+
+        Arguments:
+            n_frames: number of frames
+            fps: frame rate
+            n_bodyparts: total number of bodyparts, extra bodyparts are
+                placed at random positions around the body
+            duty: fraction of the stride in stance
+            noise: std of gaussian noise added to the coordinates (cm)
+            seed: seed of the random number generator
+
+        Returns:
+            DataFrame with {bodypart}_x, {bodypart}_y columns
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(n_frames) / fps
+
+    # speed (cm/s) and heading (radians) of the body over time
+    speed = 30 + 15 * np.sin(2 * np.pi * time / 7.0)
+    heading = np.pi / 2 + 0.8 * np.sin(2 * np.pi * time / 11.0)
+    x = np.cumsum(speed * np.cos(heading)) / fps
+    y = np.cumsum(speed * np.sin(heading)) / fps
+
+    # stride frequency increases with speed, stride length such that
+    # paws don't slip during stance
+    frequency = 2 + speed / 20
+    stride_phase = np.cumsum(frequency) / fps
+    stride_length = speed * duty / frequency
+
+    # unit vectors of the body frame
+    forward = np.vstack([np.cos(heading), np.sin(heading)])
+    lateral = np.vstack([np.sin(heading), -np.cos(heading)])
+
+    layout = dict(BODY_LAYOUT)
+    animal_data = synthetic_animal_data(n_bodyparts)
+    for bp in animal_data["bodyparts"]:
+        if bp not in layout:
+            layout[bp] = tuple(rng.uniform(-2, 2, size=2))
+
+    tracking = {}
+    for bp in animal_data["bodyparts"]:
+        lat, fwd = layout[bp]
+        if bp in PAWS_PHASE:
+            fwd = fwd + stride_length * _sawtooth(
+                stride_phase + PAWS_PHASE[bp], duty
+            )
+        xy = np.vstack([x, y]) + lat * lateral + fwd * forward
+        xy += rng.normal(0, noise, size=xy.shape)
+
+        tracking[f"{bp}_x"] = xy[0]
+        tracking[f"{bp}_y"] = xy[1]
+    return pd.DataFrame(tracking)
@@ -30,5 +30,5 @@ setup(
     url="",
     author="Federico Claudi",
     zip_safe=False,
-    entry_points={"console_scripts": []},
+    entry_points={"console_scripts": ["kino = kino.cli:main"]},
 )
@@ -0,0 +1,69 @@
+import json
+import shutil
+import pandas as pd
+from multiprocessing import get_context
+
+from kino import profiling
+from kino.animal import mouse
+from kino.cli import main
+from kino.batch import run_batch
+from kino.locomotion import Locomotion
+
+
+def test_batch(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    for session in ("session_1", "session_2"):
+        shutil.copy("scripts/example_tracking.h5", data / f"{session}.h5")
+    (data / "broken.h5").write_text("not a tracking file")
+
+    summary = run_batch(data, tmp_path / "out", fps=60, n_workers=2)
+    assert sorted(summary.session) == ["session_1", "session_2"]
+    assert (tmp_path / "out" / "summary.csv").exists()
+
+    with open(tmp_path / "out" / "failures.json") as fin:
+        assert list(json.load(fin).keys()) == ["broken"]
+
+    locomotion = Locomotion.load(
+        tmp_path / "out" / "session_1" / "allocentric"
+    )
+    assert len(locomotion) == summary.n_frames[0]
+
+    # resuming skips processed sessions
+    (tmp_path / "out" / "session_1" / "allocentric" / "metadata.json").unlink()
+    main(["batch", str(data / "session_*.h5"), "-o", str(tmp_path / "out")])
+    assert not (
+        tmp_path / "out" / "session_1" / "allocentric" / "metadata.json"
+    ).exists()
+
+
+def test_batch_profile_spawn(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    shutil.copy("scripts/example_tracking.h5", data / "session.h5")
+
+    profiling.current.reset()
+    run_batch(
+        data,
+        tmp_path / "out",
+        n_workers=1,
+        profile=True,
+        mp_context=get_context("spawn"),
+    )
+    assert not profiling.is_enabled()
+    assert profiling.current["locomotion"]["calls"] == 1
+    profiling.current.reset()
+
+
+def test_batch_profile_fork(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    shutil.copy("scripts/example_tracking.h5", data / "session.h5")
+
+    # stats collected before the batch are not sent back by forked workers
+    with profiling.profile() as prof:
+        Locomotion(mouse, pd.read_hdf(data / "session.h5"), fps=60)
+        run_batch(
+            data, tmp_path / "out", n_workers=1, mp_context=get_context("fork")
+        )
+    assert prof["locomotion"]["calls"] == 2
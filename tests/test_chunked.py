@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from kino.animal import mouse
+from kino.locomotion import Locomotion
+from kino.chunked import process_in_chunks
+
+
+tracking = pd.read_hdf("scripts/example_tracking.h5")
+tracking = pd.DataFrame(
+    {
+        col: np.array(tracking[col], dtype=float)
+        for col in tracking.index
+        if col[-2:] in ("_x", "_y")
+    }
+)
+
+
+def test_chunked_matches_in_memory(tmp_path):
+    tracking.to_hdf(tmp_path / "tracking.h5", key="tracking", format="table")
+
+    locomotion = Locomotion(mouse, tracking, fps=60)
+    chunked = process_in_chunks(
+        mouse,
+        tmp_path / "tracking.h5",
+        tmp_path / "out",
+        fps=60,
+        chunk_size=80,
+    )
+
+    for bp in ("body", "com", "left_fl"):
+        assert np.allclose(
+            chunked.bodyparts[bp].speed, locomotion.bodyparts[bp].speed
+        )
+        assert np.allclose(
+            chunked.bodyparts[bp].thetadot, locomotion.bodyparts[bp].thetadot
+        )
+    assert np.isclose(chunked.com.distance, locomotion.com.distance)
+
+    for name, paw in locomotion.paws.items():
+        assert np.allclose(
+            chunked.paws[name].normalized_speed, paw.normalized_speed
+        )
+        assert list(chunked.paws[name].swings_start) == paw.swings_start
+
+    egocentric = locomotion.to_egocentric()
+    chunked_egocentric = Locomotion.load(tmp_path / "out" / "egocentric")
+    assert np.allclose(
+        chunked_egocentric.bodyparts["left_hl"].x,
+        egocentric.bodyparts["left_hl"].x,
+    )
+
+
+def test_chunked_swings_with_gaps(tmp_path):
+    gappy = tracking.copy()
+    for bp, start, length in (
+        ("left_fl", 150, 3),
+        ("left_fl", 400, 40),
+        ("right_hl", 230, 20),
+    ):
+        gappy.loc[start : start + length - 1, [f"{bp}_x", f"{bp}_y"]] = np.nan
+    gappy.to_hdf(tmp_path / "tracking.h5", key="tracking", format="table")
+
+    locomotion = Locomotion(mouse, gappy, fps=60)
+    chunked = process_in_chunks(
+        mouse,
+        tmp_path / "tracking.h5",
+        tmp_path / "out",
+        fps=60,
+        chunk_size=80,
+    )
+    for name, paw in locomotion.paws.items():
+        assert list(chunked.paws[name].swings_start) == paw.swings_start
+        assert list(chunked.paws[name].swings_end) == paw.swings_end
@@ -0,0 +1,211 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.locomotion import Locomotion
+from kino.cleaning import (
+    mask_low_likelihood,
+    fill_gaps,
+    clean_tracking,
+    repair_pose,
+    repair_tracking,
+    nan_percentile,
+)
+from kino.pose import to_pose_tensor
+from kino.synthetic import synthetic_tracking
+
+
+def test_mask_low_likelihood():
+    pose = np.ones((5, 2, 2))
+    likelihood = np.array([[1, 1], [0.1, 1], [1, 0.5], [1, 1], [0, 0]])
+
+    masked = mask_low_likelihood(pose, likelihood, 0.9)
+    assert np.isnan(masked).sum() == 4 * 2
+    assert np.isnan(masked[1, 0]).all()
+    assert not np.isnan(masked[1, 1]).any()
+    assert not np.isnan(pose).any()
+
+
+def test_fill_gaps_linear():
+    x = np.arange(10, dtype=float)
+    x[[0, 2, 3, 6, 7, 8]] = np.nan
+
+    filled = fill_gaps(x, max_gap=2)
+    assert np.isnan(filled[0])  # edges are not filled
+    assert np.allclose(filled[2:4], [2, 3])
+    assert np.isnan(filled[6:9]).all()  # gap too long
+
+    filled = fill_gaps(x)
+    assert np.allclose(filled[1:], np.arange(1, 10))
+
+
+def test_fill_gaps_columns():
+    t = np.linspace(0, 1, 50)
+    X = np.stack([t ** 2, np.sin(t)], axis=1)
+    gappy = X.copy()
+    gappy[10:13, 0] = np.nan
+    gappy[30:32, 1] = np.nan
+
+    for method in ("linear", "spline"):
+        filled = fill_gaps(gappy, max_gap=5, method=method)
+        assert not np.isnan(filled).any()
+        assert np.allclose(filled, X, atol=5e-3)
+
+    with pytest.raises(ValueError):
+        fill_gaps(gappy, method="cubic")
+
+
+def test_locomotion_likelihood():
+    tracking = synthetic_tracking(300, fps=60)
+    rng = np.random.default_rng(0)
+    for bp in mouse.bodyparts_names:
+        likelihood = np.ones(len(tracking))
+        likelihood[rng.integers(0, len(tracking), 10)] = 0.1
+        tracking[f"{bp}_likelihood"] = likelihood
+        tracking.loc[likelihood < 0.5, f"{bp}_x"] = 1e3
+
+    cleaned = clean_tracking(mouse, tracking, likelihood_threshold=0.5)
+    pose, _ = to_pose_tensor(mouse, cleaned)
+    assert np.nanmax(pose) < 1e3
+
+    locomotion = Locomotion(
+        mouse, tracking, fps=60, likelihood_threshold=0.5, max_gap=3
+    )
+    reference = Locomotion(mouse, synthetic_tracking(300, fps=60), fps=60)
+    assert np.nanmax(locomotion.com.speed) < 2 * np.nanmax(reference.com.speed)
+
+    with pytest.raises(ValueError):
+        clean_tracking(mouse, synthetic_tracking(10), likelihood_threshold=0.5)
+
+
+def test_repair_pose():
+    pose, _ = to_pose_tensor(mouse, synthetic_tracking(2000, fps=60))
+    names = list(mouse.bodyparts_names)
+    left, right, snout = (
+        names.index("left_fl"),
+        names.index("right_fl"),
+        names.index("snout"),
+    )
+
+    corrupted = pose.copy()
+    corrupted[300:400, [left, right]] = corrupted[300:400, [right, left]]
+    corrupted[500, snout] += 200
+    corrupted[800:803, left] += 150
+
+    repaired, report = repair_pose(mouse, corrupted)
+    assert np.abs(repaired - pose).max() < 1
+    assert report.swaps[300:400, [left, right]].all()
+    assert report.swaps.sum() == 200
+    assert report.jumps[500, snout]
+    assert report.bone_violations[800:803, left].all()
+    assert report.summary()["snout"]["filled"] == 1
+
+    # nothing is changed in clean data
+    _, report = repair_pose(mouse, pose)
+    assert not report.filled.any() and not report.swaps.any()
+
+
+def test_repair_pose_odd_swaps():
+    pose, _ = to_pose_tensor(mouse, synthetic_tracking(1000, fps=60))
+    names = list(mouse.bodyparts_names)
+    left, right = names.index("left_hl"), names.index("right_hl")
+
+    # three swap events: the labels stay swapped until the end
+    corrupted = pose.copy()
+    for start, end in ((300, 400), (600, 1000)):
+        corrupted[start:end, [left, right]] = corrupted[
+            start:end, [right, left]
+        ]
+
+    repaired, report = repair_pose(mouse, corrupted)
+    assert np.abs(repaired - pose).max() < 1
+    assert report.swaps.sum() == 2 * (100 + 400)
+    assert report.swaps[600:, left].all() and not report.swaps[400:600].any()
+
+
+def test_repair_pose_swaps_across_gaps():
+    pose, _ = to_pose_tensor(mouse, synthetic_tracking(1000, fps=60))
+    names = list(mouse.bodyparts_names)
+    left, right = names.index("left_fl"), names.index("right_fl")
+
+    # the swap starts and ends while the paws are not tracked
+    corrupted = pose.copy()
+    corrupted[300:600, [left, right]] = corrupted[300:600, [right, left]]
+    corrupted[298:302, [left, right]] = np.nan
+    corrupted[450:455, left] = np.nan
+    corrupted[598:600, [left, right]] = np.nan
+
+    repaired, report = repair_pose(mouse, corrupted, max_gap=0)
+    assert report.swaps[302:598, left].all()
+    assert not report.swaps[600:, [left, right]].any()
+    assert np.nanmax(np.abs(repaired - pose)) < 1
+
+
+def test_fill_gaps_spline_columns():
+    from scipy.interpolate import CubicSpline
+
+    rng = np.random.default_rng(0)
+    values = np.cumsum(rng.normal(size=(200, 3, 2)), axis=0)
+    values[50:53, 0] = np.nan
+    values[120:125, 1, 0] = np.nan
+    values[10:12, 2, 1] = np.nan
+    filled = fill_gaps(values, method="spline")
+
+    frames = np.arange(200)
+    for column in np.ndindex(3, 2):
+        column = (slice(None),) + column
+        valid = ~np.isnan(values[column])
+        expected = CubicSpline(frames[valid], values[column][valid])(frames)
+        assert np.allclose(filled[column], expected)
+
+
+@pytest.mark.filterwarnings("ignore:All-NaN slice")
+def test_nan_percentile():
+    values = np.random.default_rng(0).normal(size=(1001, 3, 2))
+    values[::7, 1] = np.nan
+    values[:, 2, 1] = np.nan
+    for q in (0, 50, 95, 100):
+        assert np.allclose(
+            nan_percentile(values, q),
+            np.nanpercentile(values, q, axis=0),
+            equal_nan=True,
+        )
+
+
+def test_repair_tracking_long_gaps():
+    tracking = synthetic_tracking(500, fps=60)
+    tracking.loc[100:119, "right_hl_x"] += 300
+
+    repaired, report = repair_tracking(mouse, tracking, max_gap=10)
+    paw = list(mouse.bodyparts_names).index("right_hl")
+    assert report.bone_violations[100:120, paw].all()
+    assert np.isnan(repaired["right_hl_x"][100:120]).all()
+
+
+def test_locomotion_gaps_swings():
+    tracking = synthetic_tracking(3000, fps=60)
+    reference = Locomotion(mouse, tracking, fps=60)
+
+    # mask a few isolated frames of each bodypart, without filling them
+    rng = np.random.default_rng(0)
+    for bp in mouse.bodyparts_names:
+        likelihood = np.ones(len(tracking))
+        likelihood[rng.integers(0, len(tracking), 30)] = 0.1
+        tracking[f"{bp}_likelihood"] = likelihood
+    locomotion = Locomotion(
+        mouse, tracking, fps=60, likelihood_threshold=0.5, max_gap=0
+    )
+
+    assert not np.isnan(locomotion.com.speed).any()
+    for name, paw in locomotion.paws.items():
+        n_swings = len(reference.paws[name].swings_start)
+        assert abs(len(paw.swings_start) - n_swings) <= 0.05 * n_swings
+
+    # swings overlapping long gaps are discarded
+    paw = locomotion.paws["left_fl"]
+    n_swings = len(paw.swings_start)
+    start, end = paw.swings_start[10], paw.swings_end[10]
+    paw.normalized_speed[start - 2 : end + 2] = np.nan
+    paw.detect_swing()
+    assert start not in paw.swings_start
+    assert len(paw.swings_start) == n_swings - 1
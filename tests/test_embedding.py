@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.embedding import PoseEmbedding, fit_sessions
+from kino.locomotion import Locomotion
+from kino.synthetic import synthetic_tracking
+
+
+@pytest.fixture(scope="module")
+def sessions():
+    return [
+        Locomotion(
+            mouse, synthetic_tracking(300, fps=60, seed=seed), fps=60
+        ).to_egocentric()
+        for seed in range(2)
+    ]
+
+
+def pca(vectors, n_components):
+    vectors = vectors[~np.isnan(vectors).any(axis=1)]
+    _, _, components = np.linalg.svd(vectors - vectors.mean(axis=0))
+    return components[:n_components]
+
+
+def test_streaming_pca(sessions):
+    embedding = PoseEmbedding(n_components=3, chunk_size=64)
+    for egocentric in sessions:
+        embedding.fit_session(egocentric)
+
+    vectors = np.concatenate(
+        [
+            egocentric.pose.reshape(len(egocentric.pose), -1)
+            for egocentric in sessions
+        ]
+    )
+    expected = pca(vectors, 3)
+    assert embedding.n_samples == (~np.isnan(vectors).any(axis=1)).sum()
+    overlap = np.abs(embedding.components @ expected.T)
+    assert np.allclose(overlap, np.eye(3), atol=1e-6)
+    assert np.all(np.diff(embedding.explained_variance_ratio) <= 0)
+
+    # merging embeddings fitted separately gives the same result
+    merged = PoseEmbedding(n_components=3).fit_session(sessions[0])
+    merged.merge(PoseEmbedding(n_components=3).fit_session(sessions[1]))
+    assert np.allclose(merged.components, embedding.components)
+
+    embedded = embedding.transform_session(sessions[0])
+    assert embedded.shape == (len(sessions[0].pose), 3)
+    assert np.allclose(
+        embedded, embedding.transform(sessions[0].pose), equal_nan=True
+    )
+
+    # fitted with pose vectors only: bodyparts are taken from the session
+    fitted = PoseEmbedding(n_components=3).partial_fit(vectors)
+    assert fitted.bodyparts is None
+    assert np.allclose(
+        fitted.transform_session(sessions[0]), embedded, equal_nan=True
+    )
+    assert fitted.bodyparts == list(mouse.bodyparts_names)
+
+
+def test_embedding_save_and_parallel_fit(sessions, tmp_path):
+    paths = []
+    for n, egocentric in enumerate(sessions):
+        egocentric.save(tmp_path / f"session_{n}")
+        paths.append(tmp_path / f"session_{n}")
+
+    embedding = fit_sessions(
+        paths, n_components=3, chunk_size=100, n_workers=2
+    )
+    expected = PoseEmbedding(n_components=3)
+    for egocentric in sessions:
+        expected.fit_session(egocentric)
+    assert np.allclose(embedding.components, expected.components)
+
+    embedding.save(tmp_path / "embedding")
+    loaded = PoseEmbedding.load(tmp_path / "embedding")
+    assert loaded.n_samples == embedding.n_samples
+    assert np.allclose(loaded.components, embedding.components)
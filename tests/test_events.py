@@ -0,0 +1,54 @@
+import numpy as np
+
+from kino.animal import mouse
+from kino.events import event_windows, extract_windows, locomotion_features
+from kino.locomotion import Locomotion
+from kino.synthetic import synthetic_tracking
+
+
+def test_event_windows():
+    data = np.arange(20, dtype=float).reshape(10, 2)
+
+    windows = event_windows(data, [0, 5, 9], before=2, after=1)
+    assert windows.shape == (3, 4, 2)
+    assert np.array_equal(windows[1, :, 0], [6, 8, 10, 12])
+
+    # windows at the edges are padded
+    assert np.isnan(windows[0, :2]).all()
+    assert np.array_equal(windows[0, 2:, 1], [1, 3])
+    assert np.isnan(windows[2, -1]).all()
+    assert np.array_equal(windows[2, :3, 0], [14, 16, 18])
+
+    assert event_windows(np.arange(5), [2], 1, 1, fill=0).dtype.kind == "i"
+
+
+def test_extract_windows():
+    locomotion = Locomotion(mouse, synthetic_tracking(600, fps=60), fps=60)
+    onsets = locomotion.paws["left_fl"].swings_start
+
+    aligned = extract_windows(
+        locomotion,
+        onsets,
+        before=10,
+        quantities=("speed", "velocity"),
+        joints=True,
+    )
+    n_features = len(locomotion.bodyparts) * 3 + 16
+    assert aligned.windows.shape == (len(onsets), 21, n_features)
+    assert aligned.mean().shape == (21, n_features)
+    assert np.array_equal(aligned.time, np.arange(-10, 11))
+
+    data, features = locomotion_features(
+        locomotion, quantities=("speed", "velocity"), joints=True
+    )
+    assert features == aligned.features
+    assert np.array_equal(
+        aligned.windows, event_windows(data, onsets, 10, 10), equal_nan=True
+    )
+
+    speed = aligned["left_fl.speed"]
+    event = len(onsets) // 2
+    assert np.allclose(
+        speed[event],
+        locomotion.left_fl.speed[onsets[event] - 10 : onsets[event] + 11],
+    )
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.features import FeatureBuilder, build_sessions, rolling_statistics
+from kino.io import ColumnStore
+from kino.locomotion import Locomotion
+from kino.synthetic import synthetic_tracking
+
+
+def naive(data, window, fps):
+    half = window // 2
+    output = np.full(data.shape + (5,), np.nan)
+    for t in range(len(data)):
+        segment = data[max(0, t - half) : t + half + 1]
+        frames = np.arange(max(0, t - half), t + half + 1)[: len(segment)]
+        for f in range(data.shape[1]):
+            valid = ~np.isnan(segment[:, f])
+            if not valid.any():
+                continue
+            values = segment[valid, f]
+            output[t, f, :4] = [
+                values.mean(),
+                values.std(),
+                values.min(),
+                values.max(),
+            ]
+            if valid.sum() > 1:
+                output[t, f, 4] = np.polyfit(frames[valid], values, 1)[0] * fps
+    return output
+
+
+def test_rolling_statistics():
+    rng = np.random.default_rng(0)
+    data = np.cumsum(rng.normal(size=(200, 3)), axis=0) + 1000
+    data[rng.random(data.shape) < 0.2] = np.nan
+    data[50:70, 0] = np.nan
+
+    statistics = rolling_statistics(data, 9, fps=30)
+    assert statistics.shape == (200, 3, 5)
+    assert np.allclose(
+        statistics, naive(data, 9, 30), atol=1e-6, equal_nan=True
+    )
+
+    with pytest.raises(ValueError):
+        rolling_statistics(data, 9, statistics=("median",))
+
+
+def test_feature_builder(monkeypatch):
+    locomotion = Locomotion(mouse, synthetic_tracking(300, fps=60), fps=60)
+    egocentric = locomotion.to_egocentric()
+
+    builder = FeatureBuilder(windows=(5, 21))
+    features, names = builder.build(locomotion, egocentric)
+    assert features.dtype == np.float32
+    assert features.shape == (300, len(names))
+    assert "com.speed.mean_5" in names
+    assert f"egocentric.{mouse.paws[0]}.x.max_21" in names
+
+    column = names.index("com.speed.mean_21")
+    expected = rolling_statistics(locomotion.com.speed, 21)[:, 0, 0]
+    assert np.allclose(features[:, column], expected, equal_nan=True)
+
+    chunked = FeatureBuilder(windows=(5, 21), chunk_size=37)
+    chunked_features, _ = chunked.build(locomotion, egocentric)
+    assert np.allclose(chunked_features, features, atol=1e-5, equal_nan=True)
+
+    # precomputed per-frame features are not computed again
+    data, base_names = builder.base_features(locomotion, egocentric)
+    monkeypatch.setattr(builder, "base_features", None)
+    precomputed, _ = builder.build(
+        locomotion, egocentric, data=data, base_names=base_names
+    )
+    assert np.array_equal(precomputed, features, equal_nan=True)
+
+
+def test_build_sessions(tmp_path):
+    sessions = []
+    for seed in range(2):
+        locomotion = Locomotion(
+            mouse, synthetic_tracking(200, fps=60, seed=seed), fps=60
+        )
+        session = tmp_path / "sessions" / f"session_{seed}"
+        locomotion.save(session / "allocentric")
+        locomotion.to_egocentric().save(session / "egocentric")
+        sessions.append(session)
+
+    builder = FeatureBuilder(windows=(11,))
+    folders = build_sessions(
+        sessions, tmp_path / "features", builder, n_workers=2
+    )
+
+    locomotion = Locomotion.load(sessions[1] / "allocentric")
+    expected, names = builder.build(
+        Locomotion(mouse, synthetic_tracking(200, fps=60, seed=1), fps=60)
+    )
+    store = ColumnStore(folders[1])
+    assert store.attributes["features"] == names
+    assert np.allclose(store.read("features"), expected, equal_nan=True)
+    assert len(locomotion.com.speed) == 200
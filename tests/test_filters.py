@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.filters import kalman_smooth, savgol_smooth, savgol_coefficients
+from kino.geometry import Trajectory
+from kino.locomotion import Locomotion
+from kino.synthetic import synthetic_tracking
+
+
+def test_kalman_smooth():
+    fps = 60
+    t = np.arange(600) / fps
+    x = 10 * t + 5 * t ** 2
+    rng = np.random.default_rng(0)
+    noisy = np.column_stack([x, -x]) + rng.normal(0, 0.5, (len(t), 2))
+    noisy[100:110] = np.nan
+
+    position, velocity, acceleration = kalman_smooth(
+        noisy, fps=fps, process_noise=1e2, measurement_noise=0.25
+    )
+    assert position.shape == noisy.shape
+    assert not np.isnan(position).any()
+
+    inner = slice(20, -20)
+    assert np.abs(position[inner, 0] - x[inner]).max() < 0.5
+    assert np.allclose(velocity[inner, 0], 10 + 10 * t[inner], atol=1)
+    assert np.allclose(velocity[:, 0], -velocity[:, 1], atol=3)
+    assert np.abs(np.median(acceleration[:, 0]) - 10) < 1
+
+
+def test_kalman_missing_columns():
+    values = np.ones((50, 3))
+    values[:, 1] = np.nan
+    values[::2, 2] = np.nan
+
+    position, _, _ = kalman_smooth(values)
+    assert np.isnan(position[:, 1]).all()
+    assert np.allclose(position[:, [0, 2]], 1)
+
+
+def test_trajectory_kalman():
+    tracking = synthetic_tracking(300, fps=60)
+    window = Trajectory(tracking["body_x"], tracking["body_y"], fps=60)
+    kalman = Trajectory(
+        tracking["body_x"],
+        tracking["body_y"],
+        fps=60,
+        smoothing_method="kalman",
+    )
+    assert np.allclose(kalman.speed, window.speed, rtol=0.2)
+
+    with pytest.raises(ValueError):
+        Trajectory(
+            tracking["body_x"], tracking["body_y"], smoothing_method="x"
+        )
+
+    # batched smoothing of all bodyparts gives the same results
+    locomotion = Locomotion(mouse, tracking, fps=60, smoothing_method="kalman")
+    assert np.allclose(locomotion.body.speed, kalman.speed)
+    assert np.allclose(locomotion.body.x, kalman.x)
+
+
+def test_savgol_smooth():
+    fps = 30
+    t = np.arange(100) / fps
+    x = 2 * t ** 3 - t
+    values = np.column_stack([x, 2 * x])
+
+    # a cubic polynomial is fitted exactly, including at the edges
+    position, velocity, acceleration = savgol_smooth(
+        values, window=9, order=3, fps=fps
+    )
+    assert np.allclose(position, values)
+    assert np.allclose(velocity[:, 0], 6 * t ** 2 - 1)
+    assert np.allclose(acceleration[:, 1], 24 * t)
+
+    assert savgol_coefficients(9, 3) is savgol_coefficients(9, 3)
+    with pytest.raises(ValueError):
+        savgol_coefficients(8, 3)
+
+    # missing samples: the polynomial is fitted to the valid samples only
+    gappy = values.copy()
+    gappy[[0, 3, 40, 41, 42, 97], 0] = np.nan
+    gappy[60, 1] = np.nan
+    position, velocity, acceleration = savgol_smooth(
+        gappy, window=9, order=3, fps=fps
+    )
+    missing = np.isnan(gappy)
+    assert np.array_equal(np.isnan(position), missing)
+    assert np.allclose(position[~missing], values[~missing])
+    assert np.allclose(
+        velocity[~missing[:, 0], 0], (6 * t ** 2 - 1)[~missing[:, 0]]
+    )
+    assert np.allclose(
+        acceleration[~missing[:, 1], 1], (24 * t)[~missing[:, 1]]
+    )
+
+
+def test_trajectory_savgol():
+    tracking = synthetic_tracking(300, fps=60)
+    window = Trajectory(tracking["body_x"], tracking["body_y"], fps=60)
+    savgol = Trajectory(
+        tracking["body_x"],
+        tracking["body_y"],
+        fps=60,
+        smoothing_method="savgol",
+    )
+    assert np.allclose(savgol.speed[10:-10], window.speed[10:-10], rtol=0.2)
+
+    locomotion = Locomotion(mouse, tracking, fps=60, smoothing_method="savgol")
+    assert np.allclose(locomotion.body.speed, savgol.speed)
+
+    # frames masked by likelihood and not filled
+    likelihood = np.ones(len(tracking))
+    likelihood[np.random.default_rng(0).integers(0, len(tracking), 10)] = 0
+    for bp in mouse.bodyparts_names:
+        tracking[f"{bp}_likelihood"] = likelihood
+    locomotion = Locomotion(
+        mouse,
+        tracking,
+        fps=60,
+        likelihood_threshold=0.5,
+        max_gap=0,
+        smoothing_method="savgol",
+    )
+    missing = likelihood < 0.5
+    assert np.array_equal(np.isnan(locomotion.body.speed), missing)
+    assert np.allclose(
+        locomotion.body.speed[~missing], savgol.speed[~missing], rtol=0.05
+    )
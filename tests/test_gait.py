@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.gait import (
+    dominant_frequency,
+    paw_spectrogram,
+    spectrogram,
+    spectrogram_chunks,
+)
+from kino.locomotion import Locomotion
+from kino.synthetic import synthetic_tracking
+
+
+@pytest.fixture
+def signals():
+    fps = 200
+    t = np.arange(2000) / fps
+    frequency = np.where(t < 5, 4.0, 6.5)
+    phase = 2 * np.pi * np.cumsum(frequency) / fps
+    return (
+        fps,
+        np.stack(
+            [np.sin(phase), np.sin(phase - np.pi / 2), np.sin(phase + np.pi)]
+        ),
+    )
+
+
+def test_stride_frequency_and_phase(signals):
+    fps, data = signals
+    spectra = spectrogram(
+        data, fps, names=["a", "b", "c"], window=256, step=32
+    )
+    assert spectra.spectra.shape == (3, (2000 - 256) // 32 + 1, 129)
+
+    frequency = spectra.stride_frequency()
+    early, late = spectra.time < 4, spectra.time > 6
+    assert np.allclose(frequency[:, early], 4, atol=0.15)
+    assert np.allclose(frequency[:, late], 6.5, atol=0.15)
+
+    assert np.allclose(spectra.phase_lag("a", "b")[early], 90, atol=5)
+    lags = spectra.phase_lags([("a", "c"), ("b", "a")])
+    assert np.allclose(np.abs(lags[0][early]), 180, atol=5)
+    assert np.allclose(lags[1][early], -90, atol=5)
+    assert spectra.coherence("a", "b").shape == (129,)
+
+
+@pytest.mark.filterwarnings("error")
+def test_missing_windows(signals):
+    fps, data = signals
+    data = data.copy()
+    data[:, 300:700] = np.nan
+    spectra = spectrogram(data, fps, window=256, step=32)
+    empty = (spectra.time > 300 / fps + 0.65) & (
+        spectra.time < 700 / fps - 0.65
+    )
+    assert empty.any()
+    frequency = spectra.stride_frequency()
+    assert np.isnan(frequency[:, empty]).all()
+    assert not np.isnan(frequency[:, spectra.time > 6]).any()
+
+    # single spectrum
+    power = np.abs(spectra.spectra[0, -1]) ** 2
+    assert np.isclose(
+        dominant_frequency(power, spectra.frequencies), frequency[0, -1],
+    )
+    assert np.isnan(dominant_frequency(np.zeros(129), spectra.frequencies))
+
+
+def test_spectrogram_chunks(signals):
+    fps, data = signals
+    expected = spectrogram(data, fps, window=128, step=20)
+    chunks = list(
+        spectrogram_chunks(
+            np.array_split(data, 7, axis=1), fps, window=128, step=20
+        )
+    )
+    assert np.allclose(
+        np.concatenate([c.spectra for c in chunks], axis=1), expected.spectra
+    )
+    assert np.allclose(np.concatenate([c.time for c in chunks]), expected.time)
+
+
+def test_paw_spectrogram():
+    locomotion = Locomotion(mouse, synthetic_tracking(1200, fps=60), fps=60)
+    spectra = paw_spectrogram(locomotion, window=128, step=16)
+    assert spectra.names == list(mouse.paws)
+    assert spectra["left_fl"].shape == (len(spectra.time), 65)
+    assert spectra.phase_lags().shape == (6, len(spectra.time))
+
+    # synthetic gait is a trot: diagonal paws in phase, the others alternate
+    diagonal = spectra.phase_lag("left_fl", "right_hl")
+    assert np.abs(np.nanmedian(diagonal)) < 10
+    lateral = spectra.phase_lag("left_fl", "left_hl")
+    assert np.abs(np.nanmedian(np.abs(lateral))) > 170
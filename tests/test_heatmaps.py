@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.heatmaps import SpatialMap, egocentric_paws_maps
+from kino.locomotion import Locomotion
+from kino.synthetic import synthetic_tracking
+
+
+def test_spatial_map():
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(-1, 11, (2, 1000))
+    speed = x + 100 * (y > 5)
+    heading = np.where(x > 5, 10, 190)
+
+    spatial = SpatialMap((0, 10), (0, 5), bin_size=1, fps=10)
+    spatial.add(x, y, heading=heading, speed=speed)
+    assert spatial.occupancy.shape == (5, 10)
+
+    expected, _, _ = np.histogram2d(
+        y, x, bins=[spatial.yedges, spatial.xedges]
+    )
+    assert np.array_equal(spatial.occupancy * 10, expected)
+    assert spatial.n_outside == 1000 - expected.sum()
+
+    mean = spatial.mean("speed")
+    assert np.allclose(mean, np.arange(10) + 0.5, atol=0.5)
+
+    distribution = spatial.heading_distribution
+    assert np.allclose(distribution[:, 6:, 0], 1)
+    assert np.allclose(distribution[:, :5, 6], 1)
+
+
+def test_spatial_map_merge():
+    rng = np.random.default_rng(1)
+    x, y, speed = rng.uniform(0, 10, (3, 500))
+
+    full = SpatialMap((0, 10), (0, 10)).add(x, y, speed=speed)
+    first = SpatialMap((0, 10), (0, 10)).add(
+        x[:200], y[:200], speed=speed[:200]
+    )
+    second = SpatialMap((0, 10), (0, 10)).add(
+        x[200:], y[200:], speed=speed[200:]
+    )
+
+    merged = first + second
+    assert np.array_equal(merged.occupancy, full.occupancy)
+    assert np.allclose(
+        merged.mean("speed"), full.mean("speed"), equal_nan=True
+    )
+
+    first += second
+    assert np.array_equal(first.occupancy, full.occupancy)
+
+    with pytest.raises(ValueError):
+        full.merge(SpatialMap((0, 5), (0, 10)))
+    with pytest.raises(ValueError):
+        full + SpatialMap((0, 10), (0, 10), fps=60)
+
+
+def test_locomotion_maps():
+    locomotion = Locomotion(mouse, synthetic_tracking(300, fps=60), fps=60)
+    com = locomotion.com
+
+    spatial = SpatialMap(
+        (np.nanmin(com.x), np.nanmax(com.x) + 1),
+        (np.nanmin(com.y), np.nanmax(com.y) + 1),
+        bin_size=2,
+        fps=60,
+    ).add_locomotion(locomotion)
+    assert spatial.occupancy.sum() == pytest.approx(300 / 60)
+    assert np.nanmax(spatial.mean("speed")) <= np.nanmax(com.speed)
+
+    maps = egocentric_paws_maps(locomotion.to_egocentric())
+    assert set(maps) == set(mouse.paws)
+    assert maps["left_fl"].counts.sum() + maps["left_fl"].n_outside == 300
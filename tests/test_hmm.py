@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.hmm import (
+    GaussianHMM,
+    locomotion_states_features,
+    segment,
+    state_intervals,
+)
+from kino.locomotion import Locomotion
+from kino.synthetic import synthetic_tracking
+
+
+def sample(rng, n_frames):
+    means = np.array([[0.0, 0.0], [2.0, 4.0], [4.0, 0.0]])
+    states = np.repeat(rng.integers(0, 3, n_frames // 50 + 1), 50)[:n_frames]
+    return states, means[states] + rng.normal(size=(n_frames, 2)) * 0.5
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    rng = np.random.default_rng(0)
+    sessions = [sample(rng, n) for n in (400, 700, 250)]
+    model = GaussianHMM(n_states=3, n_iter=30).fit([x for _, x in sessions])
+    return model, sessions
+
+
+def test_hmm_fit_and_decode(fitted):
+    model, sessions = fitted
+    assert np.all(np.diff(model.log_likelihoods) > -1e-6)
+
+    # states are sorted by the mean of the first feature
+    means = model.means * model.scale + model.offset
+    assert np.allclose(means, [[0, 0], [2, 4], [4, 0]], atol=0.2)
+
+    decoded = model.decode([x for _, x in sessions])
+    for (states, _), predicted in zip(sessions, decoded):
+        assert np.mean(predicted == states) > 0.98
+
+    posterior = model.predict_proba(sessions[0][1])
+    assert np.allclose(posterior.sum(axis=1), 1)
+    assert np.mean(posterior.argmax(axis=1) == decoded[0]) > 0.98
+
+
+def test_hmm_streaming_and_save(fitted, tmp_path):
+    model, sessions = fitted
+    x = sessions[1][1].copy()
+    x[100:110, 1] = np.nan  # missing features are marginalized
+
+    streamed = np.concatenate(list(model.decode_stream(np.array_split(x, 9))))
+    assert np.array_equal(streamed, model.predict(x))
+
+    model.save(tmp_path / "hmm")
+    loaded = GaussianHMM.load(tmp_path / "hmm")
+    assert np.array_equal(loaded.predict(x), model.predict(x))
+
+
+def test_locomotion_segmentation():
+    locomotion = Locomotion(mouse, synthetic_tracking(600, fps=60), fps=60)
+    features = locomotion_states_features(locomotion)
+    assert features.shape == (600, 3)
+
+    model = GaussianHMM(n_states=2, n_iter=10).fit([features])
+    states, intervals = segment(locomotion, model)
+    assert set(intervals) == {0, 1}
+    assert sum(i.duration.sum() for i in intervals.values()) == pytest.approx(
+        600 / 60
+    )
+    assert np.array_equal(intervals[1].to_mask(600), states == 1)
+    assert len(state_intervals(np.array([0, 0, 1, 1, 0]))[0]) == 2
@@ -0,0 +1,30 @@
+import sys
+import subprocess
+
+
+def run(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+def test_import_is_lazy():
+    loaded = run(
+        "import sys, kino.locomotion; "
+        "print(','.join(m for m in ('matplotlib', 'scipy', 'pandas', 'pyinspect') if m in sys.modules))"
+    )
+    assert loaded == ""
+
+
+def test_import_has_no_side_effects():
+    assert (
+        run("import sys, kino; print(sys.excepthook is sys.__excepthook__)")
+        == "True"
+    )
+
+
+def test_lazy_submodules():
+    assert run("import kino; print(kino.geometry.Vector(1, 2).y)") == "2"
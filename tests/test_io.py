@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from kino.animal import mouse
+from kino.geometry import Trajectory
+from kino.locomotion import Locomotion, EgocentricLocomotion
+from kino.synthetic import synthetic_tracking
+
+
+tracking = pd.read_hdf("scripts/example_tracking.h5")
+locomotion = Locomotion(mouse, tracking, fps=60)
+
+
+def test_trajectory_save_load(tmp_path):
+    x = np.linspace(0, 3 * np.pi, 200)
+    traj = Trajectory(x, np.cos(x), fps=60, name="test")
+    traj.save(tmp_path / "traj")
+
+    loaded = Trajectory.load(tmp_path / "traj")
+    assert loaded.name == "test"
+    assert loaded.fps == 60
+    assert "speed" not in loaded.__dict__  # lazy loading
+
+    assert np.allclose(loaded.speed, traj.speed)
+    assert np.allclose(loaded.velocity.x, traj.velocity.x)
+    assert np.allclose(loaded.xy.y, traj.xy.y)
+    assert len(loaded @ np.arange(10)) == 10
+
+
+def test_locomotion_save_load(tmp_path):
+    locomotion.save(tmp_path / "locomotion")
+    loaded = Locomotion.load(tmp_path / "locomotion")
+
+    assert loaded.animal.name == mouse.name
+    assert loaded.fps == 60
+    assert np.allclose(loaded.com.speed, locomotion.com.speed)
+    assert np.allclose(
+        loaded.body_axis.vector.x, locomotion.body_axis.vector.x
+    )
+    assert list(loaded.paws["left_fl"].swings_start) == list(
+        locomotion.paws["left_fl"].swings_start
+    )
+
+
+def test_egocentric_save_load(tmp_path):
+    egocentric = locomotion.to_egocentric()
+    egocentric.save(tmp_path / "egocentric")
+
+    loaded = Locomotion.load(tmp_path / "egocentric")
+    assert isinstance(loaded, EgocentricLocomotion)
+    assert np.allclose(
+        loaded.rotation_matrices[10], egocentric.rotation_matrices[10]
+    )
+    assert np.allclose(
+        loaded.bodyparts["left_fl"].y, egocentric.bodyparts["left_fl"].y
+    )
+
+
+def test_locomotion_save_load_smoothing(tmp_path):
+    smoothed = Locomotion(
+        mouse,
+        synthetic_tracking(300, fps=60),
+        fps=60,
+        smoothing_method="savgol",
+    )
+    smoothed.save(tmp_path / "savgol")
+    loaded = Locomotion.load(tmp_path / "savgol")
+    assert loaded.smoothing_method == "savgol"
+    assert np.array_equal(
+        loaded.tracking["body_x"], np.asarray(smoothed.tracking["body_x"])
+    )
+
+    # kinematics derived from the loaded data are the same
+    assert np.allclose(
+        loaded.to_egocentric().bodyparts["left_fl"].speed,
+        smoothed.to_egocentric().bodyparts["left_fl"].speed,
+        equal_nan=True,
+    )
+    assert np.allclose(
+        loaded.resample(30).com.speed,
+        smoothed.resample(30).com.speed,
+        equal_nan=True,
+    )
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from kino.animal import Animal, mouse, default_animal_data
+from kino.joints import JointGraph
+from kino.locomotion import Locomotion
+from kino.synthetic import synthetic_tracking
+
+
+def test_joint_graph():
+    graph = JointGraph(mouse)
+
+    # 6 bones at the body and snout -> neck -> body
+    assert len(graph.joints) == 15 + 1
+    assert "snout_neck_body" in graph.joints
+    assert len(graph.bones) == mouse.n_bones
+
+
+def test_joint_angles():
+    animal = Animal(
+        dict(
+            default_animal_data,
+            bodyparts=("a", "b", "c"),
+            colors=dict(a="k", b="k", c="k"),
+            skeleton=(("a", "b", "k"), ("b", "c", "k")),
+            body_axis=("a", "b"),
+            head=("b", "c"),
+            paws=(),
+        )
+    )
+    graph = JointGraph(animal)
+    assert graph.joints == ["a_b_c"]
+
+    # c rotates around b at 90 degrees/s
+    fps = 10
+    t = np.arange(100) / fps
+    angle = np.radians(90 * t)
+    pose = np.zeros((100, 3, 2))
+    pose[:, 0] = [1, 0]
+    pose[:, 2] = np.column_stack([2 * np.cos(angle), 2 * np.sin(angle)])
+
+    joints = graph.compute(pose, fps=fps)
+    assert np.allclose(np.abs(joints["a_b_c"][:20]), 90 * t[:20])
+    assert np.allclose(joints.angular_velocity, 90)
+    assert np.allclose(joints["a_b"], 1)
+    assert np.allclose(joints["b_c"], 2)
+
+    with pytest.raises(KeyError):
+        joints["x"]
+
+
+def test_locomotion_joints(tmp_path):
+    locomotion = Locomotion(mouse, synthetic_tracking(200, fps=60), fps=60)
+    assert locomotion.joints.angle.shape == (200, 16)
+    assert locomotion.joints.bone_length.shape == (200, mouse.n_bones)
+    assert (locomotion @ np.arange(10)).joints.angle.shape == (10, 16)
+
+    locomotion.save(tmp_path / "locomotion")
+    loaded = Locomotion.load(tmp_path / "locomotion")
+    assert list(loaded.joints.joints) == locomotion.joints.joints
+    assert np.allclose(loaded.joints.angle, locomotion.joints.angle)
+    assert loaded.to_egocentric().joints is loaded.joints
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.locomotion import Locomotion
+from kino.pose_index import PoseIndex, pose_vectors
+from kino.synthetic import synthetic_tracking
+
+
+@pytest.fixture(scope="module")
+def sessions():
+    return [
+        Locomotion(
+            mouse, synthetic_tracking(200, fps=60, seed=seed), fps=60
+        ).to_egocentric()
+        for seed in range(3)
+    ]
+
+
+def brute_force(index, queries, k):
+    distances = np.linalg.norm(
+        index.project(index.vectors)[None] - index.project(queries)[:, None],
+        axis=2,
+    )
+    return np.sort(distances, axis=1)[:, :k]
+
+
+@pytest.mark.parametrize("tree", ["kd", "ball"])
+def test_pose_index_knn(sessions, tree):
+    index = PoseIndex(tree=tree)
+    index.add(sessions[0], "first")
+    index.add(sessions[1], "second")
+
+    vectors, valid = pose_vectors(sessions[1])
+    frames = np.flatnonzero(valid)[:5]
+    distances, names, found = index.knn(vectors[frames], k=3)
+    assert distances.shape == (5, 3)
+    assert np.allclose(distances[:, 0], 0, atol=1e-5)  # stored as float32
+    assert (names[:, 0] == "second").all()
+    assert np.array_equal(found[:, 0], frames)
+
+    # appended sessions are found before the tree is rebuilt
+    index.add(sessions[2], "third")
+    vectors, valid = pose_vectors(sessions[2])
+    frames = np.flatnonzero(valid)[:5]
+    distances, names, found = index.knn(vectors[frames], k=4)
+    assert (names[:, 0] == "third").all()
+    assert np.allclose(distances, brute_force(index, vectors[frames], 4))
+
+    query, distances, names, found = index.radius(vectors[frames], radius=0.5)
+    expected = brute_force(index, vectors[frames], len(index))
+    assert len(query) == (expected <= 0.5).sum()
+    assert np.all(distances <= 0.5)
+
+
+def test_pose_index_pca_and_save(sessions, tmp_path):
+    index = PoseIndex(n_components=4)
+    for n, egocentric in enumerate(sessions):
+        index.add(egocentric)
+    with pytest.raises(ValueError):
+        index.add(sessions[0], "session_0")
+
+    poses = sessions[0].pose[50:55]
+    distances, names, frames = index.knn(poses, k=2)
+    assert index.components.shape == (4, 2 * len(mouse.bodyparts_names))
+    assert np.allclose(distances, brute_force(index, poses.reshape(5, -1), 2))
+
+    index.save(tmp_path / "index")
+    loaded = PoseIndex.load(tmp_path / "index")
+    assert loaded.sessions == index.sessions
+    loaded_distances, loaded_names, loaded_frames = loaded.knn(poses, k=2)
+    assert np.allclose(loaded_distances, distances)
+    assert np.array_equal(loaded_frames, frames)
+
+
+def test_pose_index_pending_blocks(sessions):
+    index = PoseIndex(block_size=16, rebuild_fraction=10)
+    for n, egocentric in enumerate(sessions):
+        index.add(egocentric)
+    assert len(index._chunks["frames"]) == 3
+    assert len(index) == len(index.frames) == len(index.vectors)
+
+    index.knn(sessions[0].pose[:1], k=1)  # builds the tree
+    index.add(sessions[0], "fourth")
+    assert index._n_indexed < len(index)
+
+    poses = sessions[1].pose[20:25]
+    queries = poses.reshape(5, -1)
+    distances, names, frames = index.knn(poses, k=6)
+    assert np.allclose(distances, brute_force(index, queries, 6))
+
+    query, distances, names, frames = index.radius(poses, radius=0.5)
+    expected = brute_force(index, queries, len(index))
+    assert len(query) == (expected <= 0.5).sum()
@@ -0,0 +1,35 @@
+from kino import profiling
+from kino.locomotion import Locomotion
+from kino.animal import mouse
+from kino.synthetic import synthetic_tracking
+
+
+tracking = synthetic_tracking(200, fps=60)
+
+
+def test_profiling_disabled():
+    profiling.current.reset()
+    Locomotion(mouse, tracking, fps=60)
+    assert not profiling.current.stats
+
+
+def test_profiling(tmp_path):
+    with profiling.profile(memory=True) as prof:
+        locomotion = Locomotion(mouse, tracking, fps=60)
+        locomotion.to_egocentric()
+
+    assert prof["locomotion"]["calls"] == 1
+    assert prof["locomotion.bodyparts"]["time"] <= prof["locomotion"]["time"]
+    assert prof["steps.paw"]["calls"] == len(mouse.paws)
+    assert prof["geometry.trajectory.compute_kinematics"]["calls"] > 1
+    assert prof["locomotion"]["allocated"] > 0
+    assert "locomotion.to_egocentric.bodyparts" in prof
+    assert not profiling.is_enabled()
+
+    # merge stats e.g. from worker processes
+    merged = profiling.Profile(prof.to_dict())
+    merged.merge(prof)
+    assert merged["locomotion"]["calls"] == 2
+
+    prof.to_json(tmp_path / "profile.json")
+    assert prof.table().row_count == len(prof.stats)
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.locomotion import Locomotion
+from kino.query import Intervals
+from kino.synthetic import synthetic_tracking
+
+
+def test_intervals_from_mask():
+    mask = np.zeros(30, dtype=bool)
+    mask[2:5] = mask[6:12] = mask[20:21] = True
+
+    intervals = Intervals.from_mask(mask)
+    assert list(intervals) == [(2, 5), (6, 12), (20, 21)]
+
+    merged = Intervals.from_mask(mask, max_gap=1, min_duration=2)
+    assert list(merged) == [(2, 12)]
+    assert np.array_equal(
+        merged.to_mask(30), (np.arange(30) >= 2) & (np.arange(30) < 12)
+    )
+
+    fps = Intervals.from_mask(mask, fps=10, min_duration=0.5)
+    assert list(fps) == [(6, 12)]
+    assert np.allclose(fps.duration, 0.6)
+
+
+def test_intervals_joins():
+    bouts = Intervals([0, 20, 50], [10, 40, 60])
+    steps = Intervals([2, 8, 15, 25, 30, 35, 58], [5, 12, 18, 28, 45, 37, 70])
+
+    i, j = bouts.overlaps(steps)
+    pairs = set(zip(i, j))
+    assert pairs == {(0, 0), (0, 1), (1, 3), (1, 4), (1, 5), (2, 6)}
+
+    i, j = bouts.contains(steps)
+    assert set(zip(i, j)) == {(0, 0), (1, 3), (1, 5)}
+    assert list(steps.within(bouts)) == [(2, 5), (25, 28), (35, 37)]
+    assert len(steps.overlapping(bouts)) == 6
+    assert list(bouts.intersection(Intervals([5], [25]))) == [
+        (5, 10),
+        (20, 25),
+    ]
+
+    # brute force check on random intervals
+    rng = np.random.default_rng(0)
+    start = rng.integers(0, 1000, 200)
+    a = Intervals(start, start + rng.integers(1, 50, 200))
+    start = rng.integers(0, 1000, 300)
+    b = Intervals(start, start + rng.integers(1, 50, 300))
+    expected = {
+        (n, m)
+        for n in range(len(a))
+        for m in range(len(b))
+        if a.start[n] < b.end[m] and b.start[m] < a.end[n]
+    }
+    assert set(zip(*a.overlaps(b))) == expected
+
+
+def test_locomotion_query():
+    locomotion = Locomotion(mouse, synthetic_tracking(600, fps=60), fps=60)
+
+    mask = locomotion.evaluate(
+        "(com.speed > 20) & (abs(com.thetadot) < 50) & detected(*paws)"
+    )
+    assert mask.shape == (600,) and mask.dtype == bool
+    assert np.array_equal(
+        mask,
+        (locomotion.com.speed > 20) & (np.abs(locomotion.com.thetadot) < 50),
+    )
+
+    assert np.array_equal(
+        locomotion.evaluate("10 < com.speed <= 30 and not np.isnan(com.x)"),
+        (locomotion.com.speed > 10) & (locomotion.com.speed <= 30),
+    )
+
+    # only whitelisted operations are evaluated
+    for expression in (
+        "com.__class__",
+        "np.save('file', com.x)",
+        "com.save('folder')",
+        "__import__('os')",
+        "[x for x in paws]",
+        "lambda: 0",
+    ):
+        with pytest.raises(ValueError):
+            locomotion.evaluate(expression)
+
+    bouts = locomotion.query("com.speed > 20", min_duration=0.5)
+    assert len(bouts) and (bouts.duration >= 0.5).all()
+
+    steps = Intervals.from_steps(locomotion.paws["left_fl"])
+    assert len(steps.within(bouts)) > 0
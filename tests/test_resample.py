@@ -0,0 +1,176 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.geometry import Trajectory
+from kino.locomotion import Locomotion
+from kino.math import interpolate_at, uniform_time
+from kino.pose import resample_tracking
+from kino.synthetic import synthetic_tracking
+
+
+def test_interpolate_at():
+    time = np.array([0, 1, 3, 4.0])
+    values = np.column_stack([time * 2, -time])
+
+    new_time = np.array([-1, 0, 0.5, 2, 4, 5])
+    resampled = interpolate_at(values, time, new_time)
+    assert resampled.shape == (6, 2)
+    assert np.allclose(resampled[1:5, 0], new_time[1:5] * 2)
+    assert np.allclose(resampled[1:5, 1], -new_time[1:5])
+    assert np.isnan(resampled[[0, 5]]).all()
+
+    assert np.allclose(
+        uniform_time(np.array([1, 1.2, 2.01]), 4), [1, 1.25, 1.5, 1.75, 2]
+    )
+
+
+def test_trajectory_timestamps():
+    # constant speed (10 cm/s) sampled at irregular times
+    rng = np.random.default_rng(0)
+    timestamps = np.cumsum(rng.uniform(0.5, 1.5, 300)) / 60
+    x = 10 * timestamps
+
+    regular = Trajectory(x, np.zeros_like(x), fps=60, smoothing_window=1)
+    trajectory = Trajectory(
+        x, np.zeros_like(x), fps=60, smoothing_window=1, timestamps=timestamps
+    )
+    assert not np.allclose(regular.speed[5:-5], 10, rtol=0.05)
+    assert np.allclose(trajectory.speed[5:-5], 10)
+    assert np.allclose(trajectory.distance, x[-1] - x[0], rtol=0.02)
+    assert np.array_equal(trajectory.time, timestamps)
+    assert np.array_equal((trajectory @ np.arange(10)).time, timestamps[:10])
+
+    with pytest.raises(ValueError):
+        Trajectory(
+            x,
+            np.zeros_like(x),
+            fps=60,
+            smoothing_method="kalman",
+            timestamps=timestamps,
+        )
+
+    # resample at a uniform frame rate
+    resampled = trajectory.resample(200, smoothing_window=1)
+    assert resampled.fps == 200
+    assert resampled.name == trajectory.name
+    assert np.allclose(np.diff(resampled.time), 1 / 200)
+    assert np.allclose(resampled.speed[5:-5], 10)
+
+
+def test_resample_tracking():
+    tracking = synthetic_tracking(400, fps=200, noise=0)
+    resampled, time = resample_tracking(mouse, tracking, 60, fps=200)
+    assert len(time) == len(resampled["body_x"]) == 120
+    assert np.allclose(
+        resampled["body_x"],
+        np.interp(time, np.arange(400) / 200, tracking["body_x"]),
+    )
+
+    with pytest.raises(ValueError):
+        resample_tracking(mouse, tracking, 60)
+
+
+def test_locomotion_resample(tmp_path):
+    fast = Locomotion(mouse, synthetic_tracking(600, fps=200), fps=200)
+    slow = Locomotion(mouse, synthetic_tracking(180, fps=60), fps=60)
+
+    resampled = fast.resample(60)
+    assert resampled.fps == 60
+    assert len(resampled) == 180
+    assert set(resampled.bodyparts) == set(slow.bodyparts)
+    # same trajectory: similar speed at both frame rates
+    assert np.nanmedian(
+        np.abs(resampled.com.speed[10:-10] - slow.com.speed[10:-10])
+    ) < 0.1 * np.nanmedian(slow.com.speed)
+
+    # frames with irregular timestamps
+    timestamps = np.sort(np.random.default_rng(0).uniform(0, 3, 300))
+    tracking = synthetic_tracking(300, fps=100)
+    irregular = Locomotion(mouse, tracking, fps=100, timestamps=timestamps)
+    assert np.array_equal(irregular.com.time, timestamps)
+    egocentric = irregular.to_egocentric()
+    assert np.array_equal(egocentric.bodyparts["body"].time, timestamps)
+
+    irregular.save(tmp_path / "irregular")
+    loaded = Locomotion.load(tmp_path / "irregular")
+    assert np.array_equal(loaded.timestamps, timestamps)
+    assert np.array_equal(loaded.com.time, timestamps)
+    assert np.allclose(np.diff(loaded.resample(50).com.time), 1 / 50)
+
+
+def test_locomotion_resample_cleaning(tmp_path):
+    tracking = synthetic_tracking(600, fps=200)
+    for bp in mouse.bodyparts_names:
+        tracking[f"{bp}_likelihood"] = np.ones(600)
+    tracking.loc[300:305, "body_likelihood"] = 0
+
+    fast = Locomotion(
+        mouse,
+        tracking,
+        fps=200,
+        likelihood_threshold=0.5,
+        max_gap=10,
+        gap_fill_method="spline",
+    )
+    assert not np.isnan(fast.bodyparts["body"].x).any()
+
+    # the cleaning parameters are kept, the gap length in frames is scaled
+    resampled = fast.resample(60)
+    assert resampled.likelihood_threshold == 0.5
+    assert resampled.max_gap == 3
+    assert resampled.gap_fill_method == "spline"
+    assert not np.isnan(resampled.bodyparts["body"].x).any()
+
+    fast.save(tmp_path / "fast")
+    loaded = Locomotion.load(tmp_path / "fast")
+    assert loaded.likelihood_threshold == 0.5
+    assert loaded.max_gap == 10
+    assert loaded.resample(60).gap_fill_method == "spline"
+
+
+def test_irregular_angular_velocity():
+    # accelerating turn (thetadot = 40 t deg/s) sampled at irregular times
+    rng = np.random.default_rng(1)
+    timestamps = np.cumsum(rng.uniform(0.5, 1.5, 400)) / 60
+    angle = np.deg2rad(20 * timestamps ** 2)
+    x, y = 10 * np.cos(angle), 10 * np.sin(angle)
+
+    trajectory = Trajectory(
+        x, y, fps=60, smoothing_window=1, timestamps=timestamps
+    )
+    # backward differences: angular velocity between consecutive frames
+    midpoints = (timestamps[1:] + timestamps[:-1]) / 2
+    error = np.abs(trajectory.thetadot[1:]) - 40 * midpoints
+    assert np.median(np.abs(error[5:-5])) < 0.15
+
+
+@pytest.mark.parametrize("smoothing_method", ["window", "savgol"])
+def test_uniform_timestamps(smoothing_method):
+    # timestamps of equally spaced frames don't change the kinematics
+    tracking = synthetic_tracking(600, fps=60)
+    regular = Locomotion(
+        mouse, tracking, fps=60, smoothing_method=smoothing_method
+    )
+    timed = Locomotion(
+        mouse,
+        tracking,
+        fps=60,
+        smoothing_method=smoothing_method,
+        timestamps=np.arange(600) / 60,
+    )
+    for quantity in (
+        "speed",
+        "thetadot",
+        "thetadotdot",
+        "curvature",
+        "longitudinal_acceleration",
+        "comulative_distance",
+    ):
+        assert np.allclose(
+            getattr(timed.com, quantity),
+            getattr(regular.com, quantity),
+            rtol=1e-9,
+            atol=1e-9,
+            equal_nan=True,
+        ), quantity
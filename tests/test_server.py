@@ -0,0 +1,58 @@
+import asyncio
+import numpy as np
+import pandas as pd
+
+from kino.animal import mouse
+from kino.server import PoseServer, replay_tracking, encode_pose, decode_poses
+
+
+tracking = pd.read_hdf("scripts/example_tracking.h5")
+
+
+def test_encode_decode():
+    pose = np.random.rand(mouse.n_bodyparts, 2)
+    frames, timestamps, poses = decode_poses(
+        encode_pose(3, 1.5, pose) * 2, mouse.n_bodyparts
+    )
+
+    assert list(frames) == [3, 3]
+    assert timestamps[0] == 1.5
+    assert np.allclose(poses[1], pose, atol=1e-6)
+
+
+async def run_server(**kwargs):
+    updates = []
+    async with PoseServer(mouse, fps=60, **kwargs) as server:
+        queue = server.subscribe(maxsize=8)
+        client = asyncio.create_task(
+            replay_tracking(
+                mouse,
+                tracking,
+                port=server.port,
+                path=kwargs.get("path", None),
+                rate=2000,
+            )
+        )
+
+        while True:
+            update = await queue.get()
+            if update is None:
+                break
+            updates.append(update)
+        await client
+    return server, updates
+
+
+def test_pose_server_tcp():
+    server, updates = asyncio.run(run_server())
+    n_frames = len(tracking["body_x"])
+
+    assert len(updates) == n_frames
+    assert [u.frame for u in updates] == list(range(n_frames))
+    assert len(server.latency["kinematics"]) == n_frames
+    assert any(u.swing_onsets for u in updates)
+
+
+def test_pose_server_unix(tmp_path):
+    server, updates = asyncio.run(run_server(path=tmp_path / "kino.sock"))
+    assert len(updates) == len(tracking["body_x"])
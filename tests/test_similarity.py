@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from kino.geometry import Trajectory
+from kino.similarity import (
+    dtw,
+    frechet,
+    lower_bound,
+    pairwise_distances,
+    squareform,
+)
+
+
+def naive(a, b, metric, window=None):
+    n, m = len(a), len(b)
+    width = np.inf if window is None else max(window, abs(n - m))
+    D = np.full((n + 1, m + 1), np.inf)
+    D[0, 0] = 0
+    for i in range(n):
+        for j in range(m):
+            if abs(i - j) > width:
+                continue
+            cost = np.linalg.norm(a[i] - b[j])
+            best = min(D[i, j], D[i, j + 1], D[i + 1, j])
+            D[i + 1, j + 1] = (
+                cost + best if metric == "dtw" else max(cost, best)
+            )
+    return D[n, m]
+
+
+@pytest.fixture
+def paths():
+    rng = np.random.default_rng(0)
+    return [
+        np.cumsum(rng.normal(size=(rng.integers(2, 30), 2)), axis=0)
+        for _ in range(12)
+    ]
+
+
+@pytest.mark.parametrize("metric", ["dtw", "frechet"])
+@pytest.mark.parametrize("window", [None, 0, 4])
+def test_pairwise_distances(paths, metric, window):
+    condensed = pairwise_distances(paths, metric, window=window, batch_size=7)
+    square = squareform(condensed)
+    for i in range(len(paths)):
+        for j in range(i + 1, len(paths)):
+            expected = naive(paths[i], paths[j], metric, window)
+            assert square[i, j] == pytest.approx(expected)
+            assert (
+                lower_bound(paths[i], paths[j], metric, window)
+                <= expected + 1e-9
+            )
+
+    # pruning only removes pairs farther than max_distance
+    threshold = np.median(condensed)
+    pruned = pairwise_distances(paths, metric, window, max_distance=threshold)
+    assert np.allclose(
+        pruned, np.where(condensed > threshold, np.inf, condensed)
+    )
+
+
+@pytest.mark.parametrize("metric", ["dtw", "frechet"])
+def test_pruning_equal_lengths(metric):
+    # with window=0 the band of equal length paths is the diagonal, which
+    # leaves every other anti-diagonal empty
+    rng = np.random.default_rng(1)
+    paths = [np.cumsum(rng.normal(size=(20, 2)), axis=0) for _ in range(5)]
+    condensed = pairwise_distances(paths, metric, window=0)
+    threshold = np.median(condensed)
+    pruned = pairwise_distances(
+        paths, metric, window=0, max_distance=threshold
+    )
+    assert np.allclose(
+        pruned, np.where(condensed > threshold, np.inf, condensed)
+    )
+
+
+def test_single_distances():
+    x = np.linspace(0, 10, 50)
+    a = Trajectory(x, np.zeros(50), smoothing_window=1)
+    b = np.column_stack([x, np.ones(50)])
+    assert dtw(a, b) == pytest.approx(50)
+    assert frechet(a, b) == pytest.approx(1)
+    assert dtw(b, b, window=2) == 0
+
+
+def test_pairwise_parallel_and_cache(paths, tmp_path):
+    expected = pairwise_distances(paths, "dtw", window=3)
+    parallel = pairwise_distances(
+        paths, "dtw", window=3, n_workers=2, cache=tmp_path
+    )
+    assert np.allclose(parallel, expected)
+    assert len(list(tmp_path.glob("dtw_*.npy"))) == 1
+
+    cached = pairwise_distances(paths, "dtw", window=3, cache=tmp_path)
+    assert np.array_equal(cached, parallel)
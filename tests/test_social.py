@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from kino.animal import mouse
+from kino.social import MultiAnimalLocomotion
+from kino.synthetic import BODY_LAYOUT, synthetic_tracking
+
+
+def make_pose(position, heading, n_frames=50):
+    """
+        Pose of a mouse at a position, with body axis at
+        heading (degrees) at all frames
+    """
+    theta = np.radians(heading - 90)
+    R = np.array(
+        [[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]]
+    )
+    pose = np.array([BODY_LAYOUT[bp] for bp in mouse.bodyparts_names]) @ R.T
+    pose = pose + np.asarray(position)
+    return np.repeat(pose[None], n_frames, axis=0)
+
+
+def test_social_measures():
+    # a at the origin facing east (0 deg), b 10cm ahead of a facing north
+    pose = np.stack([make_pose((0, 0), 0), make_pose((10, 0), 90)])
+    social = MultiAnimalLocomotion(mouse, pose, fps=30, names=["a", "b"])
+
+    assert social.n_animals == 2 and len(social) == 50
+    assert np.allclose(social.heading[:, 0], [0, 90])
+    assert np.allclose(social.speed, 0)
+
+    distances = social.distances("body")
+    assert distances.shape == (50, 2, 2)
+    assert np.allclose(distances[:, 0, 1], 10)
+    assert np.allclose(distances[:, 0, 0], 0)
+
+    bearings = social.bearings("body")
+    assert np.allclose(bearings[:, 0, 1], 0)  # b is ahead of a
+    assert np.allclose(bearings[:, 1, 0], 90)  # a is on b's left
+
+
+@pytest.mark.filterwarnings("error")
+def test_social_com_missing_paws():
+    pose = np.stack([make_pose((0, 0), 0), make_pose((10, 0), 90)])
+    paws = [list(mouse.bodyparts_names).index(paw) for paw in mouse.paws]
+    pose[0, 10:13, paws[0]] = np.nan
+    pose[1, 20, paws] = np.nan
+    social = MultiAnimalLocomotion(mouse, pose, fps=30)
+
+    com = social.com
+    expected = np.nanmean(pose[0, 10:13][:, paws], axis=1)
+    assert np.allclose(com[0, 10:13], expected)
+    assert np.isnan(com[1, 20]).all()
+    assert not np.isnan(np.delete(com[1], 20, axis=0)).any()
+
+
+def test_social_egocentric():
+    pose = np.stack([make_pose((0, 0), 0), make_pose((10, 0), 90)])
+    social = MultiAnimalLocomotion(mouse, pose, fps=30, names=["a", "b"])
+
+    egocentric = social.to_egocentric()
+    assert egocentric.shape == (2, 2, 50, mouse.n_bodyparts, 2)
+    assert np.allclose(egocentric[0], social.to_egocentric("a"))
+
+    # each animal faces up in its own reference frame
+    snout = list(mouse.bodyparts_names).index("snout")
+    assert np.allclose(egocentric[[0, 1], [0, 1], :, snout, 0], 0)
+    assert (egocentric[[0, 1], [0, 1], :, snout, 1] > 0).all()
+
+    # in a's reference frame, b is straight ahead
+    body = list(mouse.bodyparts_names).index("body")
+    assert np.allclose(egocentric[0, 1, :, body, 0], 0, atol=1e-9)
+    assert (egocentric[0, 1, :, body, 1] > 5).all()
+
+
+def test_social_from_tracking():
+    trackings = dict(
+        a=synthetic_tracking(200, fps=60), b=synthetic_tracking(200, fps=60)
+    )
+    social = MultiAnimalLocomotion.from_tracking(mouse, trackings, fps=60)
+    assert social.velocity.shape == (2, 200, mouse.n_bodyparts, 2)
+    assert np.allclose(social.distances(), 0)
+
+    locomotion = social["b"]
+    assert np.allclose(locomotion.body.x, trackings["b"]["body_x"])
+
+
+def test_social_smoothing_methods():
+    tracking = synthetic_tracking(200, fps=60)
+    pose = np.stack([make_pose((0, 0), 0, 200), make_pose((10, 0), 90, 200)])
+    pose[0] += np.column_stack([tracking["body_x"], tracking["body_y"]])[
+        :, None
+    ]
+
+    speeds = [
+        MultiAnimalLocomotion(
+            mouse, pose, fps=60, smoothing_method=method
+        ).speed
+        for method in ("window", "savgol", "kalman")
+    ]
+    for speed in speeds:
+        assert np.allclose(speed[1], 0)
+    assert np.allclose(speeds[0][0, 10:-10], speeds[1][0, 10:-10], rtol=0.2)
+
+    with pytest.raises(ValueError):
+        MultiAnimalLocomotion(mouse, pose, fps=60, smoothing_method="savgl")
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from kino.animal import mouse
+from kino.locomotion import Locomotion
+from kino.streaming import StreamingLocomotion, RingBuffer
+
+
+tracking = pd.read_hdf("scripts/example_tracking.h5")
+
+
+def test_ring_buffer():
+    buffer = RingBuffer(3, (2,))
+    for i in range(5):
+        buffer.push([i, i])
+
+    assert len(buffer) == 3
+    assert buffer.last[0] == 4
+    assert buffer.previous(2)[0] == 2
+    assert np.all(buffer.to_array()[:, 0] == [2, 3, 4])
+
+
+def test_streaming_locomotion():
+    locomotion = Locomotion(mouse, tracking, fps=60)
+    egocentric = locomotion.to_egocentric()
+    n_frames = len(locomotion)
+
+    streaming = StreamingLocomotion(mouse, fps=60, buffer_size=64)
+    onsets = []
+    streaming.on_swing_onset(lambda paw, frame: onsets.append((paw, frame)))
+
+    for frame in range(n_frames):
+        streaming.update(
+            StreamingLocomotion.pose_from_tracking(mouse, tracking, frame)
+        )
+
+    assert len(streaming) == n_frames
+    assert len(streaming.position) == 64
+    assert np.allclose(streaming["com"][0], locomotion.com.x[-1])
+    assert np.isclose(
+        streaming.heading.last, locomotion.body_axis.vector.angle2[-1]
+    )
+
+    # egocentric pose matches the offline projection
+    left_fl = mouse.bodyparts_names.index("left_fl")
+    assert np.allclose(
+        streaming.egocentric.last[left_fl],
+        [
+            egocentric.bodyparts["left_fl"].x[-1],
+            egocentric.bodyparts["left_fl"].y[-1],
+        ],
+    )
+
+    # causal filters should roughly track the offline speed
+    assert np.abs(streaming.speed.last[-1] - locomotion.com.speed[-1]) < 5
+    assert len(onsets) > 0
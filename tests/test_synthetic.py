@@ -0,0 +1,27 @@
+import numpy as np
+
+from kino.animal import Animal, mouse, default_animal_data
+from kino.locomotion import Locomotion
+from kino.synthetic import synthetic_tracking, synthetic_animal_data
+
+
+def test_synthetic_tracking():
+    tracking = synthetic_tracking(600, fps=60)
+
+    assert len(tracking) == 600
+    assert sorted(tracking.columns) == sorted(
+        [f"{bp}_{c}" for bp in default_animal_data["bodyparts"] for c in "xy"]
+    )
+    assert np.allclose(tracking, synthetic_tracking(600, fps=60))
+
+    locomotion = Locomotion(mouse, tracking, fps=60)
+    for paw in locomotion.paws.values():
+        assert len(paw.swings_start) > 10
+
+
+def test_synthetic_extra_bodyparts():
+    animal = Animal(synthetic_animal_data(12))
+    tracking = synthetic_tracking(100, n_bodyparts=12)
+
+    assert animal.n_bodyparts == 12
+    assert tracking.shape == (100, 24)
@@ -1,6 +1,10 @@
+import gc
+import pickle
+import weakref
+
 import numpy as np
 
-from kino.geometry import Trajectory
+from kino.geometry import Trajectory, AnchoredTrajectory, Vector
 
 
 def test_trajectory_long_lat_acceleration():
@@ -27,3 +31,41 @@ def test_trajectory_long_lat_acceleration():
         raise ValueError(
             "Longitudinal acceleration did not recover the original speed"
         )
+
+
+def test_anchored_trajectory_angular_cache():
+    t = np.linspace(0, 4 * np.pi, 300)
+    vector = Vector(np.cos(t), np.sin(t))
+    anchored = AnchoredTrajectory(t, t, vector, "k", "bone")
+
+    thetadot = anchored.thetadot
+    assert anchored.thetadot is thetadot
+    assert np.allclose(thetadot[10:-10], np.degrees(t[1] - t[0]), rtol=1e-3)
+
+    # snapshots use the parent's values
+    frames = np.arange(50, 60)
+    assert np.array_equal((anchored @ frames).thetadot, thetadot[frames])
+    assert (anchored @ 100).thetadotdot == anchored.thetadotdot[100]
+
+    # changing the vector invalidates the cache
+    anchored.vector = Vector(np.cos(2 * t), np.sin(2 * t))
+    assert np.allclose(
+        anchored.thetadot[10:-10], 2 * np.degrees(t[1] - t[0]), rtol=1e-3
+    )
+
+
+def test_anchored_trajectory_snapshot_parent():
+    t = np.linspace(0, 4 * np.pi, 300)
+    anchored = AnchoredTrajectory(t, t, Vector(np.cos(t), np.sin(t)), "k", "b")
+    thetadot = anchored.thetadot
+
+    # snapshots don't keep the parent alive, computed values are copied
+    snapshot = anchored @ np.arange(50, 60)
+    parent = weakref.ref(anchored)
+    del anchored
+    gc.collect()
+    assert parent() is None
+    assert np.array_equal(snapshot.thetadot, thetadot[50:60])
+
+    restored = pickle.loads(pickle.dumps(snapshot))
+    assert np.array_equal(restored.thetadot, thetadot[50:60])